@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+from urllib.parse import urljoin
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from cart_fixtures import cart_storage_key
+from locators import locator
+from navigation import load_url
+from tracing import span
+from waits import wait_for_any_element, wait_for_element
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+# Storage keys that hold test data rather than the login; restoring them would leak one run's cart into the next
+excluded_storage_keys = (cart_storage_key,)
+
+# Cookie fields add_cookie accepts. The domain is left out so the cookie lands on whatever host the
+# base URL uses (host-only), which also keeps localhost stand-ins working.
+cookie_fields = ("name", "value", "path", "secure", "httpOnly", "expiry")
+
+storage_script = """
+var excluded = arguments[0], out = {local: {}, session: {}};
+[["local", window.localStorage], ["session", window.sessionStorage]].forEach(function (pair) {
+    for (var i = 0; i < pair[1].length; i++) {
+        var key = pair[1].key(i);
+        if (excluded.indexOf(key) < 0) { out[pair[0]][key] = pair[1].getItem(key); }
+    }
+});
+return out;
+"""
+
+restore_storage_script = """
+var state = arguments[0];
+Object.keys(state.local).forEach(function (key) { window.localStorage.setItem(key, state.local[key]); });
+Object.keys(state.session).forEach(function (key) { window.sessionStorage.setItem(key, state.session[key]); });
+"""
+
+
+# Post-login cookies and web storage per (base URL, user), captured after a real login and injected into
+# later sessions so they can start on the inventory page without going through the login form.
+class AuthCache:
+    def __init__(self, max_age=10 * 60, expiry_margin=30):
+        self.max_age = max_age  # Seconds a captured state is trusted (Sauce Demo's session cookie lives 10 minutes)
+        self.expiry_margin = expiry_margin  # Treat cookies expiring within this many seconds as expired
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.stats = {"captured": 0, "restored": 0, "rejected": 0, "expired": 0}
+
+    def capture(self, driver, base_url, user):
+        cookies = [{field: cookie[field] for field in cookie_fields if field in cookie}
+                   for cookie in driver.get_cookies()]
+        storage = driver.execute_script(storage_script, list(excluded_storage_keys))
+        with self.lock:
+            self.entries[(base_url, user)] = {"cookies": cookies, "storage": storage, "captured_at": time.time()}
+            self.stats["captured"] += 1
+        debug_logger.info(f"Cached the login state of {user} ({len(cookies)} cookies)")
+
+    def invalidate(self, base_url, user):
+        with self.lock:
+            self.entries.pop((base_url, user), None)
+
+    # The cached entry, or None when there is none or it is too old to be worth trying
+    def get(self, base_url, user):
+        with self.lock:
+            entry = self.entries.get((base_url, user))
+        if entry is None:
+            return None
+        now = time.time()
+        expiries = [cookie["expiry"] for cookie in entry["cookies"] if "expiry" in cookie]
+        if now - entry["captured_at"] > self.max_age or any(expiry < now + self.expiry_margin for expiry in expiries):
+            self.invalidate(base_url, user)
+            self.stats["expired"] += 1
+            debug_logger.info(f"Cached login state of {user} expired")
+            return None
+        return entry
+
+    # Inject the cached state and open the inventory. True when the site accepted it; otherwise the entry
+    # is dropped and the caller should log in through the form.
+    def restore(self, driver, base_url, user, timeout=5, page_load_strategy="normal"):
+        entry = self.get(base_url, user)
+        if entry is None:
+            return False
+        with span(f"restore session {user}", "session"):
+            try:
+                # Cookies and storage can only be set for the origin that is loaded
+                load_url(driver, base_url, page_load_strategy)
+                wait_for_element(driver, locator("login_button"), timeout=timeout, name="login page")
+                for cookie in entry["cookies"]:
+                    driver.add_cookie(cookie)
+                driver.execute_script(restore_storage_script, entry["storage"])
+                load_url(driver, urljoin(base_url, "inventory.html"), page_load_strategy)
+                landed = wait_for_any_element(driver, [locator("inventory_list"), locator("login_button")],
+                                              timeout=timeout, name="inventory or login page")
+            except (TimeoutException, WebDriverException) as e:
+                debug_logger.warning(f"Restoring the login state of {user} failed: {str(e)}")
+                landed = None
+        if landed != 0:
+            self.invalidate(base_url, user)
+            self.stats["rejected"] += 1
+            debug_logger.warning(f"Cached login state of {user} was rejected")
+            return False
+        self.stats["restored"] += 1
+        debug_logger.info(f"Restored the login state of {user}")
+        return True
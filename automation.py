@@ -1,14 +1,32 @@
 import logging
+import os
 from logging.handlers import RotatingFileHandler
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-import customtkinter as ctk
-from tkinter import messagebox
 import time
-from selenium.common.exceptions import NoSuchElementException, ElementClickInterceptedException, TimeoutException
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import threading
+import queue
+import sqlite3
+from selenium.common.exceptions import NoSuchElementException, ElementClickInterceptedException, TimeoutException, WebDriverException
 from selenium.webdriver.common.action_chains import ActionChains
+from auth_cache import AuthCache
+from cart_fixtures import read_cart, update_cart
+from catalog_index import default_snapshot, describe_problem, load_catalog_index, read_sort_order, validate_items
+from dom_extract import scrape_inventory
+from journal import RunJournal, journal_step_result, read_journal
+from locators import act, forget, invalidate_elements, locator, reset_locator_stats, summarize_locator_stats
+from plan_engine import (chain_hooks, compile_plan, default_base_url, execute_plan, products, resume_plan, step_handler,
+                         step_types, user_options)
+from drivers import create_driver, performance_profiles, supported_browsers
+from navigation import NavigationPlanner, load_url
+from perf_metrics import metrics_hook, summarize_metrics
+from results_store import ResultsStore, format_summary
+from retry import retry_recovery, summarize_retries
+from scheduler import StepScheduler
+from session_pool import SessionPool, quit_driver
+from standin_server import start_standin_server, stop_standin_server
+from tracing import instrument_driver, span, start_tracing, stop_tracing
+from visual import VisualChecker, visual_hook, visual_outcomes
+from waits import (reset_wait_timings, wait_timings, wait_for_document_ready, wait_for_element,
+                   wait_for_element_gone, wait_for_text, wait_for_attribute, get_cart_count, wait_for_cart_count)
 
 
 # Configure logging for DEBUG messages
@@ -26,412 +44,392 @@ debug_logger.addHandler(debug_file_handler)
 
 # Initialize a global list to store item names and prices
 item_prices = []
+# The same scrape as structured rows (name, price, item_id, button state) for anything that needs more than the summary
+scraped_items = []
 
-def log_item_prices(driver):
+def log_item_prices(driver, use_script=True):
     global item_prices  # Ensure we're modifying the global list
     item_prices.clear()  # Clear the list at the beginning of the function
+    scraped_items.clear()
     try:
-        # Find all elements that contain item names and prices
-        item_elements = driver.find_elements(By.CLASS_NAME, "inventory_item")
-        for item_element in item_elements:
-            item_name = item_element.find_element(By.CLASS_NAME, "inventory_item_name").text
-            item_price = item_element.find_element(By.CLASS_NAME, "inventory_item_price").text
-            item_prices.append((item_name, item_price))  # Append each found name and price as a tuple to the global list
-            debug_logger.info(f"Item found: {item_name} with price: {item_price}")
+        # Read every item name, price, id and button state in a single round trip (see dom_extract.py)
+        scraped_items.extend(scrape_inventory(driver, use_script))
+        for item in scraped_items:
+            item_prices.append((item["name"], item["price"]))  # Append each found name and price as a tuple to the global list
+            debug_logger.info(f"Item found: {item['name']} with price: {item['price']}")
+    except WebDriverException as e:
+        debug_logger.error(f"Failed to log item names and prices: {str(e)}")
+        raise  # The step's retry policy decides whether this was transient (see retry.py)
     except Exception as e:
         debug_logger.error(f"Failed to log item names and prices: {str(e)}")
 
-def try_add_to_cart(driver, item_xpath, item_name, confirmation_xpath):
+def try_add_to_cart(driver, product):
+    item_name = product["short_name"]
     try:
         start_time = time.time()
-        add_button = driver.find_element(By.XPATH, item_xpath)
-        add_button.click()
+        cart_count = get_cart_count(driver)
+        act(driver, "add_to_cart_button", lambda add_button: add_button.click(), slug=product["slug"])
+        forget(driver, "add_to_cart_button", slug=product["slug"])  # The button turns into the "Remove" button
         
-        WebDriverWait(driver, 10).until(
-            EC.text_to_be_present_in_element((By.XPATH, confirmation_xpath), "Remove")
-        )
+        wait_for_text(driver, locator("remove_button", slug=product["slug"]), "Remove", name=f"{item_name} remove button")
+        wait_for_cart_count(driver, cart_count + 1)  # The add is only done once the badge shows it
         
         elapsed_time = time.time() - start_time
         debug_logger.info(f"Successfully added {item_name} to the cart in {elapsed_time:.2f} seconds")
         return True
     except (NoSuchElementException, ElementClickInterceptedException, TimeoutException) as e:
         debug_logger.error(f"Failed to add {item_name} to the cart: {str(e)}")
-        return False
+        raise  # The step's retry policy decides whether this was transient (see retry.py)
 
-def try_remove_from_cart(driver, item_xpath, item_name):
+def try_remove_from_cart(driver, product):
+    item_name = product["short_name"]
+    remove_locator = locator("remove_button", slug=product["slug"])
     try:
-        WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, item_xpath)))
-        remove_button = driver.find_element(By.XPATH, item_xpath)
+        remove_button = wait_for_element(driver, remove_locator, clickable=True, name=f"{item_name} remove button")
+        cart_count = get_cart_count(driver)
         remove_button.click()
+        forget(driver, "remove_button", slug=product["slug"])
         
-        WebDriverWait(driver, 10).until_not(EC.presence_of_element_located((By.XPATH, item_xpath)))
-        
-        time.sleep(0.2)  # Visual confirmation
+        wait_for_element_gone(driver, remove_locator, name=f"{item_name} remove button to disappear")
+        wait_for_cart_count(driver, max(cart_count - 1, 0))  # Visual confirmation: the badge went down
         
         debug_logger.info(f"Successfully removed {item_name} from the cart")
         return True
     except (NoSuchElementException, ElementClickInterceptedException, TimeoutException) as e:
         debug_logger.error(f"Failed to remove {item_name} from the cart: {str(e)}")
-        return False
+        raise  # The step's retry policy decides whether this was transient (see retry.py)
         
+# Login states captured after successful logins, shared by the runs of this process
+auth_cache = AuthCache()
+
+# Step implementations. Which steps run, in what order and under which name comes from the plan
+# (see plan_engine.py); each handler gets the run context and its parameters and returns True/False.
+@step_handler("login")
+def login(context):
+    driver = context["driver"]
+    selected_user = context["user"]
+    load_url(driver, context["base_url"], context["profile"]["page_load_strategy"])
+    debug_logger.info(f"Navigated to Sauce Demo at {context['base_url']}")
+    wait_for_document_ready(driver, context["profile"]["ready_state"])
+    wait_for_element(driver, locator("login_button"), clickable=True)
+
+    # Perform login using the selected user
+    act(driver, "username_field", lambda field: field.send_keys(selected_user))
+    act(driver, "password_field", lambda field: field.send_keys("secret_sauce"))  # Assuming the password is the same
+    act(driver, "login_button", lambda button: button.click())
+    invalidate_elements(driver)  # Leaving the login page
+    debug_logger.info(f"Performed login as {selected_user}")
+
+    # Check if login was successful
+    try:
+        wait_for_element(driver, locator("inventory_list"))
+        debug_logger.info("Login successful")
+        context["navigator"].arrived("inventory")
+        context["auth_cache"].capture(driver, context["base_url"], selected_user)
+        return True
+    except TimeoutException:
+        debug_logger.error("Login failed")
+        if context["interactive"]:
+            context["notify"]("error", "Error", "Login failed. Please check credentials or site status.")
+        return False  # The login step stops the plan when it fails
+
+# Stands in for "login" when the plan doesn't test it: start from the cached login state of the user,
+# or log in through the form when there is none yet or the site rejects it
+@step_handler("restore_session")
+def restore_session(context):
+    if context["auth_cache"].restore(context["driver"], context["base_url"], context["user"],
+                                     page_load_strategy=context["profile"]["page_load_strategy"]):
+        context["navigator"].arrived("inventory")
+        return True
+    debug_logger.info(f"No usable cached login for {context['user']}, logging in through the form")
+    return login(context)
+
+@step_handler("open_product")
+def open_product_page(context, product):
+    try:
+        # By URL and verified by content in "direct" mode, by clicking the link in "click" mode.
+        # No trip back to the inventory: the planner only goes there when the next step needs it.
+        if not context["navigator"].open_product(product):
+            return False
+        debug_logger.info(f"Opened {product['name']} product page")
+        return True
+    except WebDriverException as e:
+        debug_logger.error(f"Failed to open {product['name']} product page: {str(e)}")
+        raise  # The step's retry policy decides whether this was transient (see retry.py)
+    except Exception as e:
+        debug_logger.error(f"Failed to open {product['name']} product page: {str(e)}")
+        return False
+
+# With an expected catalog (catalog_index.py) in the context every listed item is checked against it:
+# each wrong price or name, missing or extra product and sort-order slip is a failed test of its own
+@step_handler("check_prices")
+def check_prices(context):
+    log_item_prices(context["driver"])
+    catalog = context.get("catalog")
+    if not catalog:
+        return True
+    problems = validate_items(scraped_items, catalog, read_sort_order(context["driver"]))
+    for problem in problems:
+        context["record"](describe_problem(problem), False)
+    return not problems
+
+@step_handler("add_to_cart")
+def add_to_cart(context, product):
+    return try_add_to_cart(context["driver"], product)
+
+@step_handler("remove_from_cart")
+def remove_from_cart(context, product):
+    return try_remove_from_cart(context["driver"], product)
+
+# Fixture for removals whose adds are not in the plan: the items go into the cart through storage, in one
+# reload, instead of one add click (and badge wait) per item. UI adds only run when adding is under test.
+@step_handler("prepare_cart")
+def prepare_cart(context, items):
+    return update_cart(context["driver"], context["navigator"], add=items)
+
+# Before an add is retried: an add that timed out may still have gone through, so take the item out
+# again and let the retry start from the same cart
+@retry_recovery("add_to_cart")
+def undo_partial_add(context, product):
+    if product["item_id"] in read_cart(context["driver"]):
+        update_cart(context["driver"], context["navigator"], remove=[product])
+        debug_logger.info(f"Took {product['short_name']} out of the cart before retrying the add")
+
+# Before a removal is retried: the item has to be in the cart (the failed attempt may have removed it)
+@retry_recovery("remove_from_cart")
+def restore_item_in_cart(context, product):
+    if product["item_id"] not in read_cart(context["driver"]):
+        update_cart(context["driver"], context["navigator"], add=[product])
+        debug_logger.info(f"Put {product['short_name']} back in the cart before retrying the removal")
+
+# Logout test should be the last action
+@step_handler("logout")
+def logout(context):
+    driver = context["driver"]
+    # Attempt to open the burger menu
+    wait_for_element(driver, locator("burger_menu_button"), clickable=True).click()
+
+    # Check if the burger menu opened successfully by verifying the presence of an element within the menu
+    try:
+        # The menu slides in; wait until it is no longer hidden instead of sleeping through the animation
+        wait_for_attribute(driver, locator("burger_menu"), "aria-hidden", "false", name="burger menu open")
+        wait_for_element(driver, locator("logout_link"), clickable=True)
+        debug_logger.info("Burger menu opened successfully")
+        context["record"]("Open Burger Menu", True)
+
+        # Proceed with logout
+        act(driver, "logout_link", lambda link: link.click())
+        invalidate_elements(driver)  # Leaving the inventory
+        wait_for_element(driver, locator("username_field"))
+        debug_logger.info("Logout successful")
+        context["navigator"].arrived("login")
+        return True
+    except TimeoutException:
+        debug_logger.error("Failed to open burger menu or logout")
+        if "Open Burger Menu" not in context["succeeded"]:
+            context["record"]("Open Burger Menu", False)
+        raise  # The step's retry policy decides whether this was transient (see retry.py)
+
+# Show a message to the user; kind is "error" or "info". Must be called on the Tk main thread, so code running
+# elsewhere gets a notify function that hands the message over instead (see the UI's run worker).
+def show_message(kind, title, message):
+    from tkinter import messagebox
+    if kind == "error":
+        messagebox.showerror(title, message)
+    else:
+        messagebox.showinfo(title, message)
+
 # Function to run the Selenium test
-def run_test(browser):
+# plan is a list of steps (see plan_engine.py), e.g. [{"step": "add_to_cart", "product": "backpack"}].
+# With interactive=False no message boxes are shown and no summary file is written, so the function
+# can run inside worker processes (see matrix_runner.py); the results are returned instead.
+# With a session_pool the driver is borrowed from the pool and handed back afterwards instead of
+# being launched and quit for every run. navigation="direct" opens product pages by URL, "click" through
+# the inventory links (see navigation.py).
+# With a trace_dir every step, wait, navigation and WebDriver command of the run is traced and written there
+# as Chrome trace-event JSON (open in chrome://tracing or ui.perfetto.dev) and CSV.
+# progress and cancel_event are passed to execute_plan (per-step progress events, cancelling between steps).
+# profile picks one of drivers.performance_profiles (page-load strategy, blocked resources, animations).
+# With collect_metrics the browser's page timing is attached to the step results; a step exceeding
+# metric_thresholds (default: perf_metrics.default_thresholds) fails as too slow.
+# With a results_store (results_store.ResultsStore) the run is saved there and its id put in run_result["run_id"].
+# With a journal_path every finished step is appended to that journal (journal.py) as it happens; with
+# resume=True the journal is read first and only the steps it has no outcome for (plus what they require) run.
+# With a visual_dir the product cards are screenshotted at the visual checkpoints (visual.py) and compared with
+# the baselines in that directory, one test per changed card; update_baselines=True records new baselines instead.
+# check_prices validates the inventory against the catalog parsed from catalog_snapshot (None: only log the prices).
+# With schedule=True the steps run in dependency order (scheduler.py): dependents of a failed step are skipped
+# and product pages are loaded ahead in up to max_tabs background tabs of the same session.
+def run_test(browser, selected_user, plan, interactive=True, session_pool=None, base_url=default_base_url,
+             navigation="direct", trace_dir=None, notify=show_message, progress=None, cancel_event=None,
+             auth_cache=auth_cache, headless=False, profile="default", collect_metrics=True, metric_thresholds=None,
+             results_store=None, journal_path=None, resume=False, visual_dir=None, update_baselines=False,
+             catalog_snapshot=default_snapshot, schedule=False, max_tabs=4):
+    compiled_plan = compile_plan(plan)  # Raises PlanError before any browser is started
+    if profile not in performance_profiles:
+        raise ValueError(f"Unknown performance profile: {profile}")
+    catalog = load_catalog_index(catalog_snapshot) if catalog_snapshot else None  # Also before the browser starts
     succeeded_tests = []
     failed_tests = []
     unexecuted_tests = []
+    # Resuming: steps the journal has an outcome for keep it, only the rest (and what they require) runs
+    journal_state = read_journal(journal_path) if journal_path and resume else None
+    resumed_steps = []
+    if journal_state and journal_state["steps"]:
+        compiled_plan, kept = resume_plan(compiled_plan, journal_state["steps"])
+        for name in kept:
+            event = journal_state["steps"][name]
+            for test_name, passed in event["tests"]:
+                (succeeded_tests if passed else failed_tests).append(test_name)
+            resumed_steps.append(journal_step_result(event))
+        debug_logger.info(f"Resuming from {journal_path}: {len(kept)} steps already done, "
+                          f"running {', '.join(step['name'] for step in compiled_plan['steps']) or 'nothing'}")
+    item_prices.clear()  # Don't carry prices over from a previous run in the same process
+    scraped_items.clear()
+    reset_wait_timings()
+    reset_locator_stats()
+    start_time = time.time()
+    run_result = {
+        "user": selected_user,
+        "browser": browser,
+        "base_url": base_url,
+        "navigation": navigation,
+        "profile": profile,
+        "succeeded": succeeded_tests,
+        "failed": failed_tests,
+        "unexecuted": unexecuted_tests,
+        "item_prices": [],
+        "items": [],
+        "waits": [],
+        "locators": None,
+        "steps": resumed_steps,
+        "page_metrics": None,
+        "retries": None,
+        "visual": None,
+        "cancelled": False,
+        "started_at": time.time(),
+        "duration": 0.0,
+    }
+    if journal_state is not None:
+        run_result["resumed"] = len(resumed_steps)
     driver = None
-    if browser == "Firefox":
-        driver = webdriver.Firefox()
-        debug_logger.info("Firefox WebDriver started")
-    elif browser == "Edge":
-        driver = webdriver.Edge()
-        debug_logger.info("Edge WebDriver started")
-    elif browser == "Chrome":  # Add this block for Chrome support
-        driver = webdriver.Chrome()
-        debug_logger.info("Chrome WebDriver started")
+    driver_healthy = True
+    scheduler = None
+    if schedule and compiled_plan["steps"] and browser in supported_browsers:
+        # Ordered before the browser starts, so a plan the scheduler rejects doesn't leave one behind
+        scheduler = StepScheduler(compiled_plan, navigation, max_tabs)
+        compiled_plan = scheduler.plan
+    visual_checker = None
+    if visual_dir and compiled_plan["steps"] and browser in supported_browsers:
+        # Before the browser starts: nothing to clean up when the checks can't run here (e.g. no Pillow)
+        visual_checker = VisualChecker(visual_dir, browser, profile, update=update_baselines)
+    tracer = start_tracing(user=selected_user, browser=browser) if trace_dir else None
+    if not compiled_plan["steps"]:
+        pass  # Resumed run whose journal has every step: nothing needs a browser
+    elif browser in supported_browsers:
+        with span("start browser", "session", pooled=bool(session_pool)):
+            if session_pool:
+                driver = session_pool.checkout(browser, profile)
+            else:
+                driver = create_driver(browser, headless=headless, profile=profile)
+        if tracer:
+            instrument_driver(driver)
     else:
-        messagebox.showerror("Error", "Browser not supported")
+        if interactive:
+            notify("error", "Error", "Browser not supported")
         debug_logger.error("Attempted to start unsupported browser: %s", browser)
-        return
-
+        failed_tests.append("Start Browser")
+        run_result["error"] = f"Browser not supported: {browser}"
+        stop_tracing()
+        return run_result
+
+    journal = None
+    if journal_path:
+        journal = RunJournal(journal_path, append=journal_state is not None)
+        journal.run_started(selected_user, browser, attempt=journal_state["attempts"] + 1 if journal_state else 1)
+    context = {
+        "driver": driver,
+        "user": selected_user,
+        "browser": browser,
+        "base_url": base_url,
+        "navigator": NavigationPlanner(driver, base_url, navigation, performance_profiles[profile]["page_load_strategy"]),
+        "profile": performance_profiles[profile],
+        "auth_cache": auth_cache,
+        "interactive": interactive,
+        "notify": notify,
+        "progress": progress,
+        "cancel_event": cancel_event,
+        "succeeded": succeeded_tests,
+        "failed": failed_tests,
+        "unexecuted": unexecuted_tests,
+        "step_results": run_result["steps"],
+        "after_step": chain_hooks(metrics_hook(driver, metric_thresholds) if collect_metrics and driver else None,
+                                  visual_hook(driver, visual_checker) if visual_checker else None),
+        "journal": journal,
+        "catalog": catalog,
+    }
+    if scheduler:
+        scheduler.attach(driver, context["navigator"])
+        context["scheduler"] = scheduler
     try:
-        driver.get("https://www.saucedemo.com/")
-        debug_logger.info("Navigated to Sauce Demo")
-        time.sleep(2)  # Wait for the page to load
-
-        # Perform login using the selected user
-        selected_user = user_var.get()
-        driver.find_element(By.ID, "user-name").send_keys(selected_user)
-        driver.find_element(By.ID, "password").send_keys("secret_sauce")  # Assuming the password is the same
-        driver.find_element(By.ID, "login-button").click()
-        debug_logger.info(f"Performed login as {selected_user}")
-
-        # Check if login was successful
-        try:
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.CLASS_NAME, "inventory_list"))
-            )
-            debug_logger.info("Login successful")
-            succeeded_tests.append("Login")
-        except TimeoutException:
-            debug_logger.error("Login failed")
-            failed_tests.append("Login")  # Add login failure to the failed_tests list
-            messagebox.showerror("Error", "Login failed. Please check credentials or site status.")
-            generate_summary(selected_user, succeeded_tests, failed_tests, unexecuted_tests)
-            return  # Stop execution if login fails
-
-        time.sleep(2)  # Wait for inventory page to load
-
-        # Define the inventory page URL
-        inventory_url = "https://www.saucedemo.com/inventory.html"
-
-        # Open Sauce Labs Backpack product page
-        if open_backpack_page_var.get():
-            try:
-                element = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.ID, "item_4_title_link")))
-                driver.execute_script("arguments[0].click();", element)
-                debug_logger.info("Opened Sauce Labs Backpack product page")
-                succeeded_tests.append("Open Sauce Labs Backpack Page")
-                time.sleep(2)  # Wait for the product page to load
-                driver.get(inventory_url)  # Navigate back to the inventory page
-                time.sleep(2)  # Wait for the inventory page to load
-            except Exception as e:
-                debug_logger.error(f"Failed to open Sauce Labs Backpack product page: {str(e)}")
-                failed_tests.append("Open Sauce Labs Backpack Page")
-
-        # Open Sauce Labs Bike Light product page
-        if open_bike_light_page_var.get():
-            try:
-                element = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.ID, "item_0_title_link")))
-                driver.execute_script("arguments[0].click();", element)
-                debug_logger.info("Opened Sauce Labs Bike Light product page")
-                succeeded_tests.append("Open Sauce Labs Bike Light Page")
-                time.sleep(2)  # Wait for the product page to load
-                driver.get(inventory_url)  # Navigate back to the inventory page
-                time.sleep(2)  # Wait for the inventory page to load
-            except Exception as e:
-                debug_logger.error(f"Failed to open Sauce Labs Bike Light product page: {str(e)}")
-                failed_tests.append("Open Sauce Labs Bike Light Page")
-
-        # Open Sauce Labs Bolt T-Shirt product page
-        if open_bolt_tshirt_page_var.get():
-            try:
-                element = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.ID, "item_1_title_link")))
-                driver.execute_script("arguments[0].click();", element)
-                debug_logger.info("Opened Sauce Labs Bolt T-Shirt product page")
-                succeeded_tests.append("Open Sauce Labs Bolt T-Shirt Page")
-                time.sleep(2)
-                driver.get(inventory_url)  # Navigate back to the inventory page
-                time.sleep(2)
-            except Exception as e:
-                debug_logger.error(f"Failed to open Sauce Labs Bolt T-Shirt product page: {str(e)}")
-                failed_tests.append("Open Sauce Labs Bolt T-Shirt Page")
-
-        # Open Sauce Labs Fleece Jacket product page
-        if open_fleece_jacket_page_var.get():
-            try:
-                element = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.ID, "item_5_title_link")))
-                driver.execute_script("arguments[0].click();", element)
-                debug_logger.info("Opened Sauce Labs Fleece Jacket product page")
-                succeeded_tests.append("Open Sauce Labs Fleece Jacket Page")
-                time.sleep(2)
-                driver.get(inventory_url)  # Navigate back to the inventory page
-                time.sleep(2)
-            except Exception as e:
-                debug_logger.error(f"Failed to open Sauce Labs Fleece Jacket product page: {str(e)}")
-                failed_tests.append("Open Sauce Labs Fleece Jacket Page")
-
-        # Open Sauce Labs Onesie product page
-        if open_onesie_page_var.get():
-            try:
-                element = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.ID, "item_2_title_link")))
-                driver.execute_script("arguments[0].click();", element)
-                debug_logger.info("Opened Sauce Labs Onesie product page")
-                succeeded_tests.append("Open Sauce Labs Onesie Page")
-                time.sleep(2)
-                driver.get(inventory_url)  # Navigate back to the inventory page
-                time.sleep(2)
-            except Exception as e:
-                debug_logger.error(f"Failed to open Sauce Labs Onesie product page: {str(e)}")
-                failed_tests.append("Open Sauce Labs Onesie Page")
-
-        # Open "Test.allTheThings() T-Shirt (Red)" product page
-        if open_allthethings_tshirt_page_var.get():
-            try:
-                element = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.ID, "item_3_title_link")))
-                driver.execute_script("arguments[0].click();", element)
-                debug_logger.info("Opened Test.allTheThings() T-Shirt (Red) product page")
-                succeeded_tests.append("Open Test.allTheThings() T-Shirt (Red) Page")
-                time.sleep(2)  # Wait for the product page to load
-                driver.get(inventory_url)  # Navigate back to the inventory page
-                time.sleep(2)  # Wait for the inventory page to load
-            except Exception as e:
-                debug_logger.error(f"Failed to open Test.allTheThings() T-Shirt (Red) product page: {str(e)}")
-                failed_tests.append("Open Test.allTheThings() T-Shirt (Red) Page")
-
-        # Check if prices should be logged
-        if check_prices_var.get():
-            try:
-                log_item_prices(driver)
-                succeeded_tests.append("Check Prices")  # Add to succeeded tests if prices are checked without errors
-            except Exception as e:
-                failed_tests.append("Check Prices")  # Add to failed tests if an error occurs during price checking
-                debug_logger.error(f"Failed to check item prices: {str(e)}")
-        else:
-            unexecuted_tests.append("Check Prices")
-            debug_logger.info("Check Prices test was not executed")
-
-        # Check and add the backpack if selected
-        if backpack_var.get():
-            result = try_add_to_cart(driver, "//button[@data-test='add-to-cart-sauce-labs-backpack']", "backpack", "//button[@data-test='remove-sauce-labs-backpack']")
-            if result:
-                succeeded_tests.append("Add backpack")
-            else:
-                failed_tests.append("Add backpack")
-        else:
-            unexecuted_tests.append("Add backpack")
-            debug_logger.info("Add backpack test was not executed")
-
-        # Check and add Bike Light if selected
-        if bike_light_var.get():
-            result = try_add_to_cart(driver, "//button[@data-test='add-to-cart-sauce-labs-bike-light']", "Bike Light", "//button[@data-test='remove-sauce-labs-bike-light']")
-            if result:
-                succeeded_tests.append("Add Bike Light")
-            else:
-                failed_tests.append("Add Bike Light")
-        else:
-            unexecuted_tests.append("Add Bike Light")
-            debug_logger.info("Add Bike Light test was not executed")
-
-        # Check and add Bolt T-Shirt if selected
-        if bolt_tshirt_var.get():
-            result = try_add_to_cart(driver, "//button[@data-test='add-to-cart-sauce-labs-bolt-t-shirt']", "Bolt T-Shirt", "//button[@data-test='remove-sauce-labs-bolt-t-shirt']")
-            if result:
-                succeeded_tests.append("Add Bolt T-Shirt")
-            else:
-                failed_tests.append("Add Bolt T-Shirt")
-        else:
-            unexecuted_tests.append("Add Bolt T-Shirt")
-            debug_logger.info("Add Bolt T-Shirt test was not executed")
-
-        # Check and add Fleece Jacket if selected
-        if fleece_jacket_var.get():
-            result = try_add_to_cart(driver, "//button[@data-test='add-to-cart-sauce-labs-fleece-jacket']", "Fleece Jacket", "//button[@data-test='remove-sauce-labs-fleece-jacket']")
-            if result:
-                succeeded_tests.append("Add Fleece Jacket")
-            else:
-                failed_tests.append("Add Fleece Jacket")
-        else:
-            unexecuted_tests.append("Add Fleece Jacket")
-            debug_logger.info("Add Fleece Jacket test was not executed")
-
-        # Check and add Onesie if selected
-        if onesie_var.get():
-            result = try_add_to_cart(driver, "//button[@data-test='add-to-cart-sauce-labs-onesie']", "Onesie", "//button[@data-test='remove-sauce-labs-onesie']")
-            if result:
-                succeeded_tests.append("Add Onesie")
-            else:
-                failed_tests.append("Add Onesie")
-        else:
-            unexecuted_tests.append("Add Onesie")
-            debug_logger.info("Add Onesie test was not executed")
-
-        # Check and add "Test.allTheThings() T-Shirt (Red)" if selected
-        if allthethings_tshirt_var.get():
-            result = try_add_to_cart(driver, "//button[@data-test='add-to-cart-test.allthethings()-t-shirt-(red)']", "Test.allTheThings() T-Shirt (Red)", "//button[@data-test='remove-test.allthethings()-t-shirt-(red)']")
-            if result:
-                succeeded_tests.append("Add Test.allTheThings() T-Shirt (Red)")
-            else:
-                failed_tests.append("Add Test.allTheThings() T-Shirt (Red)")
-        else:
-            unexecuted_tests.append("Add Test.allTheThings() T-Shirt (Red)")
-            debug_logger.info("Add Test.allTheThings() T-Shirt (Red) test was not executed")
-
-        time.sleep(2)  # Wait for the action to complete
-
-        # Check and remove the backpack if selected
-        if backpack_remove_var.get():
-            result = try_remove_from_cart(driver, "//button[@data-test='remove-sauce-labs-backpack']", "backpack")
-            if result:
-                succeeded_tests.append("Remove backpack")
-            else:
-                failed_tests.append("Remove backpack")
-        else:
-            unexecuted_tests.append("Remove backpack")
-            debug_logger.info("Remove backpack test was not executed")
-
-        # Check and remove Bike Light if selected
-        if bike_light_remove_var.get():
-            result = try_remove_from_cart(driver, "//button[@data-test='remove-sauce-labs-bike-light']", "Bike Light")
-            if result:
-                succeeded_tests.append("Remove Bike Light")
-            else:
-                failed_tests.append("Remove Bike Light")
-        else:
-            unexecuted_tests.append("Remove Bike Light")
-            debug_logger.info("Remove Bike Light test was not executed")
-
-        # Check and remove Bolt T-Shirt if selected
-        if bolt_tshirt_remove_var.get():
-            result = try_remove_from_cart(driver, "//button[@data-test='remove-sauce-labs-bolt-t-shirt']", "Bolt T-Shirt")
-            if result:
-                succeeded_tests.append("Remove Bolt T-Shirt")
-            else:
-                failed_tests.append("Remove Bolt T-Shirt")
-        else:
-            unexecuted_tests.append("Remove Bolt T-Shirt")
-            debug_logger.info("Remove Bolt T-Shirt test was not executed")
-
-        # Check and remove Fleece Jacket if selected
-        if fleece_jacket_remove_var.get():
-            result = try_remove_from_cart(driver, "//button[@data-test='remove-sauce-labs-fleece-jacket']", "Fleece Jacket")
-            if result:
-                succeeded_tests.append("Remove Fleece Jacket")
-            else:
-                failed_tests.append("Remove Fleece Jacket")
-        else:
-            unexecuted_tests.append("Remove Fleece Jacket")
-            debug_logger.info("Remove Fleece Jacket test was not executed")
-
-        # Check and remove Onesie if selected
-        if onesie_remove_var.get():
-            result = try_remove_from_cart(driver, "//button[@data-test='remove-sauce-labs-onesie']", "Onesie")
-            if result:
-                succeeded_tests.append("Remove Onesie")
-            else:
-                failed_tests.append("Remove Onesie")
-        else:
-            unexecuted_tests.append("Remove Onesie")
-            debug_logger.info("Remove Onesie test was not executed")
-
-        # Check and remove "Test.allTheThings() T-Shirt (Red)" if selected
-        if allthethings_tshirt_remove_var.get():
-            result = try_remove_from_cart(driver, "//button[@data-test='remove-test.allthethings()-t-shirt-(red)']", "Test.allTheThings() T-Shirt (Red)")
-            if result:
-                succeeded_tests.append("Remove Test.allTheThings() T-Shirt (Red)")
-            else:
-                failed_tests.append("Remove Test.allTheThings() T-Shirt (Red)")
-        else:
-            unexecuted_tests.append("Remove Test.allTheThings() T-Shirt (Red)")
-            debug_logger.info("Remove Test.allTheThings() T-Shirt (Red) test was not executed")
-
-        # Logout test should be the last action
-        if logout_test_var.get():
-            # Attempt to open the burger menu
-            burger_menu_btn_xpath = "//button[@id='react-burger-menu-btn']"
-            WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, burger_menu_btn_xpath))).click()
-            time.sleep(1)  # Adjust this sleep time based on the actual behavior of your application
-            
-            # Check if the burger menu opened successfully by verifying the presence of an element within the menu
-            try:
-                logout_button_xpath = "//a[@id='logout_sidebar_link']"
-                WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, logout_button_xpath)))
-                debug_logger.info("Burger menu opened successfully")
-                succeeded_tests.append("Open Burger Menu")
-                
-                # Proceed with logout
-                driver.find_element(By.XPATH, logout_button_xpath).click()
-                logout_confirmation_element_xpath = "//input[@id='user-name']"
-                WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.XPATH, logout_confirmation_element_xpath))
-                )
-                debug_logger.info("Logout successful")
-                time.sleep(3)  # Adjust this sleep time as needed
-                succeeded_tests.append("Logout")
-            except TimeoutException:
-                debug_logger.error("Failed to open burger menu or logout")
-                failed_tests.append("Open Burger Menu")
-                failed_tests.append("Logout")
-        else:
-            unexecuted_tests.append("Logout")
-            debug_logger.info("Logout test was not executed")
-
+        with span("run", "run"):
+            execute_plan(compiled_plan, context)
     except Exception as e:
         debug_logger.exception("An error occurred during the test execution: %s", e)
+        run_result["error"] = str(e)
+        driver_healthy = False  # Don't hand a driver in an unknown state to the next run
     finally:
-        if driver:
-            driver.quit()
-            debug_logger.info("WebDriver closed")
-
-    generate_summary(selected_user, succeeded_tests, failed_tests, unexecuted_tests)
+        if scheduler:
+            try:
+                scheduler.close()
+            except Exception as e:
+                debug_logger.warning(f"Could not close the scheduler's tabs: {str(e)}")
+            run_result["scheduler"] = scheduler.stats
+        if driver and session_pool:
+            session_pool.checkin(driver, healthy=driver_healthy)
+        elif driver:
+            quit_driver(driver)
+        if visual_checker:
+            # The screenshots are taken; wait for the comparisons still running on the visual thread pool
+            run_result["visual"] = visual_checker.finish()
+            for test_name, passed in visual_outcomes(run_result["visual"]):
+                (succeeded_tests if passed else failed_tests).append(test_name)
+        run_result["item_prices"] = list(item_prices)
+        run_result["items"] = list(scraped_items)
+        run_result["waits"] = list(wait_timings)
+        run_result["locators"] = summarize_locator_stats()
+        run_result["page_metrics"] = summarize_metrics(run_result["steps"])
+        run_result["retries"] = summarize_retries(run_result["steps"])
+        run_result["cancelled"] = context.get("cancelled", False)
+        run_result["duration"] = time.time() - start_time
+        if journal:
+            journal.run_finished(run_result["duration"])
+            journal.close()
+        if tracer:
+            stop_tracing()
+            trace_prefix = os.path.join(trace_dir, f"trace_{selected_user}_{browser}_{time.strftime('%Y%m%d_%H%M%S')}")
+            run_result["trace_files"] = tracer.export(trace_prefix)
+        if results_store is not None:
+            try:
+                run_result["run_id"] = results_store.save_run(run_result)
+            except sqlite3.Error as e:
+                debug_logger.error(f"Could not save the run to {results_store.path}: {str(e)}")
+        if interactive:
+            generate_summary(run_result, notify, results_store if "run_id" in run_result else None)
+
+    return run_result
+
+# Write test_summary.txt and tell the user how the run went. With a results store the summary is rendered
+# from the stored run, so the file always matches the history; otherwise from the run result itself.
+def generate_summary(run_result, notify=show_message, results_store=None):
+    run = run_result
+    if results_store is not None and "run_id" in run_result:
+        run = results_store.load_run(run_result["run_id"])
+    failed_tests = run["failed"]
+    unexecuted_tests = run["unexecuted"]
 
-def generate_summary(selected_user, succeeded_tests, failed_tests, unexecuted_tests):
     # Generate summary in copypasta format
-    summary_lines = [
-        "🔥🔥🔥 Test Summary 🔥🔥🔥",
-        f"👤 Selected User: {selected_user}",
-        "",
-        "✅ Succeeded Tests:",
-        "-------------------"
-    ]
-    summary_lines.extend([f"✔️ {test}" for test in succeeded_tests] if succeeded_tests else ["None 😢"])
-
-    summary_lines.extend([
-        "",
-        "❌ Failed Tests:",
-        "----------------"
-    ])
-    summary_lines.extend([f"❌ {test}" for test in failed_tests] if failed_tests else ["None 🎉"])
-
-    summary_lines.extend([
-        "",
-        "⏭️ Unexecuted Tests:",
-        "---------------------"
-    ])
-    summary_lines.extend([f"⏭️ {test}" for test in unexecuted_tests] if unexecuted_tests else ["None 🚫"])
-
-    summary_lines.append("")
-
-    summary_lines.extend([
-        "",
-        "💰 Item Prices:",
-        "----------------"
-    ])
-    for item_name, item_price in item_prices:
-        summary_lines.append(f"💲{item_name}: {item_price}")
-    summary_lines.append("")
-
-    summary = "\n".join(summary_lines)
+    summary = format_summary(run)
 
     # Write summary to a file with UTF-8 encoding to support emojis and other Unicode characters
     with open("test_summary.txt", "w", encoding="utf-8") as summary_file:
@@ -442,226 +440,336 @@ def generate_summary(selected_user, succeeded_tests, failed_tests, unexecuted_te
 
     if failed_tests:
         error_message = "Test finished with problems found: the following items were not successfully processed - " + ", ".join(failed_tests)
-        messagebox.showerror("Test Finished with Problems", error_message)
+        notify("error", "Test Finished with Problems", error_message)
         debug_logger.error(error_message)
     elif unexecuted_tests:
         info_message = "Some tests were not executed: " + ", ".join(unexecuted_tests)
-        messagebox.showinfo("Test Information", info_message)
+        notify("info", "Test Information", info_message)
         debug_logger.info(info_message)
     else:
-        messagebox.showinfo("Success", "Test completed successfully without any errors.")
+        notify("info", "Success", "Test completed successfully without any errors.")
 
-# Function to start the test from the UI
+# Runs waiting for the run worker (dicts of run settings) and the worker's messages back to the UI.
+# Tk may only be touched from the main thread, so the worker never calls it: poll_ui_events does.
+run_queue = queue.Queue()
+ui_events = queue.Queue()
+run_worker_thread = None
+active_run = None  # The run the worker is executing, as last reported to the UI
+
+# Function to start the test from the UI: queue the run, the run worker executes queued runs one after another
 def start_test():
+    global run_worker_thread
     browser = browser_var.get()
     if not browser:
         messagebox.showerror("Error", "Please select a browser")
         debug_logger.error("No browser selected")
         return
-    run_test(browser)
-
-# Setting up the customtkinter UI
-ctk.set_appearance_mode("System")  # Set theme to match the system
-ctk.set_default_color_theme("blue")  # Set color theme
-
-app = ctk.CTk()  # Create the main window
-app.title("Martínkův tool na automatické testování")
-app.geometry("1000x600")  # Adjusted size to fit more checkboxes and layout
-
-# Top section for browser and user selection
-top_frame = ctk.CTkFrame(app)
-top_frame.grid(row=0, column=0, padx=10, pady=10, sticky="ew")
-
-# Create a new frame for the "Check Prices" checkbox
-prices_check_frame = ctk.CTkFrame(app)
-prices_check_frame.grid(row=0, column=1, padx=10, pady=10, sticky="nsew")
-
-# Add the "Check Prices" checkbox to this new frame
-check_prices_var = ctk.BooleanVar()
-check_prices_checkbox = ctk.CTkCheckBox(prices_check_frame, text="Check Prices", variable=check_prices_var)
-check_prices_checkbox.pack(anchor="center")
+    run = {
+        "browser": browser,
+        "user": user_var.get(),
+        "plan": collect_plan(),
+        "base_url": get_base_url(),
+        "trace_dir": trace_directory if trace_var.get() else None,
+        "profile": profile_var.get(),
+        "cancel_event": threading.Event(),
+    }
+    run_queue.put(run)
+    if run_worker_thread is None:
+        run_worker_thread = threading.Thread(target=run_worker, daemon=True)
+        run_worker_thread.start()
+    update_queue_label()
+
+# Body of the run worker thread; a None in the queue stops it
+def run_worker():
+    def notify(kind, title, message):
+        ui_events.put(("message", kind, title, message))
+
+    def progress(event):
+        ui_events.put(("progress", event))
+
+    while True:
+        run = run_queue.get()
+        if run is None:
+            break
+        ui_events.put(("run_started", run))
+        try:
+            result = run_test(run["browser"], run["user"], run["plan"], session_pool=session_pool,
+                              base_url=run["base_url"], trace_dir=run["trace_dir"], notify=notify, progress=progress,
+                              cancel_event=run["cancel_event"], profile=run["profile"], results_store=results_store)
+        except Exception as e:
+            debug_logger.exception("Run crashed: %s", e)
+            notify("error", "Error", f"The test could not be run: {str(e)}")
+            result = {"failed": ["Run"], "cancelled": False, "duration": 0.0, "error": str(e)}
+        ui_events.put(("run_finished", run, result))
+
+# Apply the worker's messages to the UI; re-schedules itself on the Tk event loop
+def poll_ui_events():
+    global active_run
+    while True:
+        try:
+            event = ui_events.get_nowait()
+        except queue.Empty:
+            break
+        if event[0] == "message":
+            show_message(*event[1:])
+        elif event[0] == "run_started":
+            active_run = event[1]
+            progress_box.delete("1.0", "end")
+            progress_box.insert("end", f"▶️ {active_run['user']} on {active_run['browser']}\n")
+            progress_bar.set(0)
+            status_label.configure(text="Starting browser...")
+            cancel_button.configure(state="normal")
+        elif event[0] == "progress":
+            step = event[1]
+            if step["event"] == "step_started":
+                status_label.configure(text=f"Running {step['name']} ({step['index'] + 1}/{step['total']})")
+            elif step["event"] == "step_skipped":
+                progress_box.insert("end", f"⏭️ {step['name']} ({step['reason']})\n")
+                progress_box.see("end")
+                progress_bar.set((step["index"] + 1) / step["total"])
+            else:
+                mark = "✔️" if step["passed"] else "❌"
+                progress_box.insert("end", f"{mark} {step['name']} ({step['duration']:.2f} s)\n")
+                progress_box.see("end")
+                progress_bar.set((step["index"] + 1) / step["total"])
+        elif event[0] == "run_finished":
+            result = event[2]
+            if result.get("cancelled"):
+                outcome = "Cancelled"
+            elif result["failed"]:
+                outcome = f"Finished with {len(result['failed'])} failed"
+            else:
+                outcome = "Finished"
+            status_label.configure(text=f"{outcome} in {result['duration']:.2f} s")
+            progress_box.insert("end", f"⏹️ {outcome}\n")
+            active_run = None
+            cancel_button.configure(state="disabled")
+        update_queue_label()
+    app.after(100, poll_ui_events)
+
+def update_queue_label():
+    queued = run_queue.qsize()
+    queue_label.configure(text=f"{queued} run(s) queued" if queued else "")
+
+# Stop the running test before its next step; queued runs still start after it
+def cancel_test():
+    if active_run is not None:
+        active_run["cancel_event"].set()
+        status_label.configure(text="Cancelling after the current step...")
+
+# The URL typed in the UI, or a local stand-in server started on first use when "Offline stand-in" is ticked
+def get_base_url():
+    global standin_server
+    if not standin_var.get():
+        return base_url_var.get().strip() or default_base_url
+    if standin_server is None:
+        standin_server, standin_url = start_standin_server()
+        base_url_var.set(standin_url)
+    return base_url_var.get()
+
+# Launch the selected browser in the background as soon as it is picked, so "Start Test" finds a warm driver
+def prewarm_browser():
+    if browser_var.get():
+        threading.Thread(target=session_pool.prewarm, args=(browser_var.get(),), kwargs={"profile": profile_var.get()},
+                         daemon=True).start()
+
+# Quit the pooled drivers together with the window, after letting a running test stop at its next step
+def close_app():
+    while True:
+        try:
+            run_queue.get_nowait()
+        except queue.Empty:
+            break
+    if active_run is not None:
+        active_run["cancel_event"].set()
+    if run_worker_thread is not None:
+        run_queue.put(None)
+        run_worker_thread.join(timeout=15)
+    session_pool.close()
+    if standin_server is not None:
+        stop_standin_server(standin_server)
+    app.destroy()
+
+# Checkbox variables of the step checkboxes, keyed by (step type, product key or None)
+step_vars = {}
+
+# Turn the ticked checkboxes into a plan for run_test
+def collect_plan():
+    plan = []
+    for (step_type, product_key), var in step_vars.items():
+        if var.get():
+            plan.append({"step": step_type, "product": product_key} if product_key else {"step": step_type})
+    return plan
+
+# A section's "Select All" checkbox toggles every product checkbox of that step type
+def select_all_in_section(step_type, select_all_var):
+    for (var_step_type, product_key), var in step_vars.items():
+        if var_step_type == step_type:
+            var.set(select_all_var.get())
+
+# Create a checkbox for every registered step (one per product for per-product steps) in the frame of its section
+def build_step_checkboxes(section_frames, default_frame):
+    for spec in step_types.values():
+        if not spec["checkbox"]:
+            continue
+        frame = section_frames.get(spec["section"], default_frame)
+        if spec["per_product"]:
+            select_all_var = ctk.BooleanVar()
+            ctk.CTkCheckBox(frame, text="Select All", variable=select_all_var,
+                            command=lambda step_type=spec["name"], var=select_all_var: select_all_in_section(step_type, var)).pack(anchor="w")
+            for product in products:
+                var = ctk.BooleanVar()
+                step_vars[(spec["name"], product["key"])] = var
+                ctk.CTkCheckBox(frame, text=spec["checkbox"].format(**product), variable=var).pack(anchor="w")
+        else:
+            var = ctk.BooleanVar(value=spec["checked"])
+            step_vars[(spec["name"], None)] = var
+            ctk.CTkCheckBox(frame, text=spec["checkbox"], variable=var).pack(anchor="w", pady=(10, 0))
+
+# Setting up the customtkinter UI (only when run as a script, so worker processes, cli.py and other code can
+# import run_test without tkinter or a display)
+if __name__ == "__main__":
+    import customtkinter as ctk
+    from tkinter import messagebox
+
+    ctk.set_appearance_mode("System")  # Set theme to match the system
+    ctk.set_default_color_theme("blue")  # Set color theme
+
+    app = ctk.CTk()  # Create the main window
+    app.title("Martínkův tool na automatické testování")
+    app.geometry("1000x800")  # Adjusted size to fit more checkboxes, layout and the progress view
+
+    # Drivers are kept alive between clicks of "Start Test"
+    session_pool = SessionPool(size=1)
+    # Every run's results are kept in results.db; test_summary.txt shows the latest one
+    results_store = ResultsStore()
+    app.protocol("WM_DELETE_WINDOW", close_app)
+
+    # Top section for browser and user selection
+    top_frame = ctk.CTkFrame(app)
+    top_frame.grid(row=0, column=0, padx=10, pady=10, sticky="ew")
+
+    # Create a new frame for the "Check Prices" checkbox
+    prices_check_frame = ctk.CTkFrame(app)
+    prices_check_frame.grid(row=0, column=1, padx=10, pady=10, sticky="nsew")
+
+    app.grid_columnconfigure(1, weight=1)  # Configure the new column for the "Check Prices" frame
+
+    # Left section for cart adding/removing
+    cart_frame = ctk.CTkFrame(app)
+    cart_frame.grid(row=1, column=0, padx=10, pady=10, sticky="nsew")
+
+    # Right section for future functionalities ("2nd section")
+    second_section_frame = ctk.CTkFrame(app)
+    second_section_frame.grid(row=1, column=1, padx=10, pady=10, sticky="nsew")
+
+    # 3rd section for price checking
+    prices_section_frame = ctk.CTkFrame(app)
+    prices_section_frame.grid(row=1, column=2, padx=10, pady=10, sticky="nsew")
+
+    # Configure the grid to allow the left, right, and prices sections to expand and fill space
+    app.grid_columnconfigure(0, weight=1)
+    app.grid_columnconfigure(1, weight=1)  # Ensure this line is present to allow the "Check Prices" section to expand properly
+    app.grid_columnconfigure(2, weight=1)
+    app.grid_rowconfigure(1, weight=1)
+
+    # Create a frame specifically for the start_test_button to control its placement and size
+    button_frame = ctk.CTkFrame(app)
+    button_frame.grid(row=2, column=0, columnspan=3, pady=20)
+    button_frame.grid_columnconfigure(0, weight=1)  # Make the frame expand to fill the grid cell
+
+    # Place the start_test_button inside this new frame, centered; while a test runs, clicking it queues another run
+    start_test_button = ctk.CTkButton(button_frame, text="Start Test", command=start_test)
+    start_test_button.pack(side="left", padx=5)
+
+    cancel_button = ctk.CTkButton(button_frame, text="Cancel", command=cancel_test, state="disabled")
+    cancel_button.pack(side="left", padx=5)
+
+    queue_label = ctk.CTkLabel(button_frame, text="")
+    queue_label.pack(side="left", padx=5)
+
+    # Live progress of the running test, fed by poll_ui_events
+    progress_frame = ctk.CTkFrame(app)
+    progress_frame.grid(row=3, column=0, columnspan=3, padx=10, pady=(0, 10), sticky="nsew")
+    progress_frame.grid_columnconfigure(0, weight=1)
+
+    status_label = ctk.CTkLabel(progress_frame, text="Idle")
+    status_label.grid(row=0, column=0, padx=10, sticky="w")
+
+    progress_bar = ctk.CTkProgressBar(progress_frame)
+    progress_bar.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
+    progress_bar.set(0)
+
+    progress_box = ctk.CTkTextbox(progress_frame, height=150)
+    progress_box.grid(row=2, column=0, padx=10, pady=(0, 10), sticky="nsew")
+
+    # Browser selection in top_frame
+    browser_var = ctk.StringVar()
+    browser_label = ctk.CTkLabel(top_frame, text="Select Browser:")
+    browser_label.grid(row=0, column=0, pady=(0, 10))
+
+    firefox_radio = ctk.CTkRadioButton(top_frame, text="Firefox", variable=browser_var, value="Firefox", command=prewarm_browser)
+    firefox_radio.grid(row=0, column=1, sticky="nsew")
+
+    edge_radio = ctk.CTkRadioButton(top_frame, text="Edge", variable=browser_var, value="Edge", command=prewarm_browser)
+    edge_radio.grid(row=0, column=2, sticky="nsew")
+
+    chrome_radio = ctk.CTkRadioButton(top_frame, text="Chrome", variable=browser_var, value="Chrome", command=prewarm_browser)
+    chrome_radio.grid(row=0, column=3, sticky="nsew")
+
+    # User selection in top_frame
+    user_label = ctk.CTkLabel(top_frame, text="Select User:")
+    user_label.grid(row=1, column=0, pady=(10, 2), sticky="w")
+
+    user_var = ctk.StringVar()
+    user_var.set(user_options[0])  # default value
+
+    user_dropdown = ctk.CTkComboBox(top_frame, values=user_options, variable=user_var)
+    user_dropdown.grid(row=1, column=1, columnspan=3, pady=(0, 10), sticky="ew")
+
+    # Site selection in top_frame: the real site or the bundled offline stand-in
+    base_url_label = ctk.CTkLabel(top_frame, text="Base URL:")
+    base_url_label.grid(row=2, column=0, pady=(0, 10), sticky="w")
+
+    base_url_var = ctk.StringVar(value=default_base_url)
+    base_url_entry = ctk.CTkEntry(top_frame, textvariable=base_url_var)
+    base_url_entry.grid(row=2, column=1, columnspan=2, pady=(0, 10), sticky="ew")
+
+    standin_server = None
+    standin_var = ctk.BooleanVar()
+    standin_checkbox = ctk.CTkCheckBox(top_frame, text="Offline stand-in", variable=standin_var)
+    standin_checkbox.grid(row=2, column=3, pady=(0, 10), sticky="w")
+
+    trace_directory = "traces"
+    trace_var = ctk.BooleanVar()
+    trace_checkbox = ctk.CTkCheckBox(top_frame, text=f"Record trace (to {trace_directory}/)", variable=trace_var)
+    trace_checkbox.grid(row=3, column=1, columnspan=3, pady=(0, 10), sticky="w")
+
+    # Performance profile (page-load strategy and blocked resources, see drivers.py)
+    profile_label = ctk.CTkLabel(top_frame, text="Profile:")
+    profile_label.grid(row=4, column=0, pady=(0, 10), sticky="w")
 
-app.grid_columnconfigure(1, weight=1)  # Configure the new column for the "Check Prices" frame
+    profile_var = ctk.StringVar(value="default")
+    profile_dropdown = ctk.CTkComboBox(top_frame, values=list(performance_profiles), variable=profile_var,
+                                       command=lambda choice: prewarm_browser())
+    profile_dropdown.grid(row=4, column=1, columnspan=3, pady=(0, 10), sticky="ew")
 
-# Left section for cart adding/removing
-cart_frame = ctk.CTkFrame(app)
-cart_frame.grid(row=1, column=0, padx=10, pady=10, sticky="nsew")
-
-# Right section for future functionalities ("2nd section")
-second_section_frame = ctk.CTkFrame(app)
-second_section_frame.grid(row=1, column=1, padx=10, pady=10, sticky="nsew")
-
-# 3rd section for price checking
-prices_section_frame = ctk.CTkFrame(app)
-prices_section_frame.grid(row=1, column=2, padx=10, pady=10, sticky="nsew")
-
-# Configure the grid to allow the left, right, and prices sections to expand and fill space
-app.grid_columnconfigure(0, weight=1)
-app.grid_columnconfigure(1, weight=1)  # Ensure this line is present to allow the "Check Prices" section to expand properly
-app.grid_columnconfigure(2, weight=1)
-app.grid_rowconfigure(1, weight=1)
-
-# Create a frame specifically for the start_test_button to control its placement and size
-button_frame = ctk.CTkFrame(app)
-button_frame.grid(row=2, column=0, columnspan=3, pady=20)
-button_frame.grid_columnconfigure(0, weight=1)  # Make the frame expand to fill the grid cell
-
-# Place the start_test_button inside this new frame, centered
-start_test_button = ctk.CTkButton(button_frame, text="Start Test", command=start_test)
-start_test_button.pack()
-
-# Browser selection in top_frame
-browser_var = ctk.StringVar()
-browser_label = ctk.CTkLabel(top_frame, text="Select Browser:")
-browser_label.grid(row=0, column=0, pady=(0, 10))
-
-firefox_radio = ctk.CTkRadioButton(top_frame, text="Firefox", variable=browser_var, value="Firefox")
-firefox_radio.grid(row=0, column=1, sticky="nsew")
-
-edge_radio = ctk.CTkRadioButton(top_frame, text="Edge", variable=browser_var, value="Edge")
-edge_radio.grid(row=0, column=2, sticky="nsew")
-
-chrome_radio = ctk.CTkRadioButton(top_frame, text="Chrome", variable=browser_var, value="Chrome")
-chrome_radio.grid(row=0, column=3, sticky="nsew")
-
-# User selection in top_frame
-user_label = ctk.CTkLabel(top_frame, text="Select User:")
-user_label.grid(row=1, column=0, pady=(10, 2), sticky="w")
-
-user_options = [
-    "standard_user",
-    "locked_out_user",
-    "problem_user",
-    "performance_glitch_user",
-    "error_user",
-    "visual_user"
-]
-
-user_var = ctk.StringVar()
-user_var.set(user_options[0])  # default value
-
-user_dropdown = ctk.CTkComboBox(top_frame, values=user_options, variable=user_var)
-user_dropdown.grid(row=1, column=1, columnspan=3, pady=(0, 10), sticky="ew")
-
-# Define the select_all_items function before referencing it
-def select_all_items():
-    is_selected = select_all_var.get()
-    backpack_var.set(is_selected)
-    bike_light_var.set(is_selected)
-    bolt_tshirt_var.set(is_selected)
-    fleece_jacket_var.set(is_selected)
-    onesie_var.set(is_selected)
-    allthethings_tshirt_var.set(is_selected)
-
-# Adding a label for the "1st Section: Add to Cart" for clarity
-cart_add_label = ctk.CTkLabel(cart_frame, text="1st Section: Add to Cart")
-cart_add_label.pack(pady=(0, 10))
-
-# Now, it's safe to create the checkbox that uses select_all_items in cart_frame
-select_all_var = ctk.BooleanVar()
-select_all_checkbox = ctk.CTkCheckBox(cart_frame, text="Select All", variable=select_all_var, command=select_all_items)
-select_all_checkbox.pack(anchor="w")
-
-backpack_var = ctk.BooleanVar()
-ctk.CTkCheckBox(cart_frame, text="Add Backpack", variable=backpack_var).pack(anchor="w")
-
-bike_light_var = ctk.BooleanVar()
-ctk.CTkCheckBox(cart_frame, text="Add Bike Light", variable=bike_light_var).pack(anchor="w")
-
-bolt_tshirt_var = ctk.BooleanVar()
-ctk.CTkCheckBox(cart_frame, text="Add Bolt T-Shirt", variable=bolt_tshirt_var).pack(anchor="w")
-
-fleece_jacket_var = ctk.BooleanVar()
-ctk.CTkCheckBox(cart_frame, text="Add Fleece Jacket", variable=fleece_jacket_var).pack(anchor="w")
-
-onesie_var = ctk.BooleanVar()
-ctk.CTkCheckBox(cart_frame, text="Add Onesie", variable=onesie_var).pack(anchor="w")
-
-allthethings_tshirt_var = ctk.BooleanVar()
-ctk.CTkCheckBox(cart_frame, text="Add Test.allTheThings() T-Shirt (Red)", variable=allthethings_tshirt_var).pack(anchor="w")
-
-cart_remove_label = ctk.CTkLabel(second_section_frame, text="2nd Section: Remove from Cart")
-cart_remove_label.pack(pady=(0, 10))
-
-# Define the select_all_items_remove function for the 2nd section
-def select_all_items_remove():
-    is_selected = select_all_remove_var.get()
-    backpack_remove_var.set(is_selected)
-    bike_light_remove_var.set(is_selected)
-    bolt_tshirt_remove_var.set(is_selected)
-    fleece_jacket_remove_var.set(is_selected)
-    onesie_remove_var.set(is_selected)
-    allthethings_tshirt_remove_var.set(is_selected)
-
-# Adding a "Select All" Checkbox to the 2nd Section
-select_all_remove_var = ctk.BooleanVar()
-select_all_remove_checkbox = ctk.CTkCheckBox(second_section_frame, text="Select All", variable=select_all_remove_var, command=select_all_items_remove)
-select_all_remove_checkbox.pack(anchor="w")
-
-# Adding checkboxes for removing items from the cart in the "2nd section"
-backpack_remove_var = ctk.BooleanVar()
-ctk.CTkCheckBox(second_section_frame, text="Remove Backpack", variable=backpack_remove_var).pack(anchor="w")
-
-bike_light_remove_var = ctk.BooleanVar()
-ctk.CTkCheckBox(second_section_frame, text="Remove Bike Light", variable=bike_light_remove_var).pack(anchor="w")
-
-bolt_tshirt_remove_var = ctk.BooleanVar()
-ctk.CTkCheckBox(second_section_frame, text="Remove Bolt T-Shirt", variable=bolt_tshirt_remove_var).pack(anchor="w")
-
-fleece_jacket_remove_var = ctk.BooleanVar()
-ctk.CTkCheckBox(second_section_frame, text="Remove Fleece Jacket", variable=fleece_jacket_remove_var).pack(anchor="w")
-
-onesie_remove_var = ctk.BooleanVar()
-ctk.CTkCheckBox(second_section_frame, text="Remove Onesie", variable=onesie_remove_var).pack(anchor="w")
-
-allthethings_tshirt_remove_var = ctk.BooleanVar()
-ctk.CTkCheckBox(second_section_frame, text="Remove Test.allTheThings() T-Shirt (Red)", variable=allthethings_tshirt_remove_var).pack(anchor="w")
-
-# Move the Logout Test checkbox setup here, under the item removal checkboxes
-logout_test_var = ctk.BooleanVar()
-logout_test_checkbox = ctk.CTkCheckBox(second_section_frame, text="Logout Test", variable=logout_test_var)
-logout_test_checkbox.pack(pady=10)
-
-# 3rd Section: Check Prices
-prices_section_label = ctk.CTkLabel(prices_section_frame, text="3rd Section: Product Pages")
-prices_section_label.pack(pady=(0, 10))
-
-# Create the "Select All" checkbox for product pages at the top
-select_all_products_var = ctk.BooleanVar()
-def select_all_products():
-    is_selected = select_all_products_var.get()
-    open_backpack_page_var.set(is_selected)
-    open_bike_light_page_var.set(is_selected)
-    open_bolt_tshirt_page_var.set(is_selected)
-    open_fleece_jacket_page_var.set(is_selected)
-    open_onesie_page_var.set(is_selected)
-    open_allthethings_tshirt_page_var.set(is_selected)
-
-select_all_products_checkbox = ctk.CTkCheckBox(prices_section_frame, text="Select All Products", variable=select_all_products_var, command=select_all_products)
-select_all_products_checkbox.pack(anchor="w")
-
-open_backpack_page_var = ctk.BooleanVar()
-open_backpack_page_checkbox = ctk.CTkCheckBox(prices_section_frame, text="Open Backpack Page", variable=open_backpack_page_var)
-open_backpack_page_checkbox.pack(anchor="w")
-
-open_bike_light_page_var = ctk.BooleanVar()
-open_bike_light_page_checkbox = ctk.CTkCheckBox(prices_section_frame, text="Open Bike Light Page", variable=open_bike_light_page_var)
-open_bike_light_page_checkbox.pack(anchor="w")
-
-open_bolt_tshirt_page_var = ctk.BooleanVar()
-open_bolt_tshirt_page_checkbox = ctk.CTkCheckBox(prices_section_frame, text="Open Bolt T-Shirt Page", variable=open_bolt_tshirt_page_var)
-open_bolt_tshirt_page_checkbox.pack(anchor="w")
+    # Section labels; the checkboxes under them are generated from the step registry (see plan_engine.py)
+    cart_add_label = ctk.CTkLabel(cart_frame, text="1st Section: Add to Cart")
+    cart_add_label.pack(pady=(0, 10))
 
-open_fleece_jacket_page_var = ctk.BooleanVar()
-open_fleece_jacket_page_checkbox = ctk.CTkCheckBox(prices_section_frame, text="Open Fleece Jacket Page", variable=open_fleece_jacket_page_var)
-open_fleece_jacket_page_checkbox.pack(anchor="w")
+    cart_remove_label = ctk.CTkLabel(second_section_frame, text="2nd Section: Remove from Cart")
+    cart_remove_label.pack(pady=(0, 10))
 
-open_onesie_page_var = ctk.BooleanVar()
-open_onesie_page_checkbox = ctk.CTkCheckBox(prices_section_frame, text="Open Onesie Page", variable=open_onesie_page_var)
-open_onesie_page_checkbox.pack(anchor="w")
+    prices_section_label = ctk.CTkLabel(prices_section_frame, text="3rd Section: Product Pages")
+    prices_section_label.pack(pady=(0, 10))
 
-open_allthethings_tshirt_page_var = ctk.BooleanVar()
-open_allthethings_tshirt_page_checkbox = ctk.CTkCheckBox(prices_section_frame, text="Open Test.allTheThings() T-Shirt (Red) Page", variable=open_allthethings_tshirt_page_var)
-open_allthethings_tshirt_page_checkbox.pack(anchor="w")
+    build_step_checkboxes({
+        "Check Prices": prices_check_frame,
+        "1st Section: Add to Cart": cart_frame,
+        "2nd Section: Remove from Cart": second_section_frame,
+        "3rd Section: Product Pages": prices_section_frame,
+    }, default_frame=prices_check_frame)
 
-app.mainloop()
+    app.after(100, poll_ui_events)
+    app.mainloop()
@@ -0,0 +1,254 @@
+import argparse
+import json
+import math
+import platform
+import statistics
+import time
+from functools import partial
+
+from automation import debug_logger, default_base_url, run_test, supported_browsers, user_options
+from drivers import create_driver, performance_profiles
+from plan_engine import PlanError, compile_plan, full_plan, load_plan, selectable_step_types
+from session_pool import SessionPool
+from standin_server import start_standin_server, stop_standin_server
+
+
+benchmark_results_filename = "benchmark_results.json"
+benchmark_summary_filename = "benchmark_summary.txt"
+
+# Statistics that can be compared against a baseline
+compared_metrics = ("min", "median", "p95", "max")
+
+
+# Nearest-rank percentile: the smallest sample that at least p percent of the samples are <= to
+def percentile(samples, p):
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def describe(samples):
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "p95": percentile(samples, 95),
+        "max": max(samples),
+    }
+
+
+# Results key of a user/browser pair; profiles other than "default" are benchmarked as pairs of their own
+def pair_key(user, browser, profile="default"):
+    return f"{user}@{browser}" if profile == "default" else f"{user}@{browser} [{profile}]"
+
+
+# Run the plan iterations + warmup times for every user/browser pair and performance profile, one run at a
+# time so the runs don't compete for CPU. The warm-up runs (browser start, caches, JIT) are executed but
+# left out of the statistics.
+def run_benchmark(users, browsers, plan, iterations=5, warmup=1, reuse=True, base_url=default_base_url,
+                  navigation="direct", headless=False, profiles=("default",)):
+    started_at = time.strftime("%Y-%m-%d %H:%M:%S")
+    pairs = {}
+    for user in users:
+        for browser in browsers:
+            for profile in profiles:
+                session_pool = SessionPool(size=1, factory=partial(create_driver, headless=headless)) if reuse else None
+                key = pair_key(user, browser, profile)
+                runs = []
+                try:
+                    for iteration in range(warmup + iterations):
+                        result = run_test(browser, user, plan, interactive=False, session_pool=session_pool,
+                                          base_url=base_url, navigation=navigation, headless=headless, profile=profile)
+                        kind = "warm-up" if iteration < warmup else "measured"
+                        debug_logger.info(f"Benchmark {key} {kind} run {iteration + 1}: {result['duration']:.2f} s")
+                        if iteration >= warmup:
+                            runs.append(result)
+                finally:
+                    if session_pool:
+                        session_pool.close()
+                pairs[key] = summarize_runs(user, browser, runs, profile)
+    return {
+        "started_at": started_at,
+        "settings": {"iterations": iterations, "warmup": warmup, "reuse": reuse, "base_url": base_url,
+                     "navigation": navigation, "headless": headless, "profiles": list(profiles),
+                     "host": platform.node(), "python": platform.python_version()},
+        "pairs": pairs,
+    }
+
+
+# Per user/browser: the profiles ordered by median run time. A profile only qualifies as the fastest
+# when none of its measured runs had a failed step, i.e. it still validates the site functionally.
+def rank_profiles(results):
+    rankings = {}
+    for pair_stats in results["pairs"].values():
+        if pair_stats["run"].get("count"):
+            rankings.setdefault(f"{pair_stats['user']}@{pair_stats['browser']}", []).append(pair_stats)
+    for candidates in rankings.values():
+        candidates.sort(key=lambda pair_stats: pair_stats["run"]["median"])
+    return rankings
+
+
+# Per-step and whole-run statistics (in seconds) of one pair's measured runs
+def summarize_runs(user, browser, runs, profile="default"):
+    step_samples = {}
+    step_failures = {}
+    for result in runs:
+        for step in result.get("steps", []):
+            step_samples.setdefault(step["name"], []).append(step["duration"])
+            if not step["passed"]:
+                step_failures[step["name"]] = step_failures.get(step["name"], 0) + 1
+    return {
+        "user": user,
+        "browser": browser,
+        "profile": profile,
+        "runs": len(runs),
+        "failed_runs": sum(1 for result in runs if result["failed"] or result.get("error")),
+        "run": describe([result["duration"] for result in runs]),
+        "steps": {name: dict(describe(samples), failures=step_failures.get(name, 0))
+                  for name, samples in step_samples.items()},
+    }
+
+
+# Compare every statistic of the current results with the baseline. A value regresses when it is more than
+# threshold (relative, 0.1 = 10%) AND more than min_delta seconds slower; the absolute floor keeps
+# millisecond-sized steps from flagging on noise.
+def compare_with_baseline(current, baseline, threshold=0.1, min_delta=0.05, metrics=("median", "p95")):
+    regressions = []
+    improvements = []
+    for pair, pair_stats in current["pairs"].items():
+        baseline_pair = baseline["pairs"].get(pair)
+        if baseline_pair is None:
+            continue
+        entries = [("Run", pair_stats["run"], baseline_pair["run"])]
+        entries.extend((name, stats, baseline_pair["steps"].get(name)) for name, stats in pair_stats["steps"].items())
+        for name, stats, baseline_stats in entries:
+            if not baseline_stats or not baseline_stats.get("count") or not stats.get("count"):
+                continue
+            for metric in metrics:
+                old, new = baseline_stats[metric], stats[metric]
+                delta = new - old
+                change = delta / old if old else math.inf
+                entry = {"pair": pair, "name": name, "metric": metric, "baseline": old, "current": new,
+                         "delta": delta, "change": change}
+                if delta > min_delta and change > threshold:
+                    regressions.append(entry)
+                elif -delta > min_delta and -change > threshold:
+                    improvements.append(entry)
+    return {"threshold": threshold, "min_delta": min_delta, "metrics": list(metrics),
+            "regressions": regressions, "improvements": improvements}
+
+
+def format_change(entry):
+    return (f"{entry['pair']} {entry['name']} {entry['metric']}: {entry['baseline']:.3f} s -> {entry['current']:.3f} s "
+            f"({entry['change']:+.0%})")
+
+
+def generate_benchmark_summary(results, comparison=None):
+    settings = results["settings"]
+    summary_lines = [
+        "🔥🔥🔥 Benchmark Summary 🔥🔥🔥",
+        f"🔁 Iterations: {settings['iterations']} measured + {settings['warmup']} warm-up per pair",
+        "",
+    ]
+    for pair, pair_stats in results["pairs"].items():
+        run = pair_stats["run"]
+        summary_lines.append(f"📋 {pair} ({pair_stats['failed_runs']} of {pair_stats['runs']} runs with failures)")
+        summary_lines.append("-" * (len(pair) + 4))
+        rows = [("Run", run)] + list(pair_stats["steps"].items())
+        for name, stats in rows:
+            if not stats.get("count"):
+                summary_lines.append(f"⏱️ {name}: no measured runs")
+                continue
+            summary_lines.append(f"⏱️ {name}: min {stats['min']:.3f} s, median {stats['median']:.3f} s, "
+                                 f"p95 {stats['p95']:.3f} s, max {stats['max']:.3f} s")
+        summary_lines.append("")
+
+    if len(settings.get("profiles", [])) > 1:
+        summary_lines.extend(["🏁 Profiles (fastest median first):", "----------------------------------"])
+        for pair, candidates in rank_profiles(results).items():
+            passing = [candidate for candidate in candidates if not candidate["failed_runs"]]
+            fastest = f", fastest that passes: {passing[0]['profile']}" if passing else ", none passes"
+            summary_lines.append(f"📋 {pair}{fastest}")
+            for candidate in candidates:
+                status = "❌" if candidate["failed_runs"] else "✅"
+                summary_lines.append(f"{status} {candidate['profile']}: median {candidate['run']['median']:.3f} s")
+        summary_lines.append("")
+
+    if comparison is not None:
+        summary_lines.extend([f"📉 Regressions (> {comparison['threshold']:.0%} and > {comparison['min_delta']} s):",
+                              "-------------------"])
+        summary_lines.extend([f"❌ {format_change(entry)}" for entry in comparison["regressions"]]
+                             if comparison["regressions"] else ["None 🎉"])
+        summary_lines.extend(["", "📈 Improvements:", "----------------"])
+        summary_lines.extend([f"✔️ {format_change(entry)}" for entry in comparison["improvements"]]
+                             if comparison["improvements"] else ["None"])
+        summary_lines.append("")
+
+    summary = "\n".join(summary_lines)
+    with open(benchmark_summary_filename, "w", encoding="utf-8") as summary_file:
+        summary_file.write(summary)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a test plan: run it N times per user/browser and compare with a baseline")
+    parser.add_argument("--users", nargs="+", default=[user_options[0]], choices=user_options, help="users to benchmark (default: standard_user)")
+    parser.add_argument("--browsers", nargs="+", default=[supported_browsers[0]], choices=supported_browsers, help="browsers to benchmark (default: Firefox)")
+    parser.add_argument("--headless", action="store_true", help="run the browsers without windows")
+    parser.add_argument("--profiles", nargs="+", default=["default"], choices=list(performance_profiles),
+                        help="performance profiles to benchmark against each other (default: default)")
+    parser.add_argument("--iterations", type=int, default=5, help="measured runs per pair (default: 5)")
+    parser.add_argument("--warmup", type=int, default=1, help="warm-up runs per pair left out of the statistics (default: 1)")
+    parser.add_argument("--no-reuse", action="store_true", help="launch a fresh browser for every run instead of reusing a warm one")
+    parser.add_argument("--base-url", default=default_base_url, help=f"site to test (default: {default_base_url})")
+    parser.add_argument("--standin", action="store_true", help="benchmark against the local stand-in server (no network noise)")
+    parser.add_argument("--navigation", choices=["direct", "click"], default="direct", help="how product pages are opened")
+    parser.add_argument("--plan", help="JSON plan file to run (default: every step for every product)")
+    parser.add_argument("--steps", nargs="+", choices=selectable_step_types(), help="run only these step types, for every product")
+    parser.add_argument("--output", default=benchmark_results_filename, help=f"where to write the results (default: {benchmark_results_filename})")
+    parser.add_argument("--baseline", help="results file of an earlier benchmark to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown that counts as a regression (default: 0.1 = 10%%)")
+    parser.add_argument("--min-delta", type=float, default=0.05, help="ignore slowdowns smaller than this many seconds (default: 0.05)")
+    parser.add_argument("--metrics", nargs="+", choices=compared_metrics, default=["median", "p95"], help="statistics to compare (default: median p95)")
+    args = parser.parse_args()
+
+    if args.iterations < 1 or args.warmup < 0:
+        parser.error("--iterations must be at least 1 and --warmup at least 0")
+    plan = load_plan(args.plan) if args.plan else full_plan()
+    if args.steps:
+        plan = [step for step in plan if step["step"] in args.steps]
+    try:
+        compile_plan(plan)
+    except PlanError as e:
+        parser.error(str(e))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)  # Read up front so a bad path fails before the benchmark runs
+
+    standin_server = None
+    base_url = args.base_url
+    if args.standin:
+        standin_server, base_url = start_standin_server()
+    try:
+        results = run_benchmark(args.users, args.browsers, plan, iterations=args.iterations, warmup=args.warmup,
+                                reuse=not args.no_reuse, base_url=base_url, navigation=args.navigation,
+                                headless=args.headless, profiles=args.profiles)
+    finally:
+        if standin_server is not None:
+            stop_standin_server(standin_server)
+
+    comparison = None
+    if baseline is not None:
+        comparison = compare_with_baseline(results, baseline, args.threshold, args.min_delta, args.metrics)
+        results["comparison"] = comparison
+    with open(args.output, "w", encoding="utf-8") as results_file:
+        json.dump(results, results_file, indent=2)
+    print(generate_benchmark_summary(results, comparison))
+    return 1 if comparison and comparison["regressions"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,72 @@
+import logging
+from selenium.common.exceptions import TimeoutException
+
+from plan_engine import products
+from tracing import span
+from waits import wait_for_cart_count
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+# The site keeps the cart client-side: a JSON list of item ids in localStorage, read when a page loads
+cart_storage_key = "cart-contents"
+
+read_cart_script = """
+try { return JSON.parse(window.localStorage.getItem(arguments[0]) || "[]"); } catch (e) { return []; }
+"""
+
+write_cart_script = """
+if (arguments[1].length) { window.localStorage.setItem(arguments[0], JSON.stringify(arguments[1])); }
+else { window.localStorage.removeItem(arguments[0]); }
+"""
+
+# data-test of every add/remove button on the inventory page
+cart_buttons_script = """
+return Array.prototype.map.call(document.querySelectorAll(".inventory_item button.btn_inventory"),
+                                function (button) { return button.getAttribute("data-test"); });
+"""
+
+
+def read_cart(driver):
+    return driver.execute_script(read_cart_script, cart_storage_key)
+
+
+# Put exactly these products (catalog entries, see plan_engine.products) in the cart without clicking:
+# write the storage, reload the inventory and check that the badge and the buttons show the new cart.
+# Must be called on a page of the site (storage is per origin). Returns True when the page agrees.
+def seed_cart(driver, navigator, cart_products):
+    item_ids = [product["item_id"] for product in cart_products]
+    with span("seed cart", "fixture", items=len(item_ids)):
+        driver.execute_script(write_cart_script, cart_storage_key, item_ids)
+        navigator.goto("inventory")
+        return verify_cart(driver, cart_products)
+
+
+def clear_cart(driver, navigator):
+    return seed_cart(driver, navigator, [])
+
+
+# Add and/or take out products, keeping whatever else is in the cart
+def update_cart(driver, navigator, add=(), remove=()):
+    removed_ids = {product["item_id"] for product in remove}
+    cart_ids = {item_id for item_id in read_cart(driver) if item_id not in removed_ids}
+    cart_ids.update(product["item_id"] for product in add)
+    return seed_cart(driver, navigator, [product for product in products if product["item_id"] in cart_ids])
+
+
+# The inventory page shows the cart: the badge counts it and every item in it has a "Remove" button
+def verify_cart(driver, cart_products):
+    try:
+        wait_for_cart_count(driver, len(cart_products))
+    except TimeoutException:
+        debug_logger.error(f"Cart badge does not show {len(cart_products)} items after seeding the cart")
+        return False
+    buttons = set(driver.execute_script(cart_buttons_script))
+    in_cart = {product["item_id"] for product in cart_products}
+    wrong = [product["name"] for product in products
+             if f"{'remove' if product['item_id'] in in_cart else 'add-to-cart'}-{product['slug']}" not in buttons]
+    if wrong:
+        debug_logger.error(f"Cart buttons don't match the seeded cart for: {', '.join(wrong)}")
+        return False
+    debug_logger.info(f"Cart seeded with {len(cart_products)} items")
+    return True
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from decimal import Decimal
+from html.parser import HTMLParser
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+default_snapshot = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Swag Labs.htm")
+default_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".catalog_cache")
+
+
+# Pulls the product catalog (id, name, description, price, button slug, image) out of a saved inventory page
+class SnapshotParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.products = []
+        self.current = None
+        self.capture = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get("class") or "").split()
+        if tag == "div" and "inventory_item" in classes:
+            self.current = {"id": None, "name": "", "desc": "", "price": "", "slug": "", "image": ""}
+            self.products.append(self.current)
+        if self.current is None:
+            return
+        element_id = attrs.get("id") or ""
+        if tag == "a" and element_id.startswith("item_") and element_id.endswith("_title_link"):
+            self.current["id"] = int(element_id.split("_")[1])
+        elif tag == "img" and attrs.get("src"):
+            self.current["image"] = attrs["src"].rsplit("/", 1)[-1]
+        elif tag == "button" and (attrs.get("data-test") or "").startswith("add-to-cart-"):
+            self.current["slug"] = attrs["data-test"][len("add-to-cart-"):]
+        for field in ("name", "desc", "price"):
+            if f"inventory_item_{field}" in classes:
+                self.capture = field
+
+    def handle_endtag(self, tag):
+        if tag == "div":
+            self.capture = None
+
+    def handle_data(self, data):
+        if self.current is not None and self.capture:
+            self.current[self.capture] += data
+
+
+def parse_snapshot(path=default_snapshot):
+    parser = SnapshotParser()
+    with open(path, encoding="utf-8") as snapshot_file:
+        parser.feed(snapshot_file.read())
+    products = []
+    for product in parser.products:
+        if product["id"] is None:
+            continue
+        product["name"] = product["name"].strip()
+        product["desc"] = " ".join(product["desc"].split())
+        product["price"] = product["price"].strip()
+        products.append(product)
+    return products
+
+
+# "$29.99" -> Decimal("29.99"); None for anything that isn't a dollar amount with cents
+def parse_price(text):
+    match = re.fullmatch(r"\$\s*(\d+\.\d{2})", (text or "").strip())
+    return Decimal(match.group(1)) if match else None
+
+
+# Expected catalog: item id -> name, exact price and position in the snapshot. Parsed once per snapshot
+# content: the index is kept in memory and as JSON in cache_dir under the snapshot's SHA-256 (a cache that
+# can't be written is only logged).
+loaded_indexes = {}
+
+
+def load_catalog_index(snapshot=default_snapshot, cache_dir=default_cache_dir):
+    with open(snapshot, "rb") as snapshot_file:
+        digest = hashlib.sha256(snapshot_file.read()).hexdigest()
+    if digest in loaded_indexes:
+        return loaded_indexes[digest]
+    cache_path = os.path.join(cache_dir, f"catalog_{digest[:16]}.json") if cache_dir else None
+    entries = None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, encoding="utf-8") as cache_file:
+                entries = json.load(cache_file)["products"]
+        except (OSError, ValueError, KeyError) as e:
+            debug_logger.warning(f"Ignoring unreadable catalog cache {cache_path}: {str(e)}")
+    if entries is None:
+        entries = [{"item_id": product["id"], "name": product["name"], "price": product["price"]}
+                   for product in parse_snapshot(snapshot)]
+        if cache_path:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                with open(cache_path, "w", encoding="utf-8") as cache_file:
+                    json.dump({"snapshot": os.path.basename(snapshot), "sha256": digest, "products": entries},
+                              cache_file, indent=2)
+            except OSError as e:
+                debug_logger.warning(f"Could not write the catalog cache {cache_path}: {str(e)}")
+    index = {entry["item_id"]: dict(entry, price=parse_price(entry["price"]), position=position)
+             for position, entry in enumerate(entries)}
+    loaded_indexes[digest] = index
+    return index
+
+
+# The order the inventory is sorted in (the value of the sort dropdown); "az" when the page has no dropdown
+sort_order_script = """
+var select = document.querySelector(".product_sort_container");
+return select ? select.value : null;
+"""
+
+# Sort order -> (key, descending): the listed items must be in the order of the key, reversed when descending
+sort_keys = {
+    "az": (lambda item: item["name"], False),
+    "za": (lambda item: item["name"], True),
+    "lohi": (lambda item: item["price"], False),
+    "hilo": (lambda item: item["price"], True),
+}
+
+
+def read_sort_order(driver):
+    return driver.execute_script(sort_order_script) or "az"
+
+
+# Check scraped inventory rows (dom_extract.scrape_inventory) against the index in one pass: every row
+# must be a known product with its name and exact price, listed once, in the page's sort order, and every
+# product of the index must be listed. Returns the problems found, each a dict with kind, item_id, name,
+# expected and found.
+def validate_items(scraped_items, index, sort_order="az"):
+    problems = []
+    seen = set()
+    previous = None
+    sort_key, descending = sort_keys.get(sort_order, (None, False))
+    for item in scraped_items:
+        item_id, name = item.get("item_id"), item.get("name")
+        expected = index.get(item_id)
+        price = parse_price(item.get("price"))
+        if expected is None:
+            problems.append({"kind": "extra", "item_id": item_id, "name": name, "expected": None,
+                             "found": item.get("price")})
+            continue
+        if item_id in seen:
+            problems.append({"kind": "duplicate", "item_id": item_id, "name": name, "expected": None, "found": None})
+            continue
+        seen.add(item_id)
+        if name != expected["name"]:
+            problems.append({"kind": "name", "item_id": item_id, "name": expected["name"], "expected": expected["name"],
+                             "found": name})
+        if price != expected["price"]:
+            problems.append({"kind": "price", "item_id": item_id, "name": expected["name"],
+                             "expected": expected["price"], "found": price if price is not None else item.get("price")})
+        if sort_key and price is not None:
+            current = {"name": name or "", "price": price}
+            if previous is not None and (sort_key(previous) < sort_key(current) if descending
+                                         else sort_key(current) < sort_key(previous)):
+                problems.append({"kind": "sort", "item_id": item_id, "name": expected["name"], "expected": sort_order,
+                                 "found": f"after {previous['name']}"})
+            previous = current
+    problems.extend({"kind": "missing", "item_id": item_id, "name": expected["name"], "expected": expected["price"],
+                     "found": None} for item_id, expected in index.items() if item_id not in seen)
+    return problems
+
+
+# Test name of a problem, e.g. "Price of Sauce Labs Onesie: $8.99 (expected $7.99)"
+def describe_problem(problem):
+    kind, name = problem["kind"], problem["name"]
+    if kind == "price":
+        found = f"${problem['found']}" if isinstance(problem["found"], Decimal) else repr(problem["found"])
+        return f"Price of {name}: {found} (expected ${problem['expected']})"
+    if kind == "name":
+        return f"Name of item {problem['item_id']}: {problem['found']} (expected {problem['expected']})"
+    if kind == "sort":
+        return f"Sort order ({problem['expected']}): {name} listed {problem['found']}"
+    if kind == "missing":
+        return f"Missing from inventory: {name}"
+    if kind == "extra":
+        return f"Not in catalog: {name} (item {problem['item_id']})"
+    return f"Listed twice: {name}"
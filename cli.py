@@ -0,0 +1,110 @@
+import argparse
+import json
+import sys
+
+# Only modules without Selenium or tkinter are imported up front, so --help and --validate return at once;
+# the test machinery (automation.py and Selenium) is imported when a run actually starts.
+from catalog_index import default_snapshot
+from drivers import performance_profiles, supported_browsers
+from perf_metrics import parse_thresholds
+from plan_engine import PlanError, compile_plan, default_base_url, full_plan, load_plan, selectable_step_types, user_options
+from results_store import ResultsStore, default_results_db
+
+
+# Messages run_test would show in a messagebox go to stderr, keeping stdout free for --json -
+def print_message(kind, title, message):
+    print(f"{'ERROR' if kind == 'error' else 'INFO'}: {title}: {message}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Sauce Demo test from the command line (no GUI needed)")
+    parser.add_argument("--user", default=user_options[0], choices=user_options, help=f"user to log in as (default: {user_options[0]})")
+    parser.add_argument("--browser", default=supported_browsers[0], choices=supported_browsers, help=f"browser to use (default: {supported_browsers[0]})")
+    parser.add_argument("--headless", action="store_true", help="run the browser without a window (for machines without a display)")
+    parser.add_argument("--profile", default="default", choices=list(performance_profiles),
+                        help="performance profile: page-load strategy and blocked resources (default: default)")
+    parser.add_argument("--plan", help="JSON plan file to run (default: every step for every product)")
+    parser.add_argument("--steps", nargs="+", choices=selectable_step_types(), help="run only these step types, for every product")
+    parser.add_argument("--base-url", default=default_base_url, help=f"site to test (default: {default_base_url})")
+    parser.add_argument("--standin", action="store_true", help="test against a local stand-in server built from 'Swag Labs.htm' (no network needed)")
+    parser.add_argument("--navigation", choices=["direct", "click"], default="direct",
+                        help="open product pages by URL (direct, default) or by clicking the inventory links (click)")
+    parser.add_argument("--trace-dir", help="write a Chrome trace (JSON) and CSV of the run to this directory")
+    parser.add_argument("--slow-threshold", action="append", metavar="NAME=MS",
+                        help="page timing limit that fails a step as too slow, e.g. load_ms=3000 or long_tasks_ms=off "
+                             "(names: ttfb_ms, load_ms, first_contentful_paint_ms, long_tasks_ms)")
+    parser.add_argument("--no-metrics", action="store_true", help="don't collect browser page timing")
+    parser.add_argument("--db", default=default_results_db, help=f"results database the run is saved to (default: {default_results_db})")
+    parser.add_argument("--no-store", action="store_true", help="don't save the run to the results database")
+    parser.add_argument("--journal", metavar="FILE", help="append every finished step to this JSONL journal as the run goes")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the run recorded in --journal: only steps without an outcome there run again")
+    parser.add_argument("--visual-dir", metavar="DIR",
+                        help="compare the product cards with the baseline screenshots in DIR (made on the first run)")
+    parser.add_argument("--update-baselines", action="store_true", help="save this run's screenshots as the new baselines")
+    parser.add_argument("--catalog", metavar="FILE", default=default_snapshot,
+                        help="saved inventory page with the expected products and prices (default: 'Swag Labs.htm')")
+    parser.add_argument("--no-catalog-check", action="store_true", help="only log the prices, don't check them against --catalog")
+    parser.add_argument("--schedule", action="store_true",
+                        help="run steps in dependency order: skip dependents of failed steps, load product pages ahead in tabs")
+    parser.add_argument("--max-tabs", type=int, default=4, help="background tabs --schedule keeps open at most (default: 4, 0 for none)")
+    parser.add_argument("--json", metavar="FILE", help="write the run result as JSON to FILE ('-' for stdout)")
+    parser.add_argument("--validate", action="store_true", help="only check the plan and print the steps it would run")
+    args = parser.parse_args(argv)
+    if args.resume and not args.journal:
+        parser.error("--resume needs --journal")
+    if args.update_baselines and not args.visual_dir:
+        parser.error("--update-baselines needs --visual-dir")
+
+    plan = load_plan(args.plan) if args.plan else full_plan()
+    if args.steps:
+        plan = [step for step in plan if step["step"] in args.steps]
+    try:
+        compiled = compile_plan(plan)
+        if args.schedule:
+            # The order run_test will use, for the same navigation mode (click navigation opens no tabs)
+            from scheduler import StepScheduler
+            compiled = StepScheduler(compiled, args.navigation, args.max_tabs).plan
+    except (PlanError, ValueError) as e:
+        parser.error(str(e))
+    try:
+        metric_thresholds = parse_thresholds(args.slow_threshold)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.validate:
+        for step in compiled["steps"]:
+            print(step["name"])
+        return 0
+
+    from automation import run_test
+    from standin_server import start_standin_server, stop_standin_server
+
+    results_store = None if args.no_store else ResultsStore(args.db)
+    standin_server = None
+    base_url = args.base_url
+    if args.standin:
+        standin_server, base_url = start_standin_server()
+    try:
+        result = run_test(args.browser, args.user, plan, session_pool=None, base_url=base_url,
+                          navigation=args.navigation, trace_dir=args.trace_dir, notify=print_message,
+                          headless=args.headless, profile=args.profile, collect_metrics=not args.no_metrics,
+                          metric_thresholds=metric_thresholds, results_store=results_store,
+                          journal_path=args.journal, resume=args.resume, visual_dir=args.visual_dir,
+                          update_baselines=args.update_baselines,
+                          catalog_snapshot=None if args.no_catalog_check else args.catalog,
+                          schedule=args.schedule, max_tabs=args.max_tabs)
+    finally:
+        if standin_server is not None:
+            stop_standin_server(standin_server)
+
+    if args.json == "-":
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, "w", encoding="utf-8") as json_file:
+            json.dump(result, json_file, indent=2)
+    return 1 if result["failed"] or result.get("error") else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
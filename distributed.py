@@ -0,0 +1,585 @@
+import argparse
+import json
+import logging
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import closing
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+from drivers import create_driver, performance_profiles, supported_browsers
+from perf_metrics import parse_thresholds
+from plan_engine import PlanError, compile_plan, default_base_url, full_plan, load_plan, selectable_step_types, user_options
+from results_store import ResultsStore, default_results_db
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+# Coordinator/worker mode: the coordinator holds the (user, browser) jobs of a matrix and hands them out over
+# HTTP (JSON POSTs) to workers on any machine that can reach it; the workers run them with run_test.
+#   /register   {name}                            -> {worker_id, heartbeat_interval}
+#   /lease      {worker_id}                       -> {job} or {job: null, done}: the next job, or whether all are done
+#   /heartbeat  {worker_id}                       -> {ok}: the worker is alive (keeps its jobs leased)
+#   /step       {worker_id, job_id, step_result}  -> {ok}: a step finished (streamed while the job runs)
+#   /result     {worker_id, job_id, result}       -> {accepted}: the job's run_test result
+#   GET /status                                   -> job and worker counts
+# A worker that misses heartbeats for worker_timeout seconds is dead; its jobs go back to the queue (up to
+# max_attempts leases per job). Only the result of the worker a job is leased to counts: a late one from a
+# worker given up on (whose job went back to the queue or to another worker) is ignored. When no worker is
+# left to run the remaining jobs (see wait_for_jobs), they count as failed instead of keeping the run waiting.
+
+
+def failed_result(user, browser, error):
+    return {"user": user, "browser": browser, "succeeded": [], "failed": ["Run"], "unexecuted": [],
+            "item_prices": [], "duration": 0.0, "error": error}
+
+
+# One job per (user, browser) pair, like matrix_runner. settings are the run_test arguments every job shares.
+def make_jobs(users, browsers, plan, settings):
+    return [{"id": f"{user}@{browser}", "user": user, "browser": browser, "plan": plan, "settings": settings}
+            for user in users for browser in browsers]
+
+
+class Coordinator:
+    def __init__(self, jobs, heartbeat_interval=2.0, worker_timeout=10.0, max_attempts=3, results_store=None):
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_timeout = worker_timeout
+        self.max_attempts = max_attempts
+        self.results_store = results_store
+        self.order = [job["id"] for job in jobs]
+        self.jobs = {job["id"]: dict(job, status="pending", worker=None, attempts=0, steps=[], result=None)
+                     for job in jobs}
+        self.pending = deque(self.order)
+        self.workers = {}
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        self.unsaved = []  # Jobs done whose results store_results hasn't saved yet
+        self.saving = 0  # store_results calls in progress
+        if not jobs:
+            self.finished.set()
+
+    def register(self, name):
+        worker_id = uuid.uuid4().hex[:12]
+        with self.lock:
+            self.workers[worker_id] = {"name": name, "last_seen": time.monotonic(), "alive": True, "jobs": 0}
+        debug_logger.info(f"Worker {name} registered as {worker_id}")
+        return {"worker_id": worker_id, "heartbeat_interval": self.heartbeat_interval}
+
+    # Also counts as a heartbeat. A worker that was given up on and comes back is taken in again.
+    def heartbeat(self, worker_id):
+        with self.lock:
+            worker = self.workers.get(worker_id)
+            if worker is None:
+                return {"ok": False}
+            worker["last_seen"] = time.monotonic()
+            if not worker["alive"]:
+                worker["alive"] = True
+                debug_logger.info(f"Worker {worker['name']} is back")
+        return {"ok": True}
+
+    def lease(self, worker_id):
+        if not self.heartbeat(worker_id)["ok"]:
+            return {"job": None, "done": self.finished.is_set(), "error": "unknown worker"}
+        with self.lock:
+            if not self.pending:
+                return {"job": None, "done": self.finished.is_set()}
+            job = self.jobs[self.pending.popleft()]
+            job.update(status="leased", worker=worker_id, steps=[])
+            job["attempts"] += 1
+            self.workers[worker_id]["jobs"] += 1
+            worker_name = self.workers[worker_id]["name"]
+        debug_logger.info(f"Job {job['id']} leased to {worker_name} (attempt {job['attempts']})")
+        return {"job": {key: job[key] for key in ("id", "user", "browser", "plan", "settings")}, "done": False}
+
+    def step(self, worker_id, job_id, step_result):
+        self.heartbeat(worker_id)
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job["status"] != "leased" or job["worker"] != worker_id:
+                return {"ok": False}
+            job["steps"].append(step_result)
+        debug_logger.info(f"[{job_id}] {step_result['name']} {'passed' if step_result['passed'] else 'failed'} "
+                          f"in {step_result['duration']:.2f} s")
+        return {"ok": True}
+
+    def complete(self, worker_id, job_id, result):
+        self.heartbeat(worker_id)
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job["status"] != "leased" or job["worker"] != worker_id:
+                debug_logger.info(f"Ignoring the result for {job_id} from {worker_id}, not its current worker")
+                return {"accepted": False}
+            result["worker"] = self.workers[worker_id]["name"]
+            self.finish_job(job, result)
+        self.store_results()
+        return {"accepted": True}
+
+    # Called with the lock held; the caller runs store_results once it has let go of the lock
+    def finish_job(self, job, result):
+        job.update(status="done", result=result)
+        self.unsaved.append(job)
+        debug_logger.info(f"Job {job['id']} finished: {len(result['succeeded'])} succeeded, "
+                          f"{len(result['failed'])} failed")
+
+    # Save the results of the jobs finished since the last call, without the lock: a slow write doesn't hold
+    # up heartbeats and leases. A result the store can't save still finishes its job. The run is finished
+    # once every job is done and saved.
+    def store_results(self):
+        with self.lock:
+            jobs, self.unsaved = self.unsaved, []
+            self.saving += 1
+        try:
+            for job in jobs:
+                if self.results_store is None:
+                    continue
+                try:
+                    job["result"]["run_id"] = self.results_store.save_run(job["result"])
+                except sqlite3.Error as e:
+                    debug_logger.error(f"Could not save {job['id']} to {self.results_store.path}: {str(e)}")
+        finally:
+            with self.lock:
+                self.saving -= 1
+                if (not self.saving and not self.unsaved
+                        and all(job["status"] == "done" for job in self.jobs.values())):
+                    self.finished.set()
+
+    # Give up on workers that stopped sending heartbeats and put their jobs back in the queue
+    def reap(self):
+        now = time.monotonic()
+        with self.lock:
+            for worker_id, worker in self.workers.items():
+                if not worker["alive"] or now - worker["last_seen"] <= self.worker_timeout:
+                    continue
+                worker["alive"] = False
+                debug_logger.warning(f"Worker {worker['name']} missed its heartbeats, reassigning its jobs")
+                for job in self.jobs.values():
+                    if job["status"] != "leased" or job["worker"] != worker_id:
+                        continue
+                    if job["attempts"] >= self.max_attempts:
+                        self.finish_job(job, failed_result(job["user"], job["browser"],
+                                                           f"Gave up after losing {job['attempts']} workers"))
+                    else:
+                        job.update(status="pending", worker=None)
+                        self.pending.appendleft(job["id"])
+        self.store_results()
+
+    # Fail every job that isn't done, e.g. because no worker is left to run it
+    def abandon(self, reason):
+        with self.lock:
+            self.pending.clear()
+            for job in self.jobs.values():
+                if job["status"] != "done":
+                    debug_logger.warning(f"Job {job['id']} abandoned: {reason}")
+                    self.finish_job(job, failed_result(job["user"], job["browser"], reason))
+        self.store_results()
+
+    # Seconds since any worker was last heard from (since the start while none has registered)
+    def idle_for(self):
+        with self.lock:
+            last_seen = max((worker["last_seen"] for worker in self.workers.values()), default=self.started)
+        return time.monotonic() - last_seen
+
+    def status(self):
+        with self.lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return {"jobs": counts, "workers": sum(worker["alive"] for worker in self.workers.values()),
+                    "done": self.finished.is_set()}
+
+    # Results in job order (the order of the matrix), once finished
+    def results(self):
+        with self.lock:
+            return [self.jobs[job_id]["result"] for job_id in self.order]
+
+
+class CoordinatorRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "AutomationCoordinator/1.0"
+    routes = {"/register": "register", "/lease": "lease", "/heartbeat": "heartbeat", "/step": "step",
+              "/result": "complete"}
+
+    def log_message(self, format, *args):
+        debug_logger.debug("Coordinator: " + format % args)
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/status":
+            self.send_json(200, self.server.coordinator.status())
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        method = self.routes.get(self.path)
+        if method is None:
+            self.send_json(404, {"error": "not found"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            self.send_json(200, getattr(self.server.coordinator, method)(**payload))
+        except (ValueError, TypeError, KeyError) as e:
+            self.send_json(400, {"error": str(e)})
+
+
+# Serve the coordinator on a background thread, with a second thread reaping dead workers.
+# Returns the server and its URL (with trailing slash).
+def start_coordinator(coordinator, host="127.0.0.1", port=0):
+    server = ThreadingHTTPServer((host, port), CoordinatorRequestHandler)
+    server.daemon_threads = True
+    server.coordinator = coordinator
+    threading.Thread(target=server.serve_forever, name="coordinator", daemon=True).start()
+
+    def reap_dead_workers():
+        while not coordinator.finished.wait(coordinator.heartbeat_interval):
+            coordinator.reap()
+
+    threading.Thread(target=reap_dead_workers, name="coordinator-reaper", daemon=True).start()
+    url = f"http://{host}:{server.server_address[1]}/"
+    debug_logger.info(f"Coordinator for {len(coordinator.jobs)} jobs listening on {url}")
+    return server, url
+
+
+def stop_coordinator(server):
+    server.shutdown()
+    server.server_close()
+
+
+# Start worker processes on this machine (e.g. to try the setup, or to use a big box fully).
+# simulate=True makes them run simulated_run instead of browsers (see self_check).
+def spawn_local_workers(url, count, headless=False, reuse=True, simulate=False):
+    command = [sys.executable, os.path.abspath(__file__), "worker", "--coordinator", url]
+    if headless:
+        command.append("--headless")
+    if not reuse:
+        command.append("--no-reuse")
+    if simulate:
+        command.append("--simulate")
+    return [subprocess.Popen(command + ["--name", f"local-{index + 1}"]) for index in range(count)]
+
+
+# Wait until every job is done. The jobs left count as failed once nothing can run them anymore: the local
+# worker processes have all exited and no (remote) worker is alive, or no worker was heard from for
+# idle_timeout seconds (None waits for workers forever).
+def wait_for_jobs(coordinator, processes=(), idle_timeout=None):
+    while not coordinator.finished.wait(coordinator.heartbeat_interval):
+        if (processes and all(process.poll() is not None for process in processes)
+                and not coordinator.status()["workers"]):
+            coordinator.abandon("Every local worker exited and no other worker is alive")
+        elif idle_timeout is not None and coordinator.idle_for() > idle_timeout:
+            coordinator.abandon(f"No worker heard from for {idle_timeout:g} s")
+
+
+# Hand out the jobs and wait for all of them; writes the same summary as the local matrix runner.
+def run_coordinator(jobs, host="127.0.0.1", port=0, local_workers=0, headless=False, reuse=True,
+                    heartbeat_interval=2.0, worker_timeout=10.0, max_attempts=3, results_store=None,
+                    idle_timeout=None):
+    from matrix_runner import generate_matrix_summary  # Pulls in the test machinery, only needed at the end
+
+    coordinator = Coordinator(jobs, heartbeat_interval, worker_timeout, max_attempts, results_store)
+    server, url = start_coordinator(coordinator, host, port)
+    processes = spawn_local_workers(url, local_workers, headless, reuse) if local_workers else []
+    start_time = time.time()
+    try:
+        wait_for_jobs(coordinator, processes, idle_timeout)
+    finally:
+        stop_coordinator(server)
+        for process in processes:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    results = coordinator.results()
+    generate_matrix_summary(results, time.time() - start_time)
+    return results
+
+
+# JSON POST to the coordinator
+def call(url, path, payload, timeout=30):
+    request = Request(url.rstrip("/") + path, data=json.dumps(payload).encode("utf-8"),
+                      headers={"Content-Type": "application/json"})
+    with urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+# Pull jobs from the coordinator until it has none left. Heartbeats run on their own thread, so a long
+# job doesn't look like a dead worker; every finished step is sent as it happens. runner stands in for
+# run_test (see self_check).
+def run_worker(url, name=None, headless=False, reuse=True, poll_interval=1.0, max_connection_errors=5, runner=None):
+    if runner is None:
+        from automation import run_test as runner  # Workers need Selenium, the coordinator doesn't
+    from session_pool import SessionPool
+
+    name = name or f"{socket.gethostname()}-{os.getpid()}"
+    registration = call(url, "/register", {"name": name})
+    worker_id = registration["worker_id"]
+    stop_heartbeats = threading.Event()
+
+    def send_heartbeats():
+        while not stop_heartbeats.wait(registration["heartbeat_interval"]):
+            try:
+                call(url, "/heartbeat", {"worker_id": worker_id})
+            except (URLError, OSError) as e:
+                debug_logger.warning(f"Heartbeat to {url} failed: {str(e)}")
+
+    threading.Thread(target=send_heartbeats, name="worker-heartbeat", daemon=True).start()
+    session_pool = None
+    if reuse:
+        session_pool = SessionPool(size=1, factory=partial(create_driver, headless=True) if headless else create_driver)
+    completed = 0
+    connection_errors = 0
+    try:
+        while True:
+            try:
+                response = call(url, "/lease", {"worker_id": worker_id})
+                connection_errors = 0
+            except (URLError, OSError) as e:
+                connection_errors += 1
+                if connection_errors >= max_connection_errors:
+                    debug_logger.error(f"Coordinator {url} unreachable, worker {name} stopping: {str(e)}")
+                    break
+                time.sleep(poll_interval)
+                continue
+            job = response.get("job")
+            if job is None:
+                if response.get("done"):
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            def stream_step(event, job_id=job["id"]):
+                if event["event"] != "step_finished":
+                    return
+                step_result = {key: value for key, value in event.items() if key not in ("event", "index", "total")}
+                try:
+                    call(url, "/step", {"worker_id": worker_id, "job_id": job_id, "step_result": step_result})
+                except (URLError, OSError) as e:
+                    debug_logger.warning(f"Could not send {step_result['name']} to {url}: {str(e)}")
+
+            settings = job["settings"]
+            try:
+                result = runner(job["browser"], job["user"], job["plan"], interactive=False,
+                                session_pool=session_pool, base_url=settings["base_url"],
+                                navigation=settings["navigation"], headless=headless, profile=settings["profile"],
+                                metric_thresholds=settings["metric_thresholds"], progress=stream_step)
+            except Exception as e:
+                debug_logger.exception("Distributed job crashed: %s", e)
+                result = failed_result(job["user"], job["browser"], str(e))
+            if send_result(url, worker_id, job["id"], result, max_connection_errors, poll_interval):
+                completed += 1
+    finally:
+        stop_heartbeats.set()
+        if session_pool is not None:
+            session_pool.close()
+    debug_logger.info(f"Worker {name} done after {completed} jobs")
+    return completed
+
+
+# POST a finished job's result, retrying with backoff (doubling from delay seconds) while the coordinator
+# can't be reached. Returns whether it got there; a result that doesn't stays leased to this worker until the
+# coordinator gives up on it and hands the job out again.
+def send_result(url, worker_id, job_id, result, attempts=5, delay=1.0):
+    for attempt in range(attempts):
+        try:
+            call(url, "/result", {"worker_id": worker_id, "job_id": job_id, "result": result})
+            return True
+        except (URLError, OSError) as e:
+            debug_logger.warning(f"Could not send the result of {job_id} to {url} "
+                                 f"(attempt {attempt + 1} of {attempts}): {str(e)}")
+            if attempt + 1 < attempts:
+                time.sleep(delay * 2 ** attempt)
+    debug_logger.error(f"Giving up on sending the result of {job_id} to {url}")
+    return False
+
+
+# Stand-in for run_test in the self-check: every step of the plan passes after delay seconds
+def simulated_run(browser, user, plan, progress=None, delay=0.02, **settings):
+    succeeded = []
+    for index, step in enumerate(plan):
+        time.sleep(delay)
+        name = f"{step['step']} {index + 1}"
+        succeeded.append(name)
+        if progress:
+            progress({"event": "step_finished", "index": index, "total": len(plan), "name": name, "passed": True,
+                      "duration": delay})
+    return {"user": user, "browser": browser, "succeeded": succeeded, "failed": [], "unexecuted": [],
+            "item_prices": [], "duration": delay * len(plan)}
+
+
+# Runs the coordinator and several worker processes over localhost with simulated test runs (no browser) and checks
+# that every job is run once and saved, that a late result from a worker given up on is ignored, that the
+# jobs fail instead of hanging when every worker is gone, and that a failing results store doesn't stop the
+# run. Prints one line per check; returns whether all of them held.
+def self_check(workers=3, jobs=8):
+    checks = []
+    plan = [{"step": "login"}, {"step": "add_to_cart"}, {"step": "checkout"}]
+    settings = {"base_url": default_base_url, "navigation": "direct", "profile": "default", "metric_thresholds": {}}
+    users = [f"user{index + 1}" for index in range(jobs)]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = ResultsStore(os.path.join(temp_dir, "results.db"))
+        coordinator = Coordinator(make_jobs(users, ["chrome"], plan, settings), heartbeat_interval=0.2,
+                                  worker_timeout=2.0, results_store=store)
+        server, url = start_coordinator(coordinator)
+        processes = spawn_local_workers(url, workers, reuse=False, simulate=True)
+        wait_for_jobs(coordinator, processes, idle_timeout=60)
+        for process in processes:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        stop_coordinator(server)
+        results = coordinator.results()
+        ran_by = {result.get("worker") for result in results}
+        checks.append(("every job run once and saved, by several workers",
+                       all(not result["failed"] and result.get("run_id") for result in results)
+                       and len(store.recent_runs(limit=jobs + 1)) == jobs and len(ran_by) > 1
+                       and all(len(job["steps"]) == len(plan) for job in coordinator.jobs.values()),
+                       f"{len(results)} results from {', '.join(sorted(map(str, ran_by)))}"))
+
+        with closing(sqlite3.connect(store.path)) as connection:
+            connection.execute("DROP TABLE runs")  # Every save fails from here on
+        coordinator = Coordinator(make_jobs(["user1"], ["chrome"], plan, settings), results_store=store)
+        worker_id = coordinator.register("check")["worker_id"]
+        coordinator.lease(worker_id)
+        accepted = coordinator.complete(worker_id, "user1@chrome", simulated_run("chrome", "user1", plan, delay=0))
+        checks.append(("a results store error doesn't stop the run",
+                       accepted["accepted"] and coordinator.finished.is_set() and "run_id" not in coordinator.results()[0],
+                       "job finished without a run id"))
+
+    coordinator = Coordinator(make_jobs(["user1"], ["chrome"], plan, settings), worker_timeout=0.0)
+    first = coordinator.register("first")["worker_id"]
+    coordinator.lease(first)
+    time.sleep(0.01)
+    coordinator.reap()
+    second = coordinator.register("second")["worker_id"]
+    coordinator.lease(second)
+    late = coordinator.complete(first, "user1@chrome", simulated_run("chrome", "user1", plan, delay=0))
+    current = coordinator.complete(second, "user1@chrome", simulated_run("chrome", "user1", plan, delay=0))
+    checks.append(("a late result from a worker given up on is ignored",
+                   not late["accepted"] and current["accepted"] and coordinator.results()[0]["worker"] == "second",
+                   f"late accepted: {late['accepted']}, current accepted: {current['accepted']}"))
+
+    coordinator = Coordinator(make_jobs(users[:2], ["chrome"], plan, settings), heartbeat_interval=0.05,
+                              worker_timeout=0.2)
+    server, url = start_coordinator(coordinator)
+    coordinator.lease(coordinator.register("vanishing")["worker_id"])  # Never heard from again
+    start_time = time.monotonic()
+    wait_for_jobs(coordinator, idle_timeout=0.5)
+    stop_coordinator(server)
+    checks.append(("the jobs of dead workers fail instead of hanging",
+                   all(result["failed"] == ["Run"] for result in coordinator.results()),
+                   f"gave up after {time.monotonic() - start_time:.1f} s"))
+
+    coordinator = Coordinator(make_jobs(users[:2], ["chrome"], plan, settings), heartbeat_interval=0.05)
+    process = subprocess.Popen([sys.executable, "-c", "pass"])  # A local worker that exits right away
+    process.wait()
+    wait_for_jobs(coordinator, [process])
+    checks.append(("the jobs fail when every local worker has exited",
+                   all(result["failed"] == ["Run"] for result in coordinator.results()),
+                   coordinator.results()[0]["error"]))
+
+    for name, held, detail in checks:
+        print(f"{'✅' if held else '❌'} {name} ({detail})")
+    return all(held for _, held, _ in checks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the user x browser matrix on worker machines pulling jobs from a coordinator")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    coordinator_parser = commands.add_parser("coordinator", help="hold the jobs and hand them out to workers")
+    coordinator_parser.add_argument("--host", default="127.0.0.1", help="address to listen on (0.0.0.0 for other machines)")
+    coordinator_parser.add_argument("--port", type=int, default=8765)
+    coordinator_parser.add_argument("--local-workers", type=int, default=0, help="also start this many worker processes on this machine")
+    coordinator_parser.add_argument("--users", nargs="+", default=user_options, choices=user_options, help="users to test (default: all)")
+    coordinator_parser.add_argument("--browsers", nargs="+", default=supported_browsers, choices=supported_browsers, help="browsers to test (default: all)")
+    coordinator_parser.add_argument("--profile", default="default", choices=list(performance_profiles))
+    coordinator_parser.add_argument("--plan", help="JSON plan file to run (default: every step for every product)")
+    coordinator_parser.add_argument("--steps", nargs="+", choices=selectable_step_types(), help="run only these step types, for every product")
+    coordinator_parser.add_argument("--base-url", default=default_base_url, help=f"site to test (default: {default_base_url})")
+    coordinator_parser.add_argument("--standin", action="store_true", help="test against a stand-in server started here (reachable by local workers only)")
+    coordinator_parser.add_argument("--navigation", choices=["direct", "click"], default="direct")
+    coordinator_parser.add_argument("--slow-threshold", action="append", metavar="NAME=MS", help="page timing limit, as for matrix_runner.py")
+    coordinator_parser.add_argument("--heartbeat-interval", type=float, default=2.0, help="seconds between worker heartbeats (default: 2)")
+    coordinator_parser.add_argument("--worker-timeout", type=float, default=10.0, help="seconds without a heartbeat before a worker's jobs are reassigned (default: 10)")
+    coordinator_parser.add_argument("--max-attempts", type=int, default=3, help="workers a job may be handed to before it counts as failed (default: 3)")
+    coordinator_parser.add_argument("--idle-timeout", type=float, default=600.0, help="seconds without any worker before the remaining jobs count as failed (default: 600, 0 waits forever)")
+    coordinator_parser.add_argument("--db", default=default_results_db, help=f"results database the runs are saved to (default: {default_results_db})")
+    coordinator_parser.add_argument("--no-store", action="store_true", help="don't save the runs to the results database")
+
+    worker_parser = commands.add_parser("worker", help="run jobs from a coordinator")
+    worker_parser.add_argument("--coordinator", required=True, help="coordinator URL, e.g. http://10.0.0.5:8765/")
+    worker_parser.add_argument("--name", help="name in the coordinator's log (default: host-pid)")
+    worker_parser.add_argument("--no-reuse", action="store_true", help="launch a fresh browser for every job")
+    worker_parser.add_argument("--simulate", action="store_true", help="run simulated jobs without a browser (used by the check command)")
+
+    check_parser = commands.add_parser("check", help="run a coordinator and workers on localhost with simulated test runs")
+    check_parser.add_argument("--workers", type=int, default=3)
+    check_parser.add_argument("--jobs", type=int, default=8)
+
+    for subparser in (coordinator_parser, worker_parser):
+        subparser.add_argument("--headless", action="store_true", help="run the browsers without windows")
+    args = parser.parse_args()
+
+    if args.command == "check":
+        return 0 if self_check(args.workers, args.jobs) else 1
+    if args.command == "worker":
+        if args.simulate:
+            run_worker(args.coordinator, args.name, reuse=False, poll_interval=0.05, runner=simulated_run)
+        else:
+            run_worker(args.coordinator, args.name, args.headless, reuse=not args.no_reuse)
+        return 0
+
+    plan = load_plan(args.plan) if args.plan else full_plan()
+    if args.steps:
+        plan = [step for step in plan if step["step"] in args.steps]
+    try:
+        compile_plan(plan)  # Fail fast, before any worker gets the plan
+        metric_thresholds = parse_thresholds(args.slow_threshold)
+    except (PlanError, ValueError) as e:
+        parser.error(str(e))
+
+    from standin_server import start_standin_server, stop_standin_server
+
+    standin_server = None
+    base_url = args.base_url
+    if args.standin:
+        standin_server, base_url = start_standin_server()
+    settings = {"base_url": base_url, "navigation": args.navigation, "profile": args.profile,
+                "metric_thresholds": metric_thresholds}
+    try:
+        results = run_coordinator(make_jobs(args.users, args.browsers, plan, settings), args.host, args.port,
+                                  args.local_workers, args.headless, heartbeat_interval=args.heartbeat_interval,
+                                  worker_timeout=args.worker_timeout, max_attempts=args.max_attempts,
+                                  results_store=None if args.no_store else ResultsStore(args.db),
+                                  idle_timeout=args.idle_timeout or None)
+    finally:
+        if standin_server is not None:
+            stop_standin_server(standin_server)
+    from matrix_runner import matrix_summary_filename
+
+    with open(matrix_summary_filename, encoding="utf-8") as summary_file:
+        print(summary_file.read())
+    return 1 if any(result["failed"] or result.get("error") for result in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
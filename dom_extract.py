@@ -0,0 +1,130 @@
+import logging
+import re
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+# A spec describes one page scrape:
+#   "row"     CSS selector of the repeated element (one result dict per match), or None for the whole page
+#   "fields"  result key -> (CSS selector inside the row or None for the row itself, source)
+# where source is "text" (rendered text, like WebElement.text), "attr:<name>" or "exists" (True/False).
+# A missing element gives None (False for "exists").
+inventory_item_spec = {
+    "row": ".inventory_item",
+    "fields": {
+        "name": (".inventory_item_name", "text"),
+        "price": (".inventory_item_price", "text"),
+        "link_id": ("a[id$='_title_link']", "attr:id"),
+        "button": ("button", "text"),
+        "button_test": ("button", "attr:data-test"),
+    },
+}
+
+cart_item_spec = {
+    "row": ".cart_item",
+    "fields": {
+        "name": (".inventory_item_name", "text"),
+        "price": (".inventory_item_price", "text"),
+        "quantity": (".cart_quantity", "text"),
+        "link_id": ("a[id$='_title_link']", "attr:id"),
+        "button_test": ("button", "attr:data-test"),
+    },
+}
+
+product_details_spec = {
+    "row": None,
+    "fields": {
+        "name": (".inventory_details_name", "text"),
+        "price": (".inventory_details_price", "text"),
+        "description": (".inventory_details_desc", "text"),
+        "button": (".inventory_details_container button", "text"),
+        "button_test": (".inventory_details_container button", "attr:data-test"),
+    },
+}
+
+# Runs the whole spec in the page and returns plain JSON, so N rows cost one WebDriver round trip
+# instead of 1 + fields x N find_element/.text calls
+extract_script = """
+var spec = arguments[0];
+var rows = spec.row ? document.querySelectorAll(spec.row) : [document.documentElement];
+return Array.prototype.map.call(rows, function (row) {
+    var out = {};
+    Object.keys(spec.fields).forEach(function (key) {
+        var selector = spec.fields[key][0], source = spec.fields[key][1];
+        var element = selector ? row.querySelector(selector) : row;
+        if (source === "exists") {
+            out[key] = element !== null;
+        } else if (element === null) {
+            out[key] = null;
+        } else if (source === "text") {
+            out[key] = (element.innerText || "").trim();
+        } else {
+            out[key] = element.getAttribute(source.slice(5));
+        }
+    });
+    return out;
+});
+"""
+
+
+# Scrape with one execute_script call; falls back to per-element lookups when scripting is not allowed
+def extract(driver, spec, use_script=True):
+    if use_script:
+        try:
+            return driver.execute_script(extract_script, spec)
+        except WebDriverException as e:
+            debug_logger.warning(f"Batched extraction failed, falling back to per-element lookups: {str(e)}")
+    return extract_with_elements(driver, spec)
+
+
+# The old way: one find_element per field per row. Slow, but needs nothing beyond plain WebDriver commands.
+def extract_with_elements(driver, spec):
+    if spec["row"]:
+        rows = driver.find_elements(By.CSS_SELECTOR, spec["row"])
+    else:
+        rows = [driver.find_element(By.TAG_NAME, "html")]
+    results = []
+    for row in rows:
+        out = {}
+        for key, (selector, source) in spec["fields"].items():
+            try:
+                element = row.find_element(By.CSS_SELECTOR, selector) if selector else row
+            except NoSuchElementException:
+                out[key] = False if source == "exists" else None
+                continue
+            if source == "exists":
+                out[key] = True
+            elif source == "text":
+                out[key] = element.text.strip()
+            else:
+                out[key] = element.get_attribute(source[5:])
+        results.append(out)
+    return results
+
+
+# "item_4_title_link" -> 4
+def parse_item_id(link_id):
+    match = re.match(r"item_(\d+)_title_link$", link_id or "")
+    return int(match.group(1)) if match else None
+
+
+def scrape_inventory(driver, use_script=True):
+    items = extract(driver, inventory_item_spec, use_script)
+    for item in items:
+        item["item_id"] = parse_item_id(item.pop("link_id"))
+        item["in_cart"] = (item.get("button_test") or "").startswith("remove")
+    return items
+
+
+def scrape_cart(driver, use_script=True):
+    items = extract(driver, cart_item_spec, use_script)
+    for item in items:
+        item["item_id"] = parse_item_id(item.pop("link_id"))
+    return items
+
+
+def scrape_product_details(driver, use_script=True):
+    details = extract(driver, product_details_spec, use_script)
+    return details[0] if details else None
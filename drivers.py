@@ -0,0 +1,103 @@
+import logging
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+# Browsers the tool knows how to drive
+supported_browsers = ["Firefox", "Edge", "Chrome"]
+
+# Viewport for headless browsers, which otherwise start with a small default window
+headless_window_size = (1920, 1080)
+
+# Performance profiles: how much of each page the browser loads and waits for.
+#   page_load_strategy  "normal" (driver.get waits for every image), "eager" (returns at DOMContentLoaded) or
+#                       "none" (returns at once); the runs' explicit element waits decide when a page is usable
+#   ready_state         document.readyState the login step waits for before touching the form
+#   block_images        don't load images (product photos are most of the inventory page's bytes)
+#   block_fonts         don't load web fonts
+#   block_analytics     don't load third-party analytics/error reporting scripts
+#   disable_animations  turn off CSS transitions/animations (burger menu slide-in etc.)
+performance_profiles = {
+    "default": {"page_load_strategy": "normal", "ready_state": "complete", "block_images": False,
+                "block_fonts": False, "block_analytics": False, "disable_animations": False},
+    "eager": {"page_load_strategy": "eager", "ready_state": "interactive", "block_images": False,
+              "block_fonts": False, "block_analytics": False, "disable_animations": False},
+    "eager-no-images": {"page_load_strategy": "eager", "ready_state": "interactive", "block_images": True,
+                        "block_fonts": False, "block_analytics": False, "disable_animations": False},
+    "lean": {"page_load_strategy": "eager", "ready_state": "interactive", "block_images": True,
+             "block_fonts": True, "block_analytics": True, "disable_animations": True},
+    "lean-none": {"page_load_strategy": "none", "ready_state": "interactive", "block_images": True,
+                  "block_fonts": True, "block_analytics": True, "disable_animations": True},
+}
+
+# URL patterns blocked through CDP (Chrome/Edge) for block_fonts and block_analytics
+blocked_font_patterns = ["*.woff", "*.woff2", "*.ttf", "*.otf"]
+blocked_analytics_patterns = ["*google-analytics.com*", "*googletagmanager.com*", "*backtrace.io*",
+                              "*optimizely.com*", "*segment.io*", "*hotjar.com*"]
+
+# Injected into every document (Chrome/Edge) for disable_animations
+no_animations_script = """
+document.addEventListener("DOMContentLoaded", function () {
+    var style = document.createElement("style");
+    style.textContent = "*, *::before, *::after { transition: none !important; animation: none !important; }";
+    document.head.appendChild(style);
+});
+"""
+
+
+# Launch a new WebDriver session for the given browser name. Selenium is imported here rather than at
+# module level, so code that only needs supported_browsers (e.g. cli.py --help) starts without it.
+def create_driver(browser, headless=False, profile="default"):
+    from selenium import webdriver
+
+    settings = performance_profiles[profile]
+    width, height = headless_window_size
+    if browser == "Firefox":
+        options = webdriver.FirefoxOptions()
+        if headless:
+            options.add_argument("-headless")
+            options.add_argument(f"--width={width}")
+            options.add_argument(f"--height={height}")
+        options.page_load_strategy = settings["page_load_strategy"]
+        if settings["block_images"]:
+            options.set_preference("permissions.default.image", 2)
+        if settings["block_fonts"]:
+            options.set_preference("gfx.downloadable_fonts.enabled", False)
+        if settings["block_analytics"]:
+            # Firefox has no CDP URL blocking; its tracking protection list covers the analytics hosts
+            options.set_preference("privacy.trackingprotection.enabled", True)
+        if settings["disable_animations"]:
+            options.set_preference("ui.prefersReducedMotion", 1)
+        driver = webdriver.Firefox(options=options)
+    elif browser in ("Edge", "Chrome"):
+        options = webdriver.EdgeOptions() if browser == "Edge" else webdriver.ChromeOptions()
+        if headless:
+            options.add_argument("--headless=new")
+            options.add_argument(f"--window-size={width},{height}")
+        options.page_load_strategy = settings["page_load_strategy"]
+        if settings["block_images"]:
+            options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+        driver = webdriver.Edge(options=options) if browser == "Edge" else webdriver.Chrome(options=options)
+        try:
+            apply_cdp_profile(driver, settings)
+        except Exception:
+            driver.quit()  # Nobody else has the driver yet: don't leave the browser and its driver running
+            raise
+    else:
+        raise ValueError(f"Browser not supported: {browser}")
+    debug_logger.info(f"{browser} WebDriver started{' (headless)' if headless else ''}, profile {profile}")
+    return driver
+
+
+# The parts of a profile Chromium browsers can only do through the DevTools protocol
+def apply_cdp_profile(driver, settings):
+    blocked_urls = []
+    if settings["block_fonts"]:
+        blocked_urls.extend(blocked_font_patterns)
+    if settings["block_analytics"]:
+        blocked_urls.extend(blocked_analytics_patterns)
+    if blocked_urls:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_urls})
+    if settings["disable_animations"]:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": no_animations_script})
@@ -0,0 +1,91 @@
+import json
+import logging
+import os
+import threading
+import time
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+
+# Append-only JSONL record of one run (one user/browser pair), written while the run happens so a killed
+# process or a hung driver loses no finished step: every event is handed to the OS as it is written. Only a
+# crash of the machine itself can lose the events since the last fsync. One event per line:
+#   {"event": "run_started", "user", "browser", "attempt", "time"}
+#   {"event": "step", "name", "type", "passed", "duration", ..., "tests": [[test name, passed], ...], "time"}
+#   {"event": "run_finished", "duration", "time"}
+# A step event is the step's result from execute_plan (metrics included) plus "tests": every result recorded
+# while the step ran (a step can record more than its own name).
+# Every event is flushed to the OS right away; the file is fsynced to disk every fsync_interval seconds and
+# when the run starts and finishes.
+class RunJournal:
+    def __init__(self, path, append=False, fsync_interval=5.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.file = open(path, "a" if append else "w", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.last_fsync = time.monotonic()
+
+    def write(self, event, sync=False):
+        line = json.dumps(dict(event, time=time.time())) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            now = time.monotonic()
+            if sync or now - self.last_fsync >= self.fsync_interval:
+                os.fsync(self.file.fileno())
+                self.last_fsync = now
+
+    def run_started(self, user, browser, attempt=1):
+        self.write({"event": "run_started", "user": user, "browser": browser, "attempt": attempt}, sync=True)
+
+    def step_finished(self, step_result, tests):
+        self.write(dict(step_result, event="step", tests=tests))
+
+    def run_finished(self, duration):
+        self.write({"event": "run_finished", "duration": duration}, sync=True)
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
+
+
+# What a (possibly partial) journal says about its run: the last outcome of every step that completed,
+# how many attempts were started and whether the run got to the end. A line cut off by a crash is skipped.
+def read_journal(path):
+    state = {"steps": {}, "attempts": 0, "finished": False}
+    if not os.path.exists(path):
+        return state
+    with open(path, encoding="utf-8") as journal_file:
+        for line in journal_file:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                debug_logger.warning(f"Skipping damaged line in journal {path}")
+                continue
+            if event.get("event") == "run_started":
+                state["attempts"] += 1
+                state["finished"] = False
+            elif event.get("event") == "step":
+                state["steps"][event["name"]] = event
+            elif event.get("event") == "run_finished":
+                state["finished"] = True
+    return state
+
+
+# Step result of a journal step event, as it goes back into a resumed run's results
+def journal_step_result(event):
+    step_result = {key: value for key, value in event.items() if key not in ("event", "tests", "time")}
+    step_result["resumed"] = True
+    return step_result
+
+
+# One journal per matrix pair, so worker processes never append to the same file
+def pair_journal_path(journal_dir, user, browser):
+    return os.path.join(journal_dir, f"journal_{user}_{browser}.jsonl")
@@ -0,0 +1,373 @@
+import argparse
+import asyncio
+import bisect
+import json
+import logging
+import random
+import ssl
+import sys
+import time
+from urllib.parse import urlsplit
+
+from plan_engine import PlanError, compile_plan, full_plan, load_plan, selectable_step_types, user_options
+from standin_server import start_standin_server, stop_standin_server
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+# Browserless load: every virtual user replays a plan as the page requests a browser would make for it,
+# on a shared pool of keep-alive connections. Step type -> (request name, path, session change) list, where
+# {item_id} in the path is filled in from the step's product and the session change after the request is
+# "login" (the form sets the session cookie), "logout" (the menu drops it) or None. Adding to and removing
+# from the cart only write browser storage on this site, so at protocol level they are the cart page the
+# user looks at; repeated requests in a row are made once.
+step_requests = {
+    "login": [("login", "", "login"), ("inventory", "inventory.html", None)],
+    "restore_session": [("inventory", "inventory.html", None)],
+    "open_product": [("product", "inventory-item.html?id={item_id}", None)],
+    "check_prices": [("inventory", "inventory.html", None)],
+    "add_to_cart": [("cart", "cart.html", None)],
+    "remove_from_cart": [("cart", "cart.html", None)],
+    "logout": [("login", "", "logout")],
+}
+
+# What a response body of the stand-in server must contain to count as the page it was requested as (a
+# logged-out user is redirected to the login page instead, which is a failure, not a success). Only the
+# stand-in serves the pages rendered: a real deployment sends the app shell and renders in the browser, so
+# against a --base-url only the status codes are checked.
+page_markers = {
+    "login": b"login-button",
+    "inventory": b"inventory_list",
+    "product": b"inventory_details_name",
+    "cart": b"cart_list",
+}
+
+# Latency histogram buckets: upper bounds growing by 25% from 1 ms to about a minute
+histogram_bounds = [0.001 * 1.25 ** index for index in range(50)]
+
+
+# The (name, path, session change) requests of one iteration of a compiled plan
+def flow_requests(compiled):
+    flow = []
+    for step in compiled["steps"]:
+        product = step["params"].get("product", {})
+        for name, path, session_change in step_requests.get(step["type"], []):
+            request = (name, path.format(**product), session_change)
+            if flow and flow[-1] == request:
+                continue
+            flow.append(request)
+    return flow
+
+
+# "100:30,1000:60" -> [(100, 30.0), (1000, 60.0)]: ramp linearly to 100 users over 30 s, then to 1000 over 60 s
+def parse_stages(text):
+    stages = []
+    for part in text.split(","):
+        users, _, seconds = part.partition(":")
+        try:
+            stages.append((int(users), float(seconds or 0)))
+        except ValueError:
+            raise ValueError(f"Invalid stage {part!r}, expected USERS:SECONDS") from None
+    return stages
+
+
+# Start offset (seconds) of every virtual user for a ramp-up schedule
+def user_start_times(stages):
+    start_times = []
+    level, offset = 0, 0.0
+    for users, seconds in stages:
+        added = max(users - level, 0)
+        start_times.extend(offset + seconds * index / added for index in range(added))
+        level, offset = max(users, level), offset + seconds
+    return start_times
+
+
+class LoadStats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.requests = {}
+        self.histogram = [0] * (len(histogram_bounds) + 1)
+        self.timeline = {}
+        self.iterations = 0
+        self.errors = {}
+
+    def record(self, name, elapsed, error=None):
+        stats = self.requests.setdefault(name, {"count": 0, "errors": 0, "total": 0.0, "max": 0.0,
+                                                "histogram": [0] * (len(histogram_bounds) + 1)})
+        bucket = bisect.bisect_left(histogram_bounds, elapsed)
+        stats["count"] += 1
+        stats["total"] += elapsed
+        stats["max"] = max(stats["max"], elapsed)
+        stats["histogram"][bucket] += 1
+        self.histogram[bucket] += 1
+        second = int(time.monotonic() - self.started)
+        self.timeline[second] = self.timeline.get(second, 0) + 1
+        if error:
+            stats["errors"] += 1
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+
+# Upper bound of the bucket the given share of the requests falls in
+def histogram_percentile(histogram, fraction):
+    total = sum(histogram)
+    if not total:
+        return 0.0
+    seen = 0
+    for bucket, count in enumerate(histogram):
+        seen += count
+        if seen >= fraction * total:
+            return histogram_bounds[min(bucket, len(histogram_bounds) - 1)]
+    return histogram_bounds[-1]
+
+
+# Keep-alive HTTP/1.1 connections to one site, shared by all virtual users: at most size are open, a
+# request waits for an idle one and hands it back afterwards
+class ConnectionPool:
+    def __init__(self, base_url, size=50, timeout=30.0):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.ssl = ssl.create_default_context() if url.scheme == "https" else None
+        self.base_path = url.path if url.path.endswith("/") else url.path + "/"
+        self.timeout = timeout
+        self.slots = asyncio.Semaphore(size)
+        self.idle = []
+        self.opened = 0
+        self.reused = 0
+        self.waited = 0.0  # Seconds requests spent waiting for a free connection
+
+    async def request(self, path, headers=None):
+        start_time = time.perf_counter()
+        async with self.slots:
+            self.waited += time.perf_counter() - start_time
+            connection = self.idle.pop() if self.idle else None
+            if connection is not None:
+                self.reused += 1
+                try:
+                    return await self.exchange(connection, path, headers)
+                except (OSError, asyncio.IncompleteReadError):
+                    pass  # The server closed the idle connection; a fresh one gets the request
+            connection = await asyncio.wait_for(asyncio.open_connection(self.host, self.port, ssl=self.ssl),
+                                                self.timeout)
+            self.opened += 1
+            return await self.exchange(connection, path, headers)
+
+    async def exchange(self, connection, path, headers):
+        reader, writer = connection
+        lines = [f"GET {self.base_path}{path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Connection: keep-alive"]
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        try:
+            status, response_headers, body = await asyncio.wait_for(self.read_response(reader), self.timeout)
+        except BaseException:
+            writer.close()
+            raise
+        if response_headers.get("connection", "").lower() == "close" or reader.at_eof():
+            writer.close()
+        else:
+            self.idle.append(connection)
+        return status, response_headers, body
+
+    async def read_response(self, reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise asyncio.IncompleteReadError(b"", None)
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                chunk = await reader.readexactly(size + 2)
+                if not size:
+                    break
+                chunks.append(chunk[:-2])
+            body = b"".join(chunks)
+        else:
+            body = await reader.read()
+        return status, headers, body
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle.clear()
+
+
+async def virtual_user(pool, flow, user, stats, start_at, stop_at, think_time, iterations, markers):
+    await asyncio.sleep(max(start_at - time.monotonic(), 0))
+    logged_in = not flow or flow[0][2] != "login"  # Flows without a login start from a cached session
+    done = 0
+    while time.monotonic() < stop_at and (not iterations or done < iterations):
+        for name, path, session_change in flow:
+            if time.monotonic() >= stop_at:
+                return
+            headers = {"Cookie": f"session-username={user}"} if logged_in else None
+            start_time = time.perf_counter()
+            error = None
+            try:
+                status, _, body = await pool.request(path, headers)
+                if status != 200:
+                    error = f"HTTP {status} on {name}"
+                elif markers.get(name, b"") not in body:
+                    error = f"Unexpected page for {name}"
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError) as e:
+                error = f"{type(e).__name__} on {name}"
+            stats.record(name, time.perf_counter() - start_time, error)
+            if session_change == "login":
+                logged_in = True
+            elif session_change == "logout":
+                logged_in = False
+            if think_time:
+                await asyncio.sleep(random.uniform(0, 2 * think_time))
+        stats.iterations += 1
+        done += 1
+
+
+# Run the load: stages is the ramp-up schedule (see parse_stages), hold the seconds all users keep going
+# after it. Every user replays the flow until the time is up (or for iterations rounds). check_pages looks for
+# the page_markers in the bodies (stand-in server only). Returns the summary.
+async def run_load_async(base_url, flow, user, stages, hold, connections, think_time, iterations, check_pages=True):
+    pool = ConnectionPool(base_url, connections)
+    stats = LoadStats()
+    start_times = user_start_times(stages)
+    stop_at = stats.started + sum(seconds for _, seconds in stages) + hold
+    markers = page_markers if check_pages else {}
+    tasks = [asyncio.create_task(virtual_user(pool, flow, user, stats, stats.started + offset, stop_at, think_time,
+                                              iterations, markers))
+             for offset in start_times]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        pool.close()
+    return summarize_load(stats, time.monotonic() - stats.started, len(start_times), pool)
+
+
+def run_load(base_url, plan, user="standard_user", stages=((100, 10.0),), hold=30.0, connections=50, think_time=0.5,
+             iterations=0, check_pages=True):
+    flow = flow_requests(compile_plan(plan))
+    return asyncio.run(run_load_async(base_url, flow, user, list(stages), hold, connections, think_time, iterations,
+                                      check_pages))
+
+
+def summarize_load(stats, duration, users, pool):
+    total = sum(stats.histogram)
+    slowest = max((request_stats["max"] for request_stats in stats.requests.values()), default=0.0)
+    requests = {}
+    for name, request_stats in stats.requests.items():
+        requests[name] = {
+            "count": request_stats["count"],
+            "errors": request_stats["errors"],
+            "throughput": request_stats["count"] / duration if duration else 0.0,
+            "mean": request_stats["total"] / request_stats["count"],
+            "p50": min(histogram_percentile(request_stats["histogram"], 0.50), request_stats["max"]),
+            "p90": min(histogram_percentile(request_stats["histogram"], 0.90), request_stats["max"]),
+            "p99": min(histogram_percentile(request_stats["histogram"], 0.99), request_stats["max"]),
+            "max": request_stats["max"],
+        }
+    return {
+        "users": users,
+        "duration": duration,
+        "requests": total,
+        "errors": sum(stats.errors.values()),
+        "iterations": stats.iterations,
+        "throughput": total / duration if duration else 0.0,
+        "p50": min(histogram_percentile(stats.histogram, 0.50), slowest),
+        "p90": min(histogram_percentile(stats.histogram, 0.90), slowest),
+        "p99": min(histogram_percentile(stats.histogram, 0.99), slowest),
+        "by_request": requests,
+        "histogram": [[histogram_bounds[min(bucket, len(histogram_bounds) - 1)], count]
+                      for bucket, count in enumerate(stats.histogram) if count],
+        "timeline": [stats.timeline.get(second, 0) for second in range(int(duration) + 1)],
+        "error_kinds": stats.errors,
+        "connections_opened": pool.opened,
+        "connections_reused": pool.reused,
+        "connection_wait": pool.waited / total if total else 0.0,
+    }
+
+
+def format_load_summary(summary):
+    lines = [
+        "🔥🔥🔥 Load Summary 🔥🔥🔥",
+        f"👥 {summary['users']} virtual users, {summary['duration']:.1f} s, {summary['iterations']} flows completed",
+        f"📨 {summary['requests']} requests ({summary['throughput']:.1f}/s), {summary['errors']} errors",
+        f"⏱️ p50 {summary['p50'] * 1000:.0f} ms, p90 {summary['p90'] * 1000:.0f} ms, p99 {summary['p99'] * 1000:.0f} ms",
+        f"🔌 {summary['connections_opened']} connections opened, {summary['connections_reused']} requests on a kept-alive one, "
+        f"{summary['connection_wait'] * 1000:.0f} ms mean wait for a free connection",
+        "",
+        "📄 Per Request:",
+        "---------------",
+    ]
+    for name, stats in summary["by_request"].items():
+        lines.append(f"📄 {name}: {stats['count']} ({stats['throughput']:.1f}/s, {stats['errors']} errors), "
+                     f"p50 {stats['p50'] * 1000:.0f} ms, p90 {stats['p90'] * 1000:.0f} ms, "
+                     f"p99 {stats['p99'] * 1000:.0f} ms, max {stats['max'] * 1000:.0f} ms")
+    if summary["histogram"]:
+        lines.extend(["", "📊 Latency Histogram:", "---------------------"])
+        largest = max(count for _, count in summary["histogram"])
+        lines.extend(f"≤{bound * 1000:8.1f} ms {count:8d} {'█' * max(1, round(40 * count / largest))}"
+                     for bound, count in summary["histogram"])
+    if summary["error_kinds"]:
+        lines.extend(["", "❌ Errors:", "----------"])
+        lines.extend(f"❌ {error}: {count}" for error, count in sorted(summary["error_kinds"].items(),
+                                                                          key=lambda item: -item[1]))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the site with browserless virtual users replaying a test plan")
+    parser.add_argument("--user", default=user_options[0], choices=user_options, help=f"user the virtual users log in as (default: {user_options[0]})")
+    parser.add_argument("--users", type=int, default=100, help="virtual users (default: 100)")
+    parser.add_argument("--ramp-up", type=float, default=10.0, help="seconds to start all --users over (default: 10)")
+    parser.add_argument("--stages", help="ramp-up schedule instead of --users/--ramp-up, e.g. 100:30,1000:60 (USERS:SECONDS,...)")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to keep all users going after the ramp-up (default: 30)")
+    parser.add_argument("--iterations", type=int, default=0, help="stop every user after this many flows (default: until time is up)")
+    parser.add_argument("--think-time", type=float, default=0.5, help="mean seconds a user pauses between requests (default: 0.5)")
+    parser.add_argument("--connections", type=int, default=50, help="keep-alive connections shared by all users (default: 50)")
+    parser.add_argument("--plan", help="JSON plan file whose steps the users replay (default: every step for every product)")
+    parser.add_argument("--steps", nargs="+", choices=selectable_step_types(), help="replay only these step types, for every product")
+    parser.add_argument("--base-url", help="site to load, only one you are allowed to load-test (default: a local stand-in server built from 'Swag Labs.htm')")
+    parser.add_argument("--standin-latency", type=float, default=0.0, help="seconds of artificial latency the stand-in adds to every response")
+    parser.add_argument("--json", metavar="FILE", help="write the summary as JSON to FILE ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    plan = load_plan(args.plan) if args.plan else full_plan()
+    if args.steps:
+        plan = [step for step in plan if step["step"] in args.steps]
+    try:
+        compile_plan(plan)
+        stages = parse_stages(args.stages) if args.stages else [(args.users, args.ramp_up)]
+    except (PlanError, ValueError) as e:
+        parser.error(str(e))
+
+    standin_server = None
+    base_url = args.base_url
+    if base_url is None:
+        standin_server, base_url = start_standin_server(latency=args.standin_latency)
+    try:
+        summary = run_load(base_url, plan, args.user, stages, args.duration, args.connections, args.think_time,
+                           args.iterations, check_pages=standin_server is not None)
+    finally:
+        if standin_server is not None:
+            stop_standin_server(standin_server)
+
+    if args.json == "-":
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    else:
+        print(format_load_summary(summary))
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as json_file:
+                json.dump(summary, json_file, indent=2)
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
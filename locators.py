@@ -0,0 +1,157 @@
+import logging
+import time
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import StaleElementReferenceException
+
+from tracing import span
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+# Locator table: every element the tool looks for, by name. Values are format strings for targets that
+# exist once per product ({slug}, {item_id}). A target is compiled to the cheapest strategy it has:
+#   id         By.ID (the browser's getElementById)
+#   data_test  CSS on the data-test attribute the site puts on its test targets
+#   css        any other CSS selector
+#   xpath      only for what CSS can't express
+locator_table = {}
+
+# (name, fields) -> compiled (By, value) locator, and back (so waits can cache what they found)
+compiled_locators = {}
+compiled_keys = {}
+
+
+def register_locator(name, id=None, data_test=None, css=None, xpath=None):
+    if id:
+        strategy = (By.ID, id)
+    elif data_test:
+        strategy = (By.CSS_SELECTOR, f'[data-test="{data_test}"]')
+    elif css:
+        strategy = (By.CSS_SELECTOR, css)
+    elif xpath:
+        strategy = (By.XPATH, xpath)
+    else:
+        raise ValueError(f"Locator {name} needs an id, data_test, css or xpath")
+    locator_table[name] = strategy
+    return strategy
+
+
+register_locator("username_field", id="user-name")
+register_locator("password_field", id="password")
+register_locator("login_button", id="login-button")
+register_locator("inventory_list", css=".inventory_list")
+register_locator("cart_list", css=".cart_list")
+register_locator("product_details_name", css=".inventory_details_name")
+register_locator("product_title_link", id="item_{item_id}_title_link")
+register_locator("add_to_cart_button", id="add-to-cart-{slug}")
+register_locator("remove_button", id="remove-{slug}")
+register_locator("cart_badge", css=".shopping_cart_badge")
+register_locator("burger_menu_button", id="react-burger-menu-btn")
+register_locator("burger_menu", css=".bm-menu-wrap")
+register_locator("logout_link", id="logout_sidebar_link")
+
+
+# The (By, value) pair for a named target, e.g. locator("remove_button", slug="sauce-labs-onesie")
+def locator(name, **fields):
+    key = (name, tuple(sorted(fields.items())))
+    compiled = compiled_locators.get(key)
+    if compiled is None:
+        by, value = locator_table[name]
+        compiled = compiled_locators[key] = (by, value.format(**fields) if fields else value)
+        compiled_keys[compiled] = key
+    return compiled
+
+
+# Per locator name: lookups, how many were answered from the element cache, find_element round trips,
+# the time those took and how often a cached element had gone stale. Reset per run, like wait_timings.
+locator_stats = {}
+
+
+def reset_locator_stats():
+    locator_stats.clear()
+
+
+def count(name, field, amount=1):
+    stats = locator_stats.setdefault(name, {"lookups": 0, "cache_hits": 0, "finds": 0, "find_time": 0.0, "stale": 0})
+    stats[field] += amount
+
+
+# Resolved elements of the page the browser is on, kept on the driver. Cleared when the browser moves to
+# another page (load_url and the navigator call invalidate_elements) and per element when it goes stale.
+class ElementCache:
+    def __init__(self):
+        self.elements = {}
+
+    def get(self, key):
+        return self.elements.get(key)
+
+    def put(self, key, element):
+        self.elements[key] = element
+
+    def drop(self, key):
+        self.elements.pop(key, None)
+
+    def clear(self):
+        self.elements.clear()
+
+
+def element_cache(driver):
+    cache = getattr(driver, "_element_cache", None)
+    if cache is None:
+        cache = driver._element_cache = ElementCache()
+    return cache
+
+
+def invalidate_elements(driver):
+    element_cache(driver).clear()
+
+
+# Keep an element a wait already found for the next lookup of the same target (if it is a table locator)
+def remember_located(driver, located, element):
+    key = compiled_keys.get(tuple(located))
+    if key is not None and element is not None and element is not True:
+        element_cache(driver).put(key, element)
+
+
+def forget(driver, name, **fields):
+    element_cache(driver).drop((name, tuple(sorted(fields.items()))))
+
+
+# The element for a named target: from the cache when it was found on this page before, else find_element
+def find(driver, name, **fields):
+    key = (name, tuple(sorted(fields.items())))
+    cache = element_cache(driver)
+    count(name, "lookups")
+    element = cache.get(key)
+    if element is not None:
+        count(name, "cache_hits")
+        return element
+    start_time = time.perf_counter()
+    with span(f"find {name}", "find"):
+        element = driver.find_element(*locator(name, **fields))
+    count(name, "finds")
+    count(name, "find_time", time.perf_counter() - start_time)
+    cache.put(key, element)
+    return element
+
+
+# Run action(element) on a named target. A cached element that went stale (the page re-rendered it) is
+# dropped and looked up once more.
+def act(driver, name, action, **fields):
+    try:
+        return action(find(driver, name, **fields))
+    except StaleElementReferenceException:
+        count(name, "stale")
+        forget(driver, name, **fields)
+        debug_logger.debug(f"Cached element {name} went stale, looking it up again")
+        return action(find(driver, name, **fields))
+
+
+# Totals over all targets plus the per-target counts, most expensive first
+def summarize_locator_stats():
+    totals = {"lookups": 0, "cache_hits": 0, "finds": 0, "find_time": 0.0, "stale": 0}
+    for stats in locator_stats.values():
+        for field in totals:
+            totals[field] += stats[field]
+    totals["targets"] = dict(sorted(locator_stats.items(), key=lambda item: item[1]["find_time"], reverse=True))
+    return totals
@@ -0,0 +1,279 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing.util import Finalize
+
+from automation import debug_logger, debug_file_handler, default_base_url, run_test, supported_browsers, user_options
+from drivers import create_driver, performance_profiles
+from journal import pair_journal_path
+from perf_metrics import format_metric_summary, merge_metric_summaries, parse_thresholds
+from plan_engine import PlanError, compile_plan, full_plan, load_plan, selectable_step_types
+from results_store import ResultsStore, default_results_db
+from session_pool import SessionPool
+from standin_server import start_standin_server, stop_standin_server
+from tracing import merge_chrome_traces
+
+
+matrix_summary_filename = "matrix_summary.txt"
+
+
+# Prefixes every log record coming from a worker with the (user, browser) pair it is running,
+# so the shared debug_log.log stays readable when several pairs write to it at once
+class PairLogFilter(logging.Filter):
+    def __init__(self):
+        super().__init__()
+        self.pair = None
+
+    def filter(self, record):
+        if self.pair:
+            record.msg = f"[{self.pair}] {record.msg}"
+        return True
+
+
+pair_log_filter = PairLogFilter()
+
+# Each worker process keeps its drivers warm between the pairs it runs (None = launch one per pair)
+worker_session_pool = None
+
+
+# Runs once in every worker process. The RotatingFileHandler is not safe to share between processes
+# (rollover renames the file under the others), so workers hand their records to the parent through a queue.
+def init_worker(log_queue, pool_settings):
+    global worker_session_pool
+    for handler in list(debug_logger.handlers):
+        debug_logger.removeHandler(handler)
+        handler.close()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(pair_log_filter)
+    debug_logger.addHandler(queue_handler)
+    if pool_settings is not None:
+        worker_session_pool = SessionPool(**pool_settings)
+        # atexit handlers don't run in pool workers; multiprocessing finalizers do
+        Finalize(worker_session_pool, worker_session_pool.close, exitpriority=10)
+
+
+# Executed inside a worker process: one (user, browser) pair with its own WebDriver
+def run_pair(user, browser, plan, base_url, navigation, trace_dir, headless, profile, metric_thresholds,
+             journal_dir=None, resume=False):
+    pair_log_filter.pair = f"{user}@{browser}"
+    try:
+        return run_test(browser, user, plan, interactive=False, session_pool=worker_session_pool, base_url=base_url,
+                        navigation=navigation, trace_dir=trace_dir, headless=headless, profile=profile,
+                        metric_thresholds=metric_thresholds,
+                        journal_path=pair_journal_path(journal_dir, user, browser) if journal_dir else None,
+                        resume=resume)
+    except Exception as e:
+        debug_logger.exception("Matrix pair crashed: %s", e)
+        return {
+            "user": user,
+            "browser": browser,
+            "succeeded": [],
+            "failed": ["Run"],
+            "unexecuted": [],
+            "item_prices": [],
+            "duration": 0.0,
+            "error": str(e),
+        }
+    finally:
+        pair_log_filter.pair = None
+
+
+# Spreads every (user x browser) pair over a bounded pool of worker processes.
+# Wall-clock time is that of the slowest pair (per worker slot) instead of the sum of all pairs.
+# pool_settings are SessionPool arguments for the per-worker driver pool; None launches a fresh driver per pair.
+# With a trace_dir every pair writes its own trace there, and all of them are merged into matrix_trace.json.
+# With a results_store every pair's result is saved by this (parent) process as it comes in.
+# With a journal_dir every pair journals its steps to its own file there; resume=True picks an interrupted
+# matrix up from those journals, so pairs and steps that already finished are not run again.
+def run_matrix(users, browsers, plan, max_workers=None, pool_settings=None, base_url=default_base_url,
+               navigation="direct", trace_dir=None, headless=False, profile="default", metric_thresholds=None,
+               results_store=None, journal_dir=None, resume=False):
+    pairs = [(user, browser) for user in users for browser in browsers]
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(pairs) or 1))
+
+    log_queue = multiprocessing.Queue()
+    log_listener = QueueListener(log_queue, debug_file_handler)
+    log_listener.start()
+    debug_logger.info(f"Starting matrix run: {len(pairs)} pairs on {max_workers} workers")
+
+    results = []
+    start_time = time.time()
+    try:
+        if pool_settings is not None and headless:
+            pool_settings = dict(pool_settings, factory=partial(create_driver, headless=True))
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=(log_queue, pool_settings)) as executor:
+            futures = {executor.submit(run_pair, user, browser, plan, base_url, navigation, trace_dir, headless, profile,
+                                       metric_thresholds, journal_dir, resume): (user, browser)
+                       for user, browser in pairs}
+            for future in as_completed(futures):
+                user, browser = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:  # The worker process itself died (e.g. BrokenProcessPool)
+                    debug_logger.error(f"Matrix pair {user}@{browser} failed: {str(e)}")
+                    result = {"user": user, "browser": browser, "succeeded": [], "failed": ["Run"],
+                              "unexecuted": [], "item_prices": [], "duration": 0.0, "error": str(e)}
+                debug_logger.info(f"Matrix pair {user}@{browser} finished in {result['duration']:.2f} seconds")
+                if results_store is not None:
+                    try:
+                        result["run_id"] = results_store.save_run(result)
+                    except sqlite3.Error as e:
+                        debug_logger.error(f"Could not save {user}@{browser} to {results_store.path}: {str(e)}")
+                results.append(result)
+    finally:
+        log_listener.stop()
+
+    wall_time = time.time() - start_time
+    # Keep the summary in the same order as the matrix, not in completion order
+    order = {pair: index for index, pair in enumerate(pairs)}
+    results.sort(key=lambda result: order[(result["user"], result["browser"])])
+    generate_matrix_summary(results, wall_time)
+    if trace_dir:
+        trace_files = [result["trace_files"][0] for result in results if result.get("trace_files")]
+        if trace_files:
+            merged_trace = merge_chrome_traces(trace_files, os.path.join(trace_dir, "matrix_trace.json"))
+            debug_logger.info(f"Merged {len(trace_files)} traces into {merged_trace}")
+    return results
+
+
+# Merge the per-pair succeeded/failed/unexecuted lists into one summary
+def merge_results(results):
+    merged = {"succeeded": [], "failed": [], "unexecuted": []}
+    for result in results:
+        pair = f"{result['user']}@{result['browser']}"
+        for key in merged:
+            merged[key].extend(f"{pair}: {test}" for test in result[key])
+    return merged
+
+
+def generate_matrix_summary(results, wall_time):
+    merged = merge_results(results)
+    total_pair_time = sum(result["duration"] for result in results)
+
+    summary_lines = [
+        "🔥🔥🔥 Matrix Test Summary 🔥🔥🔥",
+        f"🧮 Pairs: {len(results)}",
+        f"⏱️ Wall-clock time: {wall_time:.2f} s (sum of all pairs: {total_pair_time:.2f} s)",
+        "",
+        "📋 Per Pair:",
+        "------------",
+    ]
+    for result in results:
+        status = "❌" if result["failed"] else "✅"
+        line = (f"{status} {result['user']}@{result['browser']}: {len(result['succeeded'])} succeeded, "
+                f"{len(result['failed'])} failed, {len(result['unexecuted'])} unexecuted "
+                f"in {result['duration']:.2f} s")
+        if result.get("error"):
+            line += f" ({result['error']})"
+        summary_lines.append(line)
+
+    # Browser page timing per user, over all of the user's browsers
+    metrics_by_user = {}
+    for result in results:
+        if result.get("page_metrics"):
+            metrics_by_user.setdefault(result["user"], []).append(result["page_metrics"])
+    if metrics_by_user:
+        summary_lines.extend(["", "🐢 Page Timing per User:", "------------------------"])
+        for user, summaries in metrics_by_user.items():
+            merged_metrics = merge_metric_summaries(summaries)
+            summary_lines.append(f"📊 {user}: {format_metric_summary(merged_metrics)}")
+            summary_lines.extend([f"🐌 Too slow: {entry}" for entry in merged_metrics["too_slow"]])
+
+    # Steps that needed retries, per pair: a flaky step cost a retry on the live session, not a rerun of the pair
+    retried = [result for result in results
+               if result.get("retries") and (result["retries"]["flaky"] or result["retries"]["hard"])]
+    if retried:
+        summary_lines.extend(["", "🔁 Retries per Pair:", "--------------------"])
+        for result in retried:
+            pair = f"{result['user']}@{result['browser']}"
+            summary_lines.extend([f"🎲 {pair}: {step['name']} flaky, worked on attempt {step['attempts']}"
+                                  for step in result["retries"]["flaky"]])
+            summary_lines.extend([f"🧱 {pair}: {step['name']} failed all {step['attempts']} attempts"
+                                  for step in result["retries"]["hard"]])
+
+    summary_lines.extend(["", "✅ Succeeded Tests:", "-------------------"])
+    summary_lines.extend([f"✔️ {test}" for test in merged["succeeded"]] if merged["succeeded"] else ["None 😢"])
+    summary_lines.extend(["", "❌ Failed Tests:", "----------------"])
+    summary_lines.extend([f"❌ {test}" for test in merged["failed"]] if merged["failed"] else ["None 🎉"])
+    summary_lines.extend(["", "⏭️ Unexecuted Tests:", "---------------------"])
+    summary_lines.extend([f"⏭️ {test}" for test in merged["unexecuted"]] if merged["unexecuted"] else ["None 🚫"])
+    summary_lines.append("")
+
+    summary = "\n".join(summary_lines)
+    with open(matrix_summary_filename, "w", encoding="utf-8") as summary_file:
+        summary_file.write(summary)
+    debug_logger.info(summary)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Sauce Demo test for every user/browser pair in parallel")
+    parser.add_argument("--users", nargs="+", default=user_options, choices=user_options, help="users to test (default: all)")
+    parser.add_argument("--browsers", nargs="+", default=supported_browsers, choices=supported_browsers, help="browsers to test (default: all)")
+    parser.add_argument("--headless", action="store_true", help="run the browsers without windows (for machines without a display)")
+    parser.add_argument("--profile", default="default", choices=list(performance_profiles),
+                        help="performance profile: page-load strategy and blocked resources (default: default)")
+    parser.add_argument("--slow-threshold", action="append", metavar="NAME=MS",
+                        help="page timing limit that fails a step as too slow, e.g. load_ms=3000 or long_tasks_ms=off")
+    parser.add_argument("--db", default=default_results_db, help=f"results database the runs are saved to (default: {default_results_db})")
+    parser.add_argument("--no-store", action="store_true", help="don't save the runs to the results database")
+    parser.add_argument("--workers", type=int, default=None, help="maximum number of browsers running at the same time (default: CPU count)")
+    parser.add_argument("--no-reuse", action="store_true", help="launch a fresh browser for every pair instead of reusing warm ones")
+    parser.add_argument("--max-uses", type=int, default=50, help="recycle a reused browser after this many runs (default: 50)")
+    parser.add_argument("--max-age", type=float, default=1800, help="recycle a reused browser after this many seconds (default: 1800)")
+    parser.add_argument("--base-url", default=default_base_url, help=f"site to test (default: {default_base_url})")
+    parser.add_argument("--standin", action="store_true", help="test against a local stand-in server built from 'Swag Labs.htm' (no network needed)")
+    parser.add_argument("--standin-latency", type=float, default=0.0, help="seconds of artificial latency the stand-in adds to every response")
+    parser.add_argument("--standin-error-rate", type=float, default=0.0, help="share of stand-in page requests answered with HTTP 500")
+    parser.add_argument("--navigation", choices=["direct", "click"], default="direct",
+                        help="open product pages by URL (direct, default) or by clicking the inventory links (click)")
+    parser.add_argument("--plan", help="JSON plan file to run (default: every step for every product)")
+    parser.add_argument("--steps", nargs="+", choices=selectable_step_types(), help="run only these step types, for every product")
+    parser.add_argument("--trace-dir", help="write a Chrome trace (JSON) and CSV of every step, wait and WebDriver command per pair to this directory")
+    parser.add_argument("--journal-dir", help="journal every finished step per pair to a JSONL file in this directory")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted matrix from --journal-dir: only steps without an outcome there run again")
+    args = parser.parse_args()
+    if args.resume and not args.journal_dir:
+        parser.error("--resume needs --journal-dir")
+
+    plan = load_plan(args.plan) if args.plan else full_plan()
+    if args.steps:
+        plan = [step for step in plan if step["step"] in args.steps]
+    try:
+        compile_plan(plan)  # Fail fast, before any worker or browser starts
+    except PlanError as e:
+        parser.error(str(e))
+    try:
+        metric_thresholds = parse_thresholds(args.slow_threshold)
+    except ValueError as e:
+        parser.error(str(e))
+    pool_settings = None if args.no_reuse else {"size": 1, "max_uses": args.max_uses, "max_age": args.max_age}
+    standin_server = None
+    base_url = args.base_url
+    if args.standin:
+        standin_server, base_url = start_standin_server(latency=args.standin_latency, error_rate=args.standin_error_rate)
+    try:
+        results = run_matrix(args.users, args.browsers, plan, max_workers=args.workers, pool_settings=pool_settings,
+                             base_url=base_url, navigation=args.navigation, trace_dir=args.trace_dir,
+                             headless=args.headless, profile=args.profile, metric_thresholds=metric_thresholds,
+                             results_store=None if args.no_store else ResultsStore(args.db),
+                             journal_dir=args.journal_dir, resume=args.resume)
+    finally:
+        if standin_server is not None:
+            stop_standin_server(standin_server)
+    with open(matrix_summary_filename, encoding="utf-8") as summary_file:
+        print(summary_file.read())
+    return 1 if any(result["failed"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
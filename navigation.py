@@ -0,0 +1,112 @@
+import logging
+from urllib.parse import urljoin, urlsplit, parse_qs
+from selenium.webdriver.common.by import By
+
+from dom_extract import scrape_product_details
+from locators import invalidate_elements, locator
+from tracing import span
+from waits import wait_for_element, wait_for_new_document, wait_for_url_contains
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+# Page names used by the planner and by the "page" field of the step registry
+page_paths = {
+    "login": "",
+    "inventory": "inventory.html",
+    "cart": "cart.html",
+}
+
+# Element that proves each page is rendered
+page_ready_locators = {
+    "login": locator("login_button"),
+    "inventory": locator("inventory_list"),
+    "cart": locator("cart_list"),
+    "product": locator("product_details_name"),
+}
+
+
+# driver.get that also works with page_load_strategy "none", where get() returns before the new document has
+# replaced the old one and an element wait could still match the page being left
+def load_url(driver, url, page_load_strategy="normal"):
+    invalidate_elements(driver)
+    if page_load_strategy != "none":
+        driver.get(url)
+        return
+    old_document = driver.find_element(By.TAG_NAME, "html")
+    driver.get(url)
+    wait_for_new_document(driver, old_document)
+
+
+# Knows which page the browser is on and only navigates when a step needs a different one.
+# mode="direct" opens product pages by URL (inventory-item.html?id=N) and verifies them by content;
+# mode="click" clicks the product link on the inventory page like a user would.
+class NavigationPlanner:
+    def __init__(self, driver, base_url, mode="direct", page_load_strategy="normal"):
+        self.driver = driver
+        self.base_url = base_url
+        self.mode = mode
+        self.page_load_strategy = page_load_strategy  # Of the driver's performance profile (see drivers.py)
+        self.current_page = None  # None = unknown, navigate before relying on it
+        self.navigations = 0
+
+    def url_for(self, page):
+        return urljoin(self.base_url, page_paths[page])
+
+    def product_url(self, product):
+        return urljoin(self.base_url, f"inventory-item.html?id={product['item_id']}")
+
+    # Work out the page from a URL (used when something else moved the browser)
+    def page_from_url(self, url):
+        path = urlsplit(url).path.rsplit("/", 1)[-1]
+        if path == "inventory-item.html":
+            item_id = parse_qs(urlsplit(url).query).get("id", [None])[0]
+            return f"product:{item_id}"
+        for page, page_path in page_paths.items():
+            if path == page_path or (page == "login" and path == "index.html"):
+                return page
+        return None
+
+    # Tell the planner where a step left the browser (None if it is not known)
+    def arrived(self, page):
+        self.current_page = page
+
+    def invalidate(self):
+        self.current_page = None
+        invalidate_elements(self.driver)
+
+    def goto(self, page):
+        with span(f"goto {page}", "navigation", url=self.url_for(page)):
+            load_url(self.driver, self.url_for(page), self.page_load_strategy)
+            self.navigations += 1
+            wait_for_element(self.driver, page_ready_locators[page], name=f"{page} page")
+        self.current_page = page
+        debug_logger.info(f"Navigated to the {page} page")
+
+    # Navigate only if the browser is not already on the page
+    def ensure(self, page):
+        if self.current_page != page:
+            self.goto(page)
+
+    # Open a product detail page and check that it shows the expected product. Returns True/False.
+    def open_product(self, product):
+        with span(f"open {product['name']}", "navigation", mode=self.mode):
+            if self.mode == "click":
+                self.ensure("inventory")
+                element = wait_for_element(self.driver, locator("product_title_link", item_id=product["item_id"]),
+                                           clickable=True)
+                self.driver.execute_script("arguments[0].click();", element)
+                invalidate_elements(self.driver)
+                wait_for_url_contains(self.driver, "inventory-item.html")
+            elif self.current_page != f"product:{product['item_id']}":
+                load_url(self.driver, self.product_url(product), self.page_load_strategy)
+            self.navigations += 1
+            wait_for_element(self.driver, page_ready_locators["product"], name=f"{product['name']} page")
+        self.current_page = f"product:{product['item_id']}"
+
+        details = scrape_product_details(self.driver)
+        shown_name = details["name"] if details else None
+        if shown_name != product["name"]:
+            debug_logger.error(f"Product page for item {product['item_id']} shows '{shown_name}' instead of '{product['name']}'")
+            return False
+        return True
@@ -0,0 +1,162 @@
+import logging
+import statistics
+
+from plan_engine import step_types
+from tracing import span
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+# Limits (milliseconds) above which a step that worked functionally still counts as failed ("too slow").
+#   ttfb_ms                    navigation start to the first byte of the page
+#   load_ms                    navigation start to the end of the load event
+#   first_contentful_paint_ms  navigation start to the first text/image on screen
+#   long_tasks_ms              main-thread tasks over 50 ms since the previous collection (Chromium only)
+default_thresholds = {
+    "ttfb_ms": 2000,
+    "load_ms": 4000,
+    "first_contentful_paint_ms": 3000,
+    "long_tasks_ms": 1000,
+}
+
+# Reads the Navigation/Resource/Paint Timing entries of the current document. State kept on window makes
+# every call report only what is new: the navigation once per document (once its load event finished),
+# resources and long tasks since the previous call. Long tasks are only visible through a
+# PerformanceObserver, installed on the first call in each document.
+collect_script = """
+var state = window.__automationPerf;
+if (!state) {
+    state = window.__automationPerf = {navigationReported: false, resourceIndex: 0, longTasks: [],
+                                       longTaskIndex: 0, longTasksSupported: false};
+    try {
+        new PerformanceObserver(function (list) {
+            list.getEntries().forEach(function (entry) { state.longTasks.push(entry.duration); });
+        }).observe({type: "longtask", buffered: true});
+        state.longTasksSupported = true;
+    } catch (e) {}
+}
+var round = function (value) { return value ? Math.round(value) : null; };
+var out = {url: location.href, long_tasks_supported: state.longTasksSupported};
+
+var navigation = performance.getEntriesByType("navigation")[0];
+if (navigation && !state.navigationReported) {
+    out.ttfb_ms = round(navigation.responseStart);
+    out.dom_content_loaded_ms = round(navigation.domContentLoadedEventEnd);
+    out.load_ms = round(navigation.loadEventEnd);
+    out.document_bytes = navigation.transferSize || 0;
+    performance.getEntriesByType("paint").forEach(function (entry) {
+        out[entry.name.replace(/-/g, "_") + "_ms"] = round(entry.startTime);
+    });
+    state.navigationReported = navigation.loadEventEnd > 0;
+}
+
+var resources = performance.getEntriesByType("resource").slice(state.resourceIndex);
+state.resourceIndex += resources.length;
+out.resource_count = resources.length;
+out.transfer_bytes = resources.reduce(function (total, entry) { return total + (entry.transferSize || 0); }, 0);
+out.slowest_resources = resources.sort(function (a, b) { return b.duration - a.duration; }).slice(0, 3).map(
+    function (entry) { return {name: entry.name, type: entry.initiatorType, duration_ms: Math.round(entry.duration)}; });
+
+var longTasks = state.longTasks.slice(state.longTaskIndex);
+state.longTaskIndex += longTasks.length;
+out.long_tasks = longTasks.length;
+out.long_tasks_ms = Math.round(longTasks.reduce(function (total, duration) { return total + duration; }, 0));
+return out;
+"""
+
+
+def collect_page_metrics(driver):
+    from selenium.common.exceptions import WebDriverException  # Not at module level: cli.py imports parse_thresholds
+
+    try:
+        with span("collect page metrics", "metrics"):
+            return driver.execute_script(collect_script)
+    except WebDriverException as e:
+        debug_logger.warning(f"Could not collect page metrics: {str(e)}")
+        return None
+
+
+# "metric value > limit" for every threshold the metrics exceed
+def check_thresholds(metrics, thresholds):
+    violations = []
+    for name, limit in thresholds.items():
+        value = metrics.get(name)
+        if limit is not None and value is not None and value > limit:
+            violations.append(f"{name} {value} > {limit:g}")
+    return violations
+
+
+# execute_plan after_step hook: attach the page metrics to the results of the step types registered with
+# collect_metrics, and fail a passed step whose metrics exceed the thresholds
+def metrics_hook(driver, thresholds=None):
+    thresholds = default_thresholds if thresholds is None else thresholds
+
+    def after_step(step, step_result):
+        if not step_types[step["type"]]["collect_metrics"]:
+            return
+        metrics = collect_page_metrics(driver)
+        if metrics is None:
+            return
+        step_result["metrics"] = metrics
+        violations = check_thresholds(metrics, thresholds)
+        if violations:
+            step_result["too_slow"] = violations
+            debug_logger.warning(f"{step['name']} too slow: {', '.join(violations)}")
+            if step_result["passed"]:
+                step_result["passed"] = False
+                step_result["failure"] = "too slow"
+
+    return after_step
+
+
+# Page timing of one run (one user): loaded pages, typical/worst load, main-thread blocking and bytes
+def summarize_metrics(step_results):
+    measured = [result["metrics"] for result in step_results if result.get("metrics")]
+    loads = [metrics["load_ms"] for metrics in measured if metrics.get("load_ms")]
+    ttfbs = [metrics["ttfb_ms"] for metrics in measured if metrics.get("ttfb_ms")]
+    return {
+        "pages": sum(1 for metrics in measured if metrics.get("ttfb_ms") is not None),
+        "median_load_ms": statistics.median(loads) if loads else None,
+        "max_load_ms": max(loads) if loads else None,
+        "max_ttfb_ms": max(ttfbs) if ttfbs else None,
+        "long_tasks_ms": sum(metrics.get("long_tasks_ms") or 0 for metrics in measured),
+        "transfer_bytes": sum((metrics.get("transfer_bytes") or 0) + (metrics.get("document_bytes") or 0)
+                              for metrics in measured),
+        "too_slow": [f"{result['name']}: {', '.join(result['too_slow'])}"
+                     for result in step_results if result.get("too_slow")],
+    }
+
+
+# Combine the per-run summaries of one user (e.g. across browsers)
+def merge_metric_summaries(summaries):
+    loads = [summary["median_load_ms"] for summary in summaries if summary.get("median_load_ms") is not None]
+    maxima = [summary["max_load_ms"] for summary in summaries if summary.get("max_load_ms") is not None]
+    ttfbs = [summary["max_ttfb_ms"] for summary in summaries if summary.get("max_ttfb_ms") is not None]
+    return {
+        "pages": sum(summary["pages"] for summary in summaries),
+        "median_load_ms": statistics.median(loads) if loads else None,
+        "max_load_ms": max(maxima) if maxima else None,
+        "max_ttfb_ms": max(ttfbs) if ttfbs else None,
+        "long_tasks_ms": sum(summary["long_tasks_ms"] for summary in summaries),
+        "transfer_bytes": sum(summary["transfer_bytes"] for summary in summaries),
+        "too_slow": [entry for summary in summaries for entry in summary["too_slow"]],
+    }
+
+
+def format_metric_summary(summary):
+    def ms(value):
+        return "n/a" if value is None else f"{value:.0f} ms"
+    return (f"{summary['pages']} pages, median load {ms(summary['median_load_ms'])}, "
+            f"max load {ms(summary['max_load_ms'])}, max TTFB {ms(summary['max_ttfb_ms'])}, "
+            f"long tasks {summary['long_tasks_ms']} ms, {summary['transfer_bytes'] / 1024:.0f} KiB")
+
+
+# Command-line "name=ms" overrides on top of the default thresholds ("name=off" removes a limit)
+def parse_thresholds(values):
+    thresholds = dict(default_thresholds)
+    for value in values or []:
+        name, _, limit = value.partition("=")
+        if name not in default_thresholds or not limit:
+            raise ValueError(f"Expected NAME=MS with NAME one of {', '.join(default_thresholds)}: {value}")
+        thresholds[name] = None if limit == "off" else float(limit)
+    return thresholds
@@ -0,0 +1,419 @@
+import json
+import logging
+import time
+
+from retry import is_transient, no_retry, retry_delay, retry_policies, retry_recoveries
+from tracing import span
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+
+class PlanError(ValueError):
+    pass
+
+
+# Product catalog: every product the tool can act on, in the order the site lists them.
+#   name        product name as shown on the site (used in "Open ... Page" test names)
+#   short_name  name used in the "Add ..."/"Remove ..." test names
+#   label       text of the UI checkboxes
+#   slug        suffix of the add-to-cart-/remove- button data-test attributes
+products = [
+    {"key": "backpack", "item_id": 4, "name": "Sauce Labs Backpack", "short_name": "backpack",
+     "label": "Backpack", "slug": "sauce-labs-backpack"},
+    {"key": "bike_light", "item_id": 0, "name": "Sauce Labs Bike Light", "short_name": "Bike Light",
+     "label": "Bike Light", "slug": "sauce-labs-bike-light"},
+    {"key": "bolt_tshirt", "item_id": 1, "name": "Sauce Labs Bolt T-Shirt", "short_name": "Bolt T-Shirt",
+     "label": "Bolt T-Shirt", "slug": "sauce-labs-bolt-t-shirt"},
+    {"key": "fleece_jacket", "item_id": 5, "name": "Sauce Labs Fleece Jacket", "short_name": "Fleece Jacket",
+     "label": "Fleece Jacket", "slug": "sauce-labs-fleece-jacket"},
+    {"key": "onesie", "item_id": 2, "name": "Sauce Labs Onesie", "short_name": "Onesie",
+     "label": "Onesie", "slug": "sauce-labs-onesie"},
+    {"key": "allthethings_tshirt", "item_id": 3, "name": "Test.allTheThings() T-Shirt (Red)",
+     "short_name": "Test.allTheThings() T-Shirt (Red)", "label": "Test.allTheThings() T-Shirt (Red)",
+     "slug": "test.allthethings()-t-shirt-(red)"},
+]
+
+products_by_key = {product["key"]: product for product in products}
+
+# Site under test. Point base_url at a local stand-in (see standin_server.py) for network-free runs.
+default_base_url = "https://www.saucedemo.com/"
+
+# Users the tool knows how to log in as
+user_options = [
+    "standard_user",
+    "locked_out_user",
+    "problem_user",
+    "performance_glitch_user",
+    "error_user",
+    "visual_user"
+]
+
+# Step registry: step type -> how it is named, ordered and shown. The code that performs a step is
+# bound separately with @step_handler, so plans can be listed and validated without a browser.
+#   phase              steps run in phase order (stable within a phase) when the plan is reordered
+#   per_product        the step takes a "product" parameter and exists once per catalog product
+#   test_name          summary name, formatted with the product fields for per-product steps
+#   checkbox           UI checkbox text (formatted the same way); None = no checkbox
+#   checked            the UI checkbox starts ticked
+#   section            UI section the checkbox goes in
+#   report_unexecuted  list the step under "Unexecuted Tests" when the plan leaves it out
+#   required           always part of the plan (added at the front when missing)
+#   fallback           step type added instead of a missing required step (e.g. restore a cached login)
+#   stop_on_failure    abort the rest of the plan when the step fails
+#   page               page the browser must be on before the step runs (see navigation.py); None = any
+#   collect_metrics    navigation/interaction worth timing in the browser after the step (see perf_metrics.py)
+#   requires           step types (for the same product) whose effect this step needs: e.g. an item in the cart
+#   fixture            step type that sets up what "requires" names when those steps are not in the plan, for all
+#                      such steps at once (e.g. seeding the cart through storage instead of clicking every add)
+#   writes             shared state the step changes: "session" (logging in or out) or "cart". Steps writing the
+#                      same state run one after another, and every step runs inside the session (see scheduler.py)
+#   tab                the step brings its own page, so the scheduler can load it ahead in a tab of its own
+step_types = {}
+
+
+def register_step_type(name, test_name, phase, per_product=False, checkbox=None, section=None, checked=False,
+                       report_unexecuted=True, required=False, fallback=None, stop_on_failure=False, page=None,
+                       collect_metrics=False, requires=(), fixture=None, writes=(), tab=False):
+    step_types[name] = {
+        "name": name,
+        "test_name": test_name,
+        "phase": phase,
+        "per_product": per_product,
+        "checkbox": checkbox,
+        "section": section,
+        "checked": checked,
+        "report_unexecuted": report_unexecuted,
+        "required": required,
+        "fallback": fallback,
+        "stop_on_failure": stop_on_failure,
+        "page": page,
+        "collect_metrics": collect_metrics,
+        "requires": tuple(requires),
+        "fixture": fixture,
+        "writes": tuple(writes),
+        "tab": tab,
+    }
+    return step_types[name]
+
+
+# A plan without "login" starts from a cached authenticated session instead of typing into the form
+register_step_type("login", "Login", phase=0, checkbox="Login Test", checked=True, required=True,
+                   fallback="restore_session", report_unexecuted=False, stop_on_failure=True, collect_metrics=True,
+                   writes=["session"])
+register_step_type("restore_session", "Restore Session", phase=0, report_unexecuted=False, stop_on_failure=True,
+                   collect_metrics=True, writes=["session"])
+register_step_type("open_product", "Open {name} Page", phase=1, per_product=True, checkbox="Open {label} Page",
+                   section="3rd Section: Product Pages", report_unexecuted=False, collect_metrics=True, tab=True)
+register_step_type("check_prices", "Check Prices", phase=2, checkbox="Check Prices", section="Check Prices",
+                   page="inventory")
+register_step_type("add_to_cart", "Add {short_name}", phase=3, per_product=True, checkbox="Add {label}",
+                   section="1st Section: Add to Cart", page="inventory", collect_metrics=True, writes=["cart"])
+register_step_type("remove_from_cart", "Remove {short_name}", phase=4, per_product=True, checkbox="Remove {label}",
+                   section="2nd Section: Remove from Cart", page="inventory", collect_metrics=True,
+                   requires=["add_to_cart"], fixture="prepare_cart", writes=["cart"])
+# Fixture of the removals: puts the items in the cart through browser storage (see cart_fixtures.py)
+register_step_type("prepare_cart", "Prepare Cart", phase=4, report_unexecuted=False, writes=["cart"])
+register_step_type("logout", "Logout", phase=5, checkbox="Logout Test", section="2nd Section: Remove from Cart",
+                   collect_metrics=True, writes=["session"])
+
+# step type -> function(context, **params) returning True (passed) or False (failed)
+step_handlers = {}
+
+
+def step_handler(name):
+    def register(function):
+        if name not in step_types:
+            raise PlanError(f"Handler registered for unknown step type: {name}")
+        step_handlers[name] = function
+        return function
+    return register
+
+
+def step_test_name(step_type, product=None):
+    spec = step_types[step_type]
+    return spec["test_name"].format(**product) if spec["per_product"] else spec["test_name"]
+
+
+# Step types that only stand in for other steps (fallbacks and fixtures): never selected, only added by compile_plan
+def stand_in_step_types():
+    return {spec[field] for spec in step_types.values() for field in ("fallback", "fixture") if spec[field]}
+
+
+# Step types a plan can select (the --steps choices): every registered one but the stand-ins
+def selectable_step_types():
+    stand_ins = stand_in_step_types()
+    return [name for name in step_types if name not in stand_ins]
+
+
+# Every step the registry knows, for every product: the "Select All" plan (stand-in steps left out)
+def full_plan():
+    stand_ins = stand_in_step_types()
+    plan = []
+    for spec in step_types.values():
+        if spec["name"] in stand_ins:
+            continue
+        if spec["per_product"]:
+            plan.extend({"step": spec["name"], "product": product["key"]} for product in products)
+        else:
+            plan.append({"step": spec["name"]})
+    return plan
+
+
+# Plans are JSON lists of steps, e.g. [{"step": "add_to_cart", "product": "backpack"}, {"step": "logout"}].
+# "product": "all" expands to one step per catalog product.
+def load_plan(path):
+    with open(path, encoding="utf-8") as plan_file:
+        return json.load(plan_file)
+
+
+# Validate a plan and turn it into the execution plan: resolved products, test names, duplicates dropped,
+# required steps added and (with reorder=True) steps sorted by phase, plus the list of unexecuted tests.
+def compile_plan(plan, reorder=True):
+    if not isinstance(plan, list):
+        raise PlanError("A plan must be a list of steps")
+    steps = []
+    seen = set()
+    for position, entry in enumerate(plan):
+        if isinstance(entry, str):
+            entry = {"step": entry}
+        if not isinstance(entry, dict) or "step" not in entry:
+            raise PlanError(f"Plan entry {position} must be an object with a 'step' key: {entry!r}")
+        step_type = entry["step"]
+        spec = step_types.get(step_type)
+        if spec is None:
+            raise PlanError(f"Unknown step '{step_type}' (known steps: {', '.join(step_types)})")
+        unknown = set(entry) - {"step", "product"}
+        if unknown:
+            raise PlanError(f"Unknown parameter(s) {', '.join(sorted(unknown))} for step '{step_type}'")
+        if spec["per_product"]:
+            product_key = entry.get("product")
+            if product_key == "all":
+                targets = products
+            elif product_key in products_by_key:
+                targets = [products_by_key[product_key]]
+            else:
+                raise PlanError(f"Step '{step_type}' needs a product, one of: all, {', '.join(products_by_key)}")
+        else:
+            if "product" in entry:
+                raise PlanError(f"Step '{step_type}' does not take a product")
+            targets = [None]
+        for product in targets:
+            name = step_test_name(step_type, product)
+            if name in seen:
+                continue
+            seen.add(name)
+            steps.append({
+                "type": step_type,
+                "name": name,
+                "phase": spec["phase"],
+                "params": {"product": product} if product else {},
+                "position": len(steps),
+            })
+
+    add_required_steps(steps)
+    add_fixture_steps(steps)
+    if reorder:
+        steps.sort(key=lambda step: (step["phase"], step["position"]))
+
+    unexecuted = []
+    for spec in step_types.values():
+        if not spec["report_unexecuted"]:
+            continue
+        for product in (products if spec["per_product"] else [None]):
+            name = step_test_name(spec["name"], product)
+            if name not in seen:
+                unexecuted.append(name)
+    return {"steps": steps, "unexecuted": unexecuted}
+
+
+def add_required_steps(steps):
+    for spec in step_types.values():
+        if spec["required"] and not any(step["type"] in (spec["name"], spec["fallback"]) for step in steps):
+            step_type = spec["fallback"] or spec["name"]
+            steps.insert(0, {"type": step_type, "name": step_test_name(step_type), "phase": step_types[step_type]["phase"],
+                             "params": {}, "position": -1})
+
+
+# One fixture step per fixture type, in front of the first step that needs it, for the steps whose
+# required steps are not in the plan (e.g. "Remove Onesie" without "Add Onesie")
+def add_fixture_steps(steps):
+    present = {(step["type"], step["params"].get("product", {}).get("key")) for step in steps}
+    fixtures = {}
+    for index, step in enumerate(steps):
+        spec = step_types[step["type"]]
+        product = step["params"].get("product")
+        if not spec["fixture"]:
+            continue
+        missing = [required_type for required_type in spec["requires"]
+                   if (required_type, product["key"] if product and step_types[required_type]["per_product"] else None)
+                   not in present]
+        if missing:
+            fixture = fixtures.setdefault(spec["fixture"], {"index": index, "products": []})
+            if product:
+                fixture["products"].append(product)
+    for step_type, fixture in sorted(fixtures.items(), key=lambda item: item[1]["index"], reverse=True):
+        steps.insert(fixture["index"], {"type": step_type, "name": step_test_name(step_type),
+                                        "phase": step_types[step_type]["phase"],
+                                        "params": {"items": fixture["products"]}, "position": -1})
+
+
+# Resume an interrupted run: the part of a compiled plan that still has to run, given the names of the steps
+# that already completed (passed or failed, see journal.py). The new browser session starts without the
+# effects of the completed steps: a rerun step gets what it requires from its fixture (the cart seeded
+# through storage), or else by running the required steps again, and a completed login is not typed again:
+# required steps fall back as in compile_plan.
+# Returns the plan to run and the names of the completed steps whose earlier outcome stands.
+def resume_plan(compiled, completed):
+    stand_ins = stand_in_step_types()
+    planned = [step for step in compiled["steps"] if step["type"] not in stand_ins]
+    by_key = {(step["type"], step["params"].get("product", {}).get("key")): step for step in planned}
+    rerun = set()
+
+    def include(step):
+        if step["name"] in rerun:
+            return
+        rerun.add(step["name"])
+        product = step["params"].get("product")
+        if step_types[step["type"]]["fixture"]:
+            return
+        for required_type in step_types[step["type"]]["requires"]:
+            key = product["key"] if product and step_types[required_type]["per_product"] else None
+            if (required_type, key) in by_key:
+                include(by_key[(required_type, key)])
+
+    for step in planned:
+        if step["name"] not in completed:
+            include(step)
+    steps = [step for step in planned if step["name"] in rerun]
+    if steps:
+        add_required_steps(steps)
+        add_fixture_steps(steps)
+    running = {step["name"] for step in steps}
+    kept = [step["name"] for step in compiled["steps"] if step["name"] not in running and step["name"] in completed]
+    return {"steps": steps, "unexecuted": compiled["unexecuted"]}, kept
+
+
+# Run a compiled plan. context carries the driver and run settings plus the succeeded/failed/unexecuted
+# lists the results go into; handlers can record extra results with context["record"](name, passed).
+# With a context["navigator"] (navigation.NavigationPlanner) the browser is moved to the page a step
+# needs only when it is somewhere else. Every step is timed into context["step_results"] and traced as a span.
+# Optional: context["progress"](event) is called before and after every step, a set context["cancel_event"]
+# (threading.Event) stops the plan before the next step, and context["after_step"](step, step_result) can
+# add to a step's result or fail it by setting step_result["passed"] = False (e.g. perf_metrics thresholds).
+# A context["journal"] (journal.RunJournal) gets every finished step with the results it recorded.
+# A step that fails with a transient exception is retried on the same session as its retry policy allows
+# (see retry.py): the results of the failed attempt are taken back, the page it needs is loaded again and
+# its retry recovery restores what it needs; step_result["attempts"], ["retry_errors"] (exceptions of the failed attempts)
+# and ["flaky"] (worked after a retry) record it.
+# A context["scheduler"] (scheduler.StepScheduler, whose plan this is) skips the steps whose prerequisites failed,
+# listing them as unexecuted with the reason, and moves the browser to a step's own tab before it runs.
+def execute_plan(compiled, context):
+    navigator = context.get("navigator")
+    step_results = context.setdefault("step_results", [])
+    progress = context.get("progress")
+    after_step = context.get("after_step")
+    cancel_event = context.get("cancel_event")
+    journal = context.get("journal")
+    scheduler = context.get("scheduler")
+    steps = compiled["steps"]
+    step_tests = []
+
+    def record(name, passed):
+        (context["succeeded"] if passed else context["failed"]).append(name)
+        step_tests.append([name, passed])
+
+    context["record"] = record
+    context["unexecuted"].extend(compiled["unexecuted"])
+    for name in compiled["unexecuted"]:
+        debug_logger.info(f"{name} test was not executed")
+
+    for index, step in enumerate(steps):
+        if cancel_event is not None and cancel_event.is_set():
+            cancelled = [remaining["name"] for remaining in steps[index:]]
+            context["unexecuted"].extend(cancelled)
+            context["cancelled"] = True
+            debug_logger.warning(f"Run cancelled, skipping: {', '.join(cancelled)}")
+            break
+        handler = step_handlers.get(step["type"])
+        if handler is None:
+            raise PlanError(f"No handler registered for step '{step['type']}'")
+        if scheduler is not None:
+            reason = scheduler.skip_reason(step)
+            if reason:
+                debug_logger.warning(f"Skipping {step['name']}: {reason}")
+                context["unexecuted"].append(f"{step['name']} (skipped: {reason})")
+                scheduler.skipped(step)
+                if progress:
+                    progress({"event": "step_skipped", "name": step["name"], "reason": reason, "index": index,
+                              "total": len(steps)})
+                continue
+            scheduler.before_step(step)
+        if progress:
+            progress({"event": "step_started", "name": step["name"], "index": index, "total": len(steps)})
+        step_tests.clear()
+        policy = retry_policies.get(step["type"], no_retry)
+        retry_errors = []
+        start_time = time.perf_counter()
+        with span(step["name"], "step", step=step["name"], step_type=step["type"]) as trace_span:
+            for attempt in range(1, policy["attempts"] + 1):
+                error = None
+                try:
+                    page = step_types[step["type"]]["page"]
+                    if navigator and page:
+                        navigator.ensure(page)
+                    if attempt > 1 and step["type"] in retry_recoveries:
+                        retry_recoveries[step["type"]](context, **step["params"])
+                    passed = bool(handler(context, **step["params"]))
+                except Exception as e:
+                    debug_logger.error(f"{step['name']} failed: {str(e)}")
+                    trace_span["attributes"]["error"] = str(e)
+                    error = e
+                    passed = False
+                    retry_errors.append(type(e).__name__)
+                if passed or attempt == policy["attempts"] or not is_transient(policy, error):
+                    break
+                debug_logger.warning(f"Retrying {step['name']} after {type(error).__name__} "
+                                     f"(attempt {attempt + 1} of {policy['attempts']})")
+                for name, recorded_passed in step_tests:
+                    (context["succeeded"] if recorded_passed else context["failed"]).remove(name)
+                step_tests.clear()
+                if navigator:
+                    navigator.invalidate()  # The failed attempt may have left the browser anywhere
+                time.sleep(retry_delay(policy, attempt))
+            trace_span["attributes"]["outcome"] = "passed" if passed else "failed"
+            trace_span["attributes"]["attempts"] = attempt
+        step_result = {"name": step["name"], "type": step["type"], "passed": passed,
+                       "duration": time.perf_counter() - start_time}
+        if attempt > 1:
+            step_result.update(attempts=attempt, retry_errors=retry_errors, flaky=passed)
+        worked = passed  # A step the hook fails (e.g. too slow) still did its job: no need to abort the plan
+        if after_step:
+            after_step(step, step_result)
+            passed = step_result["passed"]
+        step_results.append(step_result)
+        if progress:
+            progress(dict(step_result, event="step_finished", index=index, total=len(steps)))
+        if not worked and navigator:
+            navigator.invalidate()  # A failed step may have left the browser anywhere
+        record(step["name"], passed)
+        if journal:
+            journal.step_finished(step_result, list(step_tests))
+        if scheduler is not None:
+            scheduler.step_finished(step, worked)
+        if not worked and step_types[step["type"]]["stop_on_failure"]:
+            debug_logger.error(f"Stopping the plan after failed step: {step['name']}")
+            break
+
+
+# One after_step hook running several in order (None when there are none)
+def chain_hooks(*hooks):
+    hooks = [hook for hook in hooks if hook]
+    if len(hooks) < 2:
+        return hooks[0] if hooks else None
+
+    def after_step(step, step_result):
+        for hook in hooks:
+            hook(step, step_result)
+
+    return after_step
@@ -0,0 +1,434 @@
+import argparse
+import json
+import logging
+import math
+import sqlite3
+import statistics
+import time
+from contextlib import closing
+from decimal import Decimal, InvalidOperation
+
+from perf_metrics import format_metric_summary
+from retry import summarize_retries
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+default_results_db = "results.db"
+
+schema = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    user TEXT NOT NULL,
+    browser TEXT NOT NULL,
+    profile TEXT,
+    base_url TEXT,
+    navigation TEXT,
+    duration REAL,
+    succeeded INTEGER NOT NULL,
+    failed INTEGER NOT NULL,
+    unexecuted INTEGER NOT NULL,
+    cancelled INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    page_metrics TEXT,
+    locator_stats TEXT,
+    visual_report TEXT
+);
+CREATE TABLE IF NOT EXISTS steps (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    type TEXT,
+    status TEXT NOT NULL CHECK (status IN ('passed', 'failed', 'unexecuted')),
+    failure TEXT,
+    duration REAL,
+    metrics TEXT,
+    attempts INTEGER,
+    retry_errors TEXT
+);
+CREATE TABLE IF NOT EXISTS timings (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    kind TEXT,
+    timeout REAL,
+    elapsed REAL NOT NULL,
+    met INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS prices (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    item_id INTEGER,
+    name TEXT NOT NULL,
+    price TEXT,
+    price_cents INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_started_at ON runs (started_at);
+CREATE INDEX IF NOT EXISTS runs_user_started_at ON runs (user, started_at);
+CREATE INDEX IF NOT EXISTS runs_browser_started_at ON runs (browser, started_at);
+CREATE INDEX IF NOT EXISTS steps_run_id ON steps (run_id);
+CREATE INDEX IF NOT EXISTS steps_name_run_id ON steps (name, run_id);
+CREATE INDEX IF NOT EXISTS timings_run_id ON timings (run_id);
+CREATE INDEX IF NOT EXISTS prices_run_id ON prices (run_id);
+CREATE INDEX IF NOT EXISTS prices_item_id ON prices (item_id, run_id);
+"""
+
+# Columns added after the first release; databases created before them get them added when opened
+added_columns = {
+    "runs": ["locator_stats TEXT", "visual_report TEXT"],
+    "steps": ["attempts INTEGER", "retry_errors TEXT"],
+}
+
+# SQLite strftime formats for the trend buckets
+bucket_formats = {"hour": "%Y-%m-%d %H:00", "day": "%Y-%m-%d", "week": "%Y-W%W", "month": "%Y-%m"}
+
+
+# "$29.99" -> 2999
+def price_to_cents(price):
+    try:
+        return int(Decimal(str(price).replace("$", "").strip()) * 100)
+    except (InvalidOperation, ValueError):
+        return None
+
+
+# History of every run: runs, their steps, waits and scraped prices. Connections are opened per call, so one
+# store can be shared by the UI's worker thread and the main thread (sqlite3 connections can't be).
+class ResultsStore:
+    def __init__(self, path=default_results_db):
+        self.path = path
+        with closing(self.connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")  # Readers (trend queries) don't block the writer
+            connection.executescript(schema)
+            for table, table_columns in added_columns.items():
+                existing = {row["name"] for row in connection.execute(f"PRAGMA table_info({table})")}
+                for column in table_columns:
+                    if column.split()[0] not in existing:
+                        connection.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA foreign_keys=ON")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    # Store a run_test result in one transaction and return its run id
+    def save_run(self, run_result):
+        step_results = {step["name"]: step for step in run_result.get("steps", [])}
+        step_rows = []
+        for status, key in (("passed", "succeeded"), ("failed", "failed"), ("unexecuted", "unexecuted")):
+            for name in run_result[key]:
+                step = step_results.get(name, {})
+                metrics = step.get("metrics")
+                retry_errors = step.get("retry_errors")
+                step_rows.append((len(step_rows), name, step.get("type"), status, step.get("failure"),
+                                  step.get("duration"), json.dumps(metrics) if metrics else None,
+                                  step.get("attempts", 1) if step else None,
+                                  ",".join(retry_errors) if retry_errors else None))
+        timing_rows = [(position, wait["name"], wait.get("kind"), wait.get("timeout"), wait["elapsed"], int(wait["met"]))
+                       for position, wait in enumerate(run_result.get("waits", []))]
+        if run_result.get("items"):
+            price_rows = [(position, item.get("item_id"), item["name"], item["price"], price_to_cents(item["price"]))
+                          for position, item in enumerate(run_result["items"])]
+        else:
+            price_rows = [(position, None, name, price, price_to_cents(price))
+                          for position, (name, price) in enumerate(run_result.get("item_prices", []))]
+
+        with closing(self.connect()) as connection, connection:
+            cursor = connection.execute(
+                "INSERT INTO runs (started_at, user, browser, profile, base_url, navigation, duration, succeeded, "
+                "failed, unexecuted, cancelled, error, page_metrics, locator_stats, visual_report) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_result.get("started_at", time.time()), run_result["user"], run_result["browser"],
+                 run_result.get("profile"), run_result.get("base_url"), run_result.get("navigation"),
+                 run_result.get("duration"), len(run_result["succeeded"]), len(run_result["failed"]),
+                 len(run_result["unexecuted"]), int(bool(run_result.get("cancelled"))), run_result.get("error"),
+                 json.dumps(run_result["page_metrics"]) if run_result.get("page_metrics") else None,
+                 json.dumps(run_result["locators"]) if run_result.get("locators") else None,
+                 json.dumps(run_result["visual"]) if run_result.get("visual") else None))
+            run_id = cursor.lastrowid
+            connection.executemany(
+                "INSERT INTO steps (run_id, position, name, type, status, failure, duration, metrics, attempts, "
+                "retry_errors) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [(run_id,) + row for row in step_rows])
+            connection.executemany(
+                "INSERT INTO timings (run_id, position, name, kind, timeout, elapsed, met) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(run_id,) + row for row in timing_rows])
+            connection.executemany(
+                "INSERT INTO prices (run_id, position, item_id, name, price, price_cents) VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id,) + row for row in price_rows])
+        debug_logger.info(f"Run {run_id} saved to {self.path}")
+        return run_id
+
+    # A stored run in the shape run_test returns (the fields the summary needs), or None
+    def load_run(self, run_id):
+        with closing(self.connect()) as connection:
+            run = connection.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+            if run is None:
+                return None
+            steps = connection.execute("SELECT * FROM steps WHERE run_id = ? ORDER BY position", (run_id,)).fetchall()
+            waits = connection.execute("SELECT * FROM timings WHERE run_id = ? ORDER BY position", (run_id,)).fetchall()
+            prices = connection.execute("SELECT * FROM prices WHERE run_id = ? ORDER BY position", (run_id,)).fetchall()
+        return {
+            "run_id": run["id"],
+            "started_at": run["started_at"],
+            "user": run["user"],
+            "browser": run["browser"],
+            "profile": run["profile"],
+            "duration": run["duration"],
+            "error": run["error"],
+            "succeeded": [step["name"] for step in steps if step["status"] == "passed"],
+            "failed": [step["name"] for step in steps if step["status"] == "failed"],
+            "unexecuted": [step["name"] for step in steps if step["status"] == "unexecuted"],
+            "item_prices": [(price["name"], price["price"]) for price in prices],
+            "waits": [{"name": wait["name"], "kind": wait["kind"], "timeout": wait["timeout"],
+                       "elapsed": wait["elapsed"], "met": bool(wait["met"])} for wait in waits],
+            "page_metrics": json.loads(run["page_metrics"]) if run["page_metrics"] else None,
+            "locators": json.loads(run["locator_stats"]) if run["locator_stats"] else None,
+            "visual": json.loads(run["visual_report"]) if run["visual_report"] else None,
+            "retries": summarize_retries([{"name": step["name"], "attempts": step["attempts"] or 1,
+                                           "retry_errors": step["retry_errors"].split(",") if step["retry_errors"] else [],
+                                           "flaky": step["status"] == "passed" or step["failure"] == "too slow"}
+                                          for step in steps if step["status"] != "unexecuted"]),
+        }
+
+    def recent_runs(self, limit=20, user=None, browser=None):
+        query, params = "SELECT * FROM runs", []
+        query, params = add_filters(query, params, user=user, browser=browser)
+        with closing(self.connect()) as connection:
+            return connection.execute(query + " ORDER BY started_at DESC LIMIT ?", params + [limit]).fetchall()
+
+    # Share of passed runs (or of passed executions of one step) per time bucket
+    def pass_rate_trend(self, bucket="day", days=30, user=None, browser=None, step=None):
+        since = time.time() - days * 86400
+        bucket_sql = f"strftime('{bucket_formats[bucket]}', runs.started_at, 'unixepoch', 'localtime')"
+        if step:
+            query = (f"SELECT {bucket_sql} AS bucket, COUNT(*) AS total, SUM(steps.status = 'passed') AS passed "
+                     "FROM steps JOIN runs ON runs.id = steps.run_id "
+                     "WHERE steps.name = ? AND steps.status != 'unexecuted' AND runs.started_at >= ?")
+            params = [step, since]
+        else:
+            query = (f"SELECT {bucket_sql} AS bucket, COUNT(*) AS total, SUM(runs.failed = 0 AND runs.error IS NULL) "
+                     "AS passed FROM runs WHERE runs.started_at >= ?")
+            params = [since]
+        query, params = add_filters(query, params, user=user, browser=browser)
+        with closing(self.connect()) as connection:
+            rows = connection.execute(query + " GROUP BY bucket ORDER BY bucket", params).fetchall()
+        return [{"bucket": row["bucket"], "total": row["total"], "passed": row["passed"],
+                 "pass_rate": row["passed"] / row["total"]} for row in rows]
+
+    # Median/p95/max duration (seconds) of whole runs or of one step per time bucket
+    def latency_trend(self, bucket="day", days=30, user=None, browser=None, step=None):
+        since = time.time() - days * 86400
+        bucket_sql = f"strftime('{bucket_formats[bucket]}', runs.started_at, 'unixepoch', 'localtime')"
+        if step:
+            query = (f"SELECT {bucket_sql} AS bucket, steps.duration AS duration FROM steps "
+                     "JOIN runs ON runs.id = steps.run_id WHERE steps.name = ? AND steps.duration IS NOT NULL "
+                     "AND runs.started_at >= ?")
+            params = [step, since]
+        else:
+            query = (f"SELECT {bucket_sql} AS bucket, runs.duration AS duration FROM runs "
+                     "WHERE runs.duration IS NOT NULL AND runs.started_at >= ?")
+            params = [since]
+        query, params = add_filters(query, params, user=user, browser=browser)
+        samples = {}
+        with closing(self.connect()) as connection:
+            for row in connection.execute(query, params):
+                samples.setdefault(row["bucket"], []).append(row["duration"])
+        trend = []
+        for bucket_name in sorted(samples):
+            durations = sorted(samples[bucket_name])
+            trend.append({"bucket": bucket_name, "count": len(durations), "median": statistics.median(durations),
+                          "p95": durations[max(1, math.ceil(0.95 * len(durations))) - 1], "max": durations[-1]})
+        return trend
+
+    # Per step: how often it ran, passed at the first try, passed only after retries (flaky) and failed
+    # even after retries (hard), worst first
+    def flaky_steps(self, days=30, user=None, browser=None):
+        since = time.time() - days * 86400
+        query = ("SELECT steps.name AS name, COUNT(*) AS total, "
+                 "SUM(steps.status = 'passed' AND COALESCE(steps.attempts, 1) = 1) AS first_try, "
+                 "SUM(COALESCE(steps.attempts, 1) > 1 AND (steps.status = 'passed' "
+                 "OR COALESCE(steps.failure, '') = 'too slow')) AS flaky, SUM(COALESCE(steps.attempts, 1) > 1 AND steps.status = 'failed' "
+                 "AND COALESCE(steps.failure, '') != 'too slow') AS hard, SUM(steps.status = 'failed') AS failed "
+                 "FROM steps JOIN runs ON runs.id = steps.run_id "
+                 "WHERE steps.status != 'unexecuted' AND runs.started_at >= ?")
+        query, params = add_filters(query, [since], user=user, browser=browser)
+        with closing(self.connect()) as connection:
+            rows = connection.execute(query + " GROUP BY steps.name HAVING flaky + hard > 0 "
+                                      "ORDER BY flaky + hard DESC, name", params).fetchall()
+        return [dict(row) for row in rows]
+
+
+def add_filters(query, params, user=None, browser=None):
+    for column, value in (("runs.user", user), ("runs.browser", browser)):
+        if value:
+            query += (" AND " if " WHERE " in query else " WHERE ") + f"{column} = ?"
+            params = params + [value]
+    return query, params
+
+
+# The copypasta summary of a run (as returned by run_test or ResultsStore.load_run)
+def format_summary(run):
+    summary_lines = [
+        "🔥🔥🔥 Test Summary 🔥🔥🔥",
+        f"👤 Selected User: {run['user']}",
+        "",
+        "✅ Succeeded Tests:",
+        "-------------------"
+    ]
+    summary_lines.extend([f"✔️ {test}" for test in run["succeeded"]] if run["succeeded"] else ["None 😢"])
+
+    summary_lines.extend([
+        "",
+        "❌ Failed Tests:",
+        "----------------"
+    ])
+    summary_lines.extend([f"❌ {test}" for test in run["failed"]] if run["failed"] else ["None 🎉"])
+
+    summary_lines.extend([
+        "",
+        "⏭️ Unexecuted Tests:",
+        "---------------------"
+    ])
+    summary_lines.extend([f"⏭️ {test}" for test in run["unexecuted"]] if run["unexecuted"] else ["None 🚫"])
+
+    summary_lines.append("")
+
+    summary_lines.extend([
+        "",
+        "💰 Item Prices:",
+        "----------------"
+    ])
+    for item_name, item_price in run["item_prices"]:
+        summary_lines.append(f"💲{item_name}: {item_price}")
+    summary_lines.append("")
+
+    # How long the run spent waiting for the site, and which conditions were never met
+    total_wait_time = sum(wait["elapsed"] for wait in run["waits"])
+    summary_lines.extend([
+        "",
+        "⏱️ Waiting:",
+        "-----------",
+        f"⏳ {total_wait_time:.2f} s spent in {len(run['waits'])} waits"
+    ])
+    summary_lines.extend([f"⌛ Timed out after {wait['elapsed']:.2f} s: {wait['name']}"
+                          for wait in run["waits"] if not wait["met"]])
+    summary_lines.append("")
+
+    # What finding elements cost: WebDriver round trips, how many lookups the element cache saved, and the
+    # most expensive targets
+    locators = run.get("locators")
+    if locators and locators["lookups"]:
+        summary_lines.extend([
+            "",
+            "🔎 Locating:",
+            "------------",
+            f"🎯 {locators['lookups']} lookups, {locators['cache_hits']} from the element cache, "
+            f"{locators['finds']} find_element calls in {locators['find_time']:.2f} s, {locators['stale']} stale"
+        ])
+        summary_lines.extend([f"🔍 {name}: {stats['finds']} finds, {stats['find_time'] * 1000:.0f} ms"
+                              for name, stats in list(locators["targets"].items())[:3]])
+        summary_lines.append("")
+
+    # Browser-side page timing, and the steps that worked but were too slow
+    page_metrics = run.get("page_metrics")
+    if page_metrics:
+        summary_lines.extend([
+            "",
+            "🐢 Page Timing:",
+            "---------------",
+            f"📊 {format_metric_summary(page_metrics)}"
+        ])
+        summary_lines.extend([f"🐌 Too slow: {entry}" for entry in page_metrics["too_slow"]])
+        summary_lines.append("")
+
+    # Steps that needed more than one try on the same session
+    retries = run.get("retries")
+    if retries and (retries["flaky"] or retries["hard"]):
+        summary_lines.extend([
+            "",
+            "🔁 Retries:",
+            "-----------"
+        ])
+        summary_lines.extend([f"🎲 Flaky: {step['name']} worked on attempt {step['attempts']} "
+                              f"(after {', '.join(step['errors'])})" for step in retries["flaky"]])
+        summary_lines.extend([f"🧱 Hard failure: {step['name']} failed all {step['attempts']} attempts "
+                              f"({', '.join(step['errors'])})" for step in retries["hard"]])
+        summary_lines.append("")
+
+    # Product cards that look different from their baseline screenshot
+    visual = run.get("visual")
+    if visual:
+        compared = [report for report in visual if "changed" in report]
+        summary_lines.extend([
+            "",
+            "👁️ Visual Check:",
+            "----------------",
+            f"🖼️ {len(compared)} cards compared, {sum(1 for report in compared if report['changed'])} changed, "
+            f"{sum(1 for report in visual if report.get('baseline') == 'saved')} baselines saved"
+        ])
+        summary_lines.extend([f"🎨 {report['checkpoint']}: {report['card']} "
+                              + (f"({report['reason']})" if "reason" in report else
+                                 f"({report['pixel_diff'] * 100:.1f}% pixels, hash distance {report['hash_distance']})")
+                              for report in compared if report["changed"]])
+        summary_lines.append("")
+
+    return "\n".join(summary_lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the stored test results")
+    parser.add_argument("--db", default=default_results_db, help=f"results database (default: {default_results_db})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    runs_parser = commands.add_parser("runs", help="list the most recent runs")
+    runs_parser.add_argument("--limit", type=int, default=20)
+
+    summary_parser = commands.add_parser("summary", help="print the summary of a stored run")
+    summary_parser.add_argument("run_id", type=int)
+
+    for name, help_text in (("pass-rate", "pass rate over time"), ("latency", "run or step duration over time")):
+        trend_parser = commands.add_parser(name, help=help_text)
+        trend_parser.add_argument("--step", help="a single test (e.g. 'Add backpack') instead of whole runs")
+        trend_parser.add_argument("--bucket", choices=list(bucket_formats), default="day")
+        trend_parser.add_argument("--days", type=float, default=30, help="how far back to look (default: 30)")
+    flaky_parser = commands.add_parser("flaky", help="steps that only passed after retries or failed all of them")
+    flaky_parser.add_argument("--days", type=float, default=30, help="how far back to look (default: 30)")
+    for subparser in commands.choices.values():
+        if subparser is not summary_parser:
+            subparser.add_argument("--user")
+            subparser.add_argument("--browser")
+    args = parser.parse_args()
+
+    store = ResultsStore(args.db)
+    if args.command == "runs":
+        for run in store.recent_runs(args.limit, args.user, args.browser):
+            started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run["started_at"]))
+            status = "❌" if run["failed"] or run["error"] else "✅"
+            print(f"{status} #{run['id']} {started} {run['user']}@{run['browser']}: {run['succeeded']} succeeded, "
+                  f"{run['failed']} failed, {run['unexecuted']} unexecuted in {run['duration'] or 0:.2f} s")
+    elif args.command == "summary":
+        run = store.load_run(args.run_id)
+        if run is None:
+            parser.error(f"No run with id {args.run_id}")
+        print(format_summary(run))
+    elif args.command == "flaky":
+        for row in store.flaky_steps(args.days, args.user, args.browser):
+            print(f"{row['name']}: {row['flaky']} flaky, {row['hard']} hard of {row['total']} runs "
+                  f"({row['first_try']} passed at the first try, {row['failed']} failed)")
+    elif args.command == "pass-rate":
+        for row in store.pass_rate_trend(args.bucket, args.days, args.user, args.browser, args.step):
+            print(f"{row['bucket']}: {row['pass_rate']:.0%} ({row['passed']}/{row['total']})")
+    else:
+        for row in store.latency_trend(args.bucket, args.days, args.user, args.browser, args.step):
+            print(f"{row['bucket']}: median {row['median']:.3f} s, p95 {row['p95']:.3f} s, max {row['max']:.3f} s "
+                  f"({row['count']} samples)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
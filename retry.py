@@ -0,0 +1,62 @@
+import logging
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+# Exceptions a step is worth retrying after on the same browser session: the site was slow or the page
+# changed under the step. Matched by class name anywhere in the exception's class hierarchy, so this
+# module (and plan_engine.py) doesn't need Selenium.
+default_transient = ("TimeoutException", "StaleElementReferenceException", "ElementClickInterceptedException",
+                     "ElementNotInteractableException")
+
+# Retry policies: step type -> how a failed step is retried before it counts as failed.
+#   attempts   tries in total (1 = no retry)
+#   backoff    seconds before the first retry, doubled for every further one
+#   transient  exception class names worth a retry; a step that fails any other way (or returns False) is not retried
+# Step types without a policy are tried once. Login has none: it stops the plan, and a rejected user fails it for good.
+retry_policies = {}
+
+no_retry = {"attempts": 1, "backoff": 0.0, "transient": ()}
+
+
+def register_retry_policy(step_type, attempts=2, backoff=0.5, transient=default_transient):
+    retry_policies[step_type] = {"attempts": attempts, "backoff": backoff, "transient": tuple(transient)}
+    return retry_policies[step_type]
+
+
+register_retry_policy("open_product")
+register_retry_policy("check_prices")
+register_retry_policy("add_to_cart")
+register_retry_policy("remove_from_cart")
+register_retry_policy("logout")
+
+# step type -> function(context, **params) that puts back the state the step needs before it is retried
+# (e.g. the item back in the cart for a removal); registered next to the step handlers
+retry_recoveries = {}
+
+
+def retry_recovery(step_type):
+    def register(function):
+        retry_recoveries[step_type] = function
+        return function
+    return register
+
+
+def is_transient(policy, error):
+    return error is not None and any(cls.__name__ in policy["transient"] for cls in type(error).__mro__)
+
+
+def retry_delay(policy, attempt):
+    return policy["backoff"] * 2 ** (attempt - 1)
+
+
+# Flaky (worked after a retry) and hard (failed every attempt) steps of a run, from its step results
+def summarize_retries(step_results):
+    retried = [result for result in step_results if result.get("attempts", 1) > 1]
+    return {
+        "retries": sum(result["attempts"] - 1 for result in retried),
+        "flaky": [{"name": result["name"], "attempts": result["attempts"], "errors": result.get("retry_errors", [])}
+                  for result in retried if result.get("flaky")],
+        "hard": [{"name": result["name"], "attempts": result["attempts"], "errors": result.get("retry_errors", [])}
+                 for result in retried if not result.get("flaky")],
+    }
@@ -0,0 +1,168 @@
+import logging
+from selenium.common.exceptions import WebDriverException
+
+from plan_engine import step_types
+from tracing import span
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+# Step type -> (url, page) of the page a tab step brings along, for loading it ahead in its own tab
+tab_pages = {
+    "open_product": lambda navigator, product: (navigator.product_url(product), f"product:{product['item_id']}"),
+}
+
+
+def product_key(step):
+    product = step["params"].get("product")
+    return product["key"] if product else None
+
+
+# Dependency graph of a list of compiled steps: step name -> {"step", "needs", "after"}.
+#   needs  prerequisites the step can't do without: the session step before it, the steps it "requires"
+#          (for the same product) or the fixture standing in for them. A step whose need failed is skipped.
+#   after  ordering only: a step writing shared state ("cart", "session") runs after the previous writer of that
+#          state, and a session writer (logout) also after every step inside the session it ends.
+# Every step runs inside the session, i.e. reads the "session" state.
+def build_step_graph(steps):
+    graph = {}
+    names = {}  # (step type, product key) -> step name
+    last_writer = {}  # state -> step name
+    readers = {}  # state -> names of the steps that read it since its last writer
+    for step in steps:
+        spec = step_types[step["type"]]
+        needs, after = set(), set()
+        for required_type in spec["requires"]:
+            key = (required_type, product_key(step) if step_types[required_type]["per_product"] else None)
+            if key in names:
+                needs.add(names[key])
+            elif spec["fixture"] and (spec["fixture"], None) in names:
+                needs.add(names[(spec["fixture"], None)])
+        writes = set(spec["writes"])
+        if "session" not in writes and "session" in last_writer:
+            needs.add(last_writer["session"])
+            readers.setdefault("session", []).append(step["name"])
+        for state in writes:
+            if state in last_writer:
+                after.add(last_writer[state])
+            after.update(readers.pop(state, []))
+            last_writer[state] = step["name"]
+        names[(step["type"], product_key(step))] = step["name"]
+        graph[step["name"]] = {"step": step, "needs": needs, "after": after - needs}
+    return graph
+
+
+# Topological order of the graph, plan order among the steps that are ready, except that tab steps go last:
+# their pages load in the background while the steps of the main tab run
+def schedule_order(graph, tabs=True):
+    position = {name: index for index, name in enumerate(graph)}
+    waiting = {name: node["needs"] | node["after"] for name, node in graph.items()}
+    order = []
+    while waiting:
+        ready = [name for name, prerequisites in waiting.items() if not prerequisites]
+        if not ready:
+            raise ValueError(f"Steps depend on each other in a cycle: {', '.join(waiting)}")
+        name = min(ready, key=lambda ready_name: (tabs and step_types[graph[ready_name]["step"]["type"]]["tab"],
+                                                  position[ready_name]))
+        order.append(graph[name]["step"])
+        del waiting[name]
+        for prerequisites in waiting.values():
+            prerequisites.discard(name)
+    return order
+
+
+# Runs a compiled plan in dependency order inside one browser session (pass it as context["scheduler"] and
+# run self.plan with execute_plan). Steps whose prerequisites failed are skipped with the reason. Tab steps
+# (product pages) get their page opened with window.open as soon as they can run, up to max_tabs at a time,
+# so several pages load in the background while the main tab works through the cart; each such step then runs
+# in its tab, which is closed afterwards. max_tabs=0 (or click navigation) keeps every step in the main tab.
+# The order is worked out without a browser; attach() hands the scheduler the session before the plan runs.
+class StepScheduler:
+    def __init__(self, compiled, navigation="direct", max_tabs=4):
+        self.driver = None
+        self.navigator = None
+        self.max_tabs = max_tabs if navigation == "direct" else 0
+        self.graph = build_step_graph(compiled["steps"])
+        self.plan = {"steps": schedule_order(self.graph, tabs=self.max_tabs > 0), "unexecuted": compiled["unexecuted"]}
+        self.outcomes = {}  # step name -> True (did its job), False (failed) or None (skipped)
+        self.tabs = {}  # step name -> (window handle, page) of its tab
+        self.main_handle = None
+        self.main_page = None
+        self.stats = {"tabs_opened": 0, "skipped": 0}
+
+    def attach(self, driver, navigator):
+        self.driver = driver
+        self.navigator = navigator
+
+    def skip_reason(self, step):
+        for need in sorted(self.graph[step["name"]]["needs"]):
+            if need in self.outcomes and not self.outcomes[need]:
+                return f"{need} {'failed' if self.outcomes[need] is False else 'was skipped'}"
+        return None
+
+    def skipped(self, step):
+        self.outcomes[step["name"]] = None
+        self.stats["skipped"] += 1
+        self.close_tab(step["name"])
+
+    def before_step(self, step):
+        if self.max_tabs:
+            self.open_ready_tabs()
+        if step["name"] in self.tabs:
+            handle, page = self.tabs[step["name"]]
+            self.main_page = self.navigator.current_page
+            self.driver.switch_to.window(handle)
+            self.navigator.invalidate()  # Elements found in the main tab don't exist in this one
+            self.navigator.arrived(page)
+
+    def step_finished(self, step, worked):
+        self.outcomes[step["name"]] = worked
+        if step["name"] in self.tabs:
+            self.close_tab(step["name"])
+            self.navigator.invalidate()
+            self.navigator.arrived(self.main_page)
+
+    # Open the tabs of the tab steps that can run now (every prerequisite did its job)
+    def open_ready_tabs(self):
+        for name, node in self.graph.items():
+            if len(self.tabs) >= self.max_tabs:
+                return
+            step = node["step"]
+            if (not step_types[step["type"]]["tab"] or name in self.tabs or name in self.outcomes
+                    or not all(self.outcomes.get(prerequisite) for prerequisite in node["needs"] | node["after"])):
+                continue
+            url, page = tab_pages[step["type"]](self.navigator, **step["params"])
+            try:
+                with span(f"open tab {name}", "navigation", url=url):
+                    if self.main_handle is None:
+                        self.main_handle = self.driver.current_window_handle
+                    before = set(self.driver.window_handles)
+                    self.driver.execute_script("window.open(arguments[0], '_blank');", url)
+                    opened = [handle for handle in self.driver.window_handles if handle not in before]
+            except WebDriverException as e:
+                debug_logger.warning(f"Could not open a tab for {name}, running it in the main tab: {str(e)}")
+                self.max_tabs = 0
+                return
+            if not opened:
+                debug_logger.warning(f"The browser blocked the tab for {name}, running tab steps in the main tab")
+                self.max_tabs = 0
+                return
+            self.tabs[name] = (opened[0], page)
+            self.stats["tabs_opened"] += 1
+
+    def close_tab(self, name):
+        if name not in self.tabs:
+            return
+        handle, _ = self.tabs.pop(name)
+        try:
+            if self.driver.current_window_handle != handle:
+                self.driver.switch_to.window(handle)
+            self.driver.close()
+        except WebDriverException as e:
+            debug_logger.warning(f"Could not close the tab of {name}: {str(e)}")
+        self.driver.switch_to.window(self.main_handle)
+
+    # Close the tabs still open (e.g. the run stopped after a failed login)
+    def close(self):
+        for name in list(self.tabs):
+            self.close_tab(name)
@@ -0,0 +1,157 @@
+import logging
+import threading
+import time
+from selenium.common.exceptions import WebDriverException
+
+from drivers import create_driver
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+
+# A launched driver plus the bookkeeping needed to decide when to recycle it
+class PooledSession:
+    def __init__(self, browser, driver, profile="default"):
+        self.browser = browser
+        self.profile = profile
+        self.driver = driver
+        self.created_at = time.time()
+        self.uses = 0
+
+    def age(self):
+        return time.time() - self.created_at
+
+
+# Keeps up to `size` idle, already launched drivers per browser type and hands them out to runs.
+# A driver is reset (cookies, localStorage, sessionStorage, extra windows) when it comes back, health
+# checked when it goes out, and quit instead of reused after max_uses checkouts or max_age seconds.
+# Drivers are pooled per (browser, performance profile), since a profile is fixed when the browser starts.
+class SessionPool:
+    def __init__(self, size=1, max_uses=50, max_age=30 * 60, factory=create_driver):
+        self.size = size
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.factory = factory
+        self.idle = {}  # (browser, profile) -> [PooledSession]
+        self.checked_out = {}  # id(driver) -> PooledSession
+        self.lock = threading.Lock()
+        self.stats = {"launched": 0, "reused": 0, "recycled": 0, "unhealthy": 0}
+
+    # Launch drivers up front so the first run doesn't pay for the browser start
+    def prewarm(self, browser, count=None, profile="default"):
+        count = self.size if count is None else count
+        while True:
+            with self.lock:
+                if len(self.idle.get((browser, profile), [])) >= count:
+                    return
+            session = self.launch(browser, profile)
+            with self.lock:
+                self.idle.setdefault((browser, profile), []).append(session)
+
+    def launch(self, browser, profile="default"):
+        session = PooledSession(browser, self.factory(browser, profile=profile), profile)
+        with self.lock:
+            self.stats["launched"] += 1
+        return session
+
+    def checkout(self, browser, profile="default"):
+        while True:
+            with self.lock:
+                idle = self.idle.get((browser, profile))
+                session = idle.pop() if idle else None
+            if session is None:
+                session = self.launch(browser, profile)
+                break
+            if self.is_expired(session):
+                self.recycle(session, "expired")
+                continue
+            if not is_healthy(session.driver):
+                with self.lock:
+                    self.stats["unhealthy"] += 1
+                self.recycle(session, "failed health check")
+                continue
+            with self.lock:
+                self.stats["reused"] += 1
+            debug_logger.info(f"Reusing pooled {browser} WebDriver, profile {profile} (use {session.uses + 1}, age {session.age():.0f}s)")
+            break
+        session.uses += 1
+        with self.lock:
+            self.checked_out[id(session.driver)] = session
+        return session.driver
+
+    # Give a driver back. healthy=False (e.g. the run crashed or a command hung) always quits it.
+    def checkin(self, driver, healthy=True):
+        with self.lock:
+            session = self.checked_out.pop(id(driver), None)
+        if session is None:
+            quit_driver(driver)
+            return
+        if not healthy or self.is_expired(session):
+            self.recycle(session, "unhealthy" if not healthy else "expired")
+            return
+        try:
+            reset_session(driver)
+        except WebDriverException as e:
+            debug_logger.warning(f"Could not reset pooled {session.browser} WebDriver: {str(e)}")
+            self.recycle(session, "reset failed")
+            return
+        with self.lock:
+            idle = self.idle.setdefault((session.browser, session.profile), [])
+            if len(idle) < self.size:
+                idle.append(session)
+                return
+        self.recycle(session, "pool full")
+
+    def is_expired(self, session):
+        return session.uses >= self.max_uses or session.age() >= self.max_age
+
+    def recycle(self, session, reason):
+        debug_logger.info(f"Recycling pooled {session.browser} WebDriver after {session.uses} uses ({reason})")
+        with self.lock:
+            self.stats["recycled"] += 1
+        quit_driver(session.driver)
+
+    def close(self):
+        with self.lock:
+            sessions = [session for idle in self.idle.values() for session in idle]
+            sessions.extend(self.checked_out.values())
+            self.idle.clear()
+            self.checked_out.clear()
+        for session in sessions:
+            quit_driver(session.driver)
+        debug_logger.info(f"Session pool closed: {self.stats}")
+
+
+# Bring a driver back to a blank state. Web storage can only be cleared for the origin that is
+# currently loaded, so it is cleared before leaving the page under test.
+def reset_session(driver):
+    handles = driver.window_handles
+    for handle in handles[1:]:
+        driver.switch_to.window(handle)
+        driver.close()
+    driver.switch_to.window(handles[0])
+    if driver.current_url.startswith("http"):
+        driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+    driver.delete_all_cookies()
+    driver.get("about:blank")
+
+
+# The driver service must still be running and the browser must still answer commands
+def is_healthy(driver):
+    service = getattr(driver, "service", None)
+    process = getattr(service, "process", None)
+    if process is not None and process.poll() is not None:
+        return False
+    try:
+        driver.execute_script("return 1")
+        return True
+    except WebDriverException:
+        return False
+
+
+def quit_driver(driver):
+    try:
+        driver.quit()
+        debug_logger.info("WebDriver closed")
+    except Exception as e:
+        debug_logger.error(f"Failed to quit WebDriver: {str(e)}")
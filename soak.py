@@ -0,0 +1,459 @@
+import argparse
+import csv
+import gc
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from functools import partial
+
+try:
+    import psutil
+except ImportError:  # Optional: without it processes are read from /proc (Linux only)
+    psutil = None
+
+from drivers import create_driver, performance_profiles, supported_browsers
+from plan_engine import PlanError, compile_plan, default_base_url, full_plan, load_plan, selectable_step_types, user_options
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+# Processes a run leaves behind when a browser or its driver doesn't shut down (matched on name prefix)
+browser_process_names = ("chromedriver", "msedgedriver", "geckodriver", "chrome", "chromium", "msedge", "firefox",
+                         "headless_shell")
+
+# Leak verdict: a series leaks when it grows by more than this per iteration (after the warm-up) and the growth
+# is steady (least-squares fit with r² of at least leak_min_r2), not a few spikes
+leak_thresholds = {
+    "heap_current": 16 * 1024,
+    "python_rss": 256 * 1024,
+    "child_rss": 1024 * 1024,
+    "open_fds": 0.05,
+    "child_processes": 0.05,
+}
+leak_min_r2 = 0.5
+
+page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+# pid -> {"name", "ppid", "started", "rss"} of every (not yet exited) process on the machine, or None when
+# neither psutil nor /proc is available. "started" tells a process from a later one that got the same pid.
+def list_processes():
+    processes = {}
+    if psutil is not None:
+        for process in psutil.process_iter(["pid", "ppid", "name", "create_time", "memory_info", "status"]):
+            info = process.info
+            if info["status"] == psutil.STATUS_ZOMBIE:
+                continue
+            processes[info["pid"]] = {"name": info["name"] or "", "ppid": info["ppid"], "started": info["create_time"],
+                                      "rss": info["memory_info"].rss if info["memory_info"] else 0}
+        return processes
+    if not os.path.isdir("/proc"):
+        return None
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat_file:
+                stat = stat_file.read()
+            with open(f"/proc/{entry}/statm") as statm_file:
+                resident_pages = int(statm_file.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue  # Exited while we looked
+        name = stat[stat.index("(") + 1:stat.rindex(")")]
+        fields = stat[stat.rindex(")") + 2:].split()
+        if fields[0] == "Z":
+            continue  # Exited, only waiting for its parent to collect the exit status
+        processes[int(entry)] = {"name": name, "ppid": int(fields[1]), "started": int(fields[19]),
+                                 "rss": resident_pages * page_size}
+    return processes
+
+
+def descendants(processes, root_pid):
+    children = {}
+    for pid, process in processes.items():
+        children.setdefault(process["ppid"], []).append(pid)
+    found, pending = set(), [root_pid]
+    while pending:
+        for child in children.get(pending.pop(), []):
+            if child not in found:
+                found.add(child)
+                pending.append(child)
+    return found
+
+
+def is_browser_process(name):
+    return name.lower().startswith(browser_process_names)
+
+
+def open_fds():
+    if psutil is not None:
+        process = psutil.Process()
+        return process.num_fds() if hasattr(process, "num_fds") else process.num_handles()
+    if os.path.isdir("/proc/self/fd"):
+        return len(os.listdir("/proc/self/fd"))
+    return None
+
+
+def python_rss():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    processes = list_processes()
+    return processes[os.getpid()]["rss"] if processes else None
+
+
+# Stop processes (pid, started) that are still the process we saw: SIGTERM, then SIGKILL after grace seconds
+def reap(targets, grace=3.0):
+    if psutil is not None:
+        victims = []
+        for pid, started in targets:
+            try:
+                process = psutil.Process(pid)
+                if process.create_time() == started:
+                    process.terminate()
+                    victims.append(process)
+            except psutil.Error:
+                pass
+        _, alive = psutil.wait_procs(victims, timeout=grace)
+        for process in alive:
+            try:
+                process.kill()
+            except psutil.Error:
+                pass
+        return len(victims)
+
+    def still_running(pid, started):
+        processes = list_processes() or {}
+        return pid in processes and processes[pid]["started"] == started
+
+    reaped = [(pid, started) for pid, started in targets if still_running(pid, started)]
+    for kill_signal in (signal.SIGTERM, getattr(signal, "SIGKILL", signal.SIGTERM)):
+        for pid, started in reaped:
+            try:
+                os.kill(pid, kill_signal)
+            except OSError:
+                pass
+        deadline = time.time() + grace
+        while time.time() < deadline and any(still_running(pid, started) for pid, started in reaped):
+            time.sleep(0.1)
+    return len(reaped)
+
+
+# Follows the browser and driver processes the soak starts. Every one seen below this process is remembered,
+# and so are the processes a remembered one starts: watch() looks every interval seconds while the iterations
+# run, so a browser is caught while it still has its driver as parent, before that quits (or dies) and the
+# browser is re-parented away from us. One still alive after an iteration that isn't part of a driver still
+# in use (live_pids: driver service processes, e.g. idle in a session pool, plus their descendants) is an
+# orphan: its driver was quit (or failed to quit) and it stayed.
+class ProcessTracker:
+    def __init__(self, settle=1.0, interval=0.5):
+        self.settle = settle
+        self.interval = interval
+        self.seen = {}  # (pid, started) -> name
+        self.lock = threading.Lock()
+        self.stop_watching = threading.Event()
+        self.watcher = None
+
+    # Remember the browser processes below this one and those started by already remembered ones.
+    # Returns the descendants of this process.
+    def remember(self, processes):
+        own = descendants(processes, os.getpid())
+        with self.lock:
+            remembered = {pid for pid, started in self.seen if pid in processes and processes[pid]["started"] == started}
+            for pid in set(remembered):
+                remembered |= descendants(processes, pid)
+            for pid in own | remembered:
+                if is_browser_process(processes[pid]["name"]):
+                    self.seen[(pid, processes[pid]["started"])] = processes[pid]["name"]
+        return own
+
+    def watch(self):
+        def look():
+            while not self.stop_watching.wait(self.interval):
+                processes = list_processes()
+                if processes is not None:
+                    self.remember(processes)
+
+        self.stop_watching.clear()
+        self.watcher = threading.Thread(target=look, name="soak-process-watch", daemon=True)
+        self.watcher.start()
+
+    def stop(self):
+        self.stop_watching.set()
+        if self.watcher is not None:
+            self.watcher.join()
+            self.watcher = None
+
+    def sample(self, live_pids=(), reap_orphans=True):
+        processes = list_processes()
+        if processes is None:
+            return {"child_rss": None, "child_processes": None, "orphans": 0, "reaped": 0, "orphan_names": []}
+        own = self.remember(processes)
+        orphans = self.find_orphans(processes, live_pids)
+        if orphans and self.settle:
+            time.sleep(self.settle)  # A browser that was just quit may still be on its way out
+            processes = list_processes()
+            orphans = self.find_orphans(processes, live_pids)
+        with self.lock:
+            names = [self.seen[key] for key in orphans]
+        reaped = reap(orphans) if orphans and reap_orphans else 0
+        if reaped:
+            debug_logger.warning(f"Reaped {reaped} orphaned browser/driver processes: {', '.join(sorted(set(names)))}")
+        counted = own | {pid for pid, _ in orphans}
+        return {
+            "child_rss": sum(processes[pid]["rss"] for pid in counted if pid in processes),
+            "child_processes": len(own),
+            "orphans": len(orphans),
+            "reaped": reaped,
+            "orphan_names": names,
+        }
+
+    def find_orphans(self, processes, live_pids):
+        live = set()
+        for pid in live_pids:
+            live |= {pid} | descendants(processes, pid)
+        with self.lock:
+            for key in list(self.seen):
+                pid, started = key
+                if pid not in processes or processes[pid]["started"] != started:
+                    del self.seen[key]  # Gone
+            return [key for key in self.seen if key[0] not in live]
+
+
+# Service (driver) process ids of the drivers idle in a session pool: they and their browsers are not orphans
+def pooled_service_pids(session_pool):
+    if session_pool is None:
+        return []
+    pids = []
+    with session_pool.lock:
+        sessions = [session for idle in session_pool.idle.values() for session in idle]
+    for session in sessions:
+        process = getattr(getattr(session.driver, "service", None), "process", None)
+        if process is not None:
+            pids.append(process.pid)
+    return pids
+
+
+# Least-squares slope (per iteration) of a series and the r² of the fit
+def leak_slope(values):
+    points = [(index, value) for index, value in enumerate(values) if value is not None]
+    if len(points) < 3:
+        return 0.0, 0.0
+    count = len(points)
+    mean_x = sum(x for x, _ in points) / count
+    mean_y = sum(y for _, y in points) / count
+    sxx = sum((x - mean_x) ** 2 for x, _ in points)
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    syy = sum((y - mean_y) ** 2 for _, y in points)
+    slope = sxy / sxx
+    r2 = (sxy * sxy) / (sxx * syy) if syy else 0.0
+    return slope, r2
+
+
+def heap_growth(snapshot, baseline, limit=5):
+    # Leave out the allocations of tracemalloc, the import system and the soak's own bookkeeping
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+               tracemalloc.Filter(False, __file__)]
+    differences = snapshot.filter_traces(filters).compare_to(baseline.filter_traces(filters), "lineno")
+    return [{"where": f"{difference.traceback[0].filename}:{difference.traceback[0].lineno}",
+             "growth": difference.size_diff, "count_growth": difference.count_diff}
+            for difference in differences[:limit] if difference.size_diff > 0]
+
+
+# Repeat run_iteration() (returns True when the run passed) for iterations rounds or duration seconds,
+# whichever ends first, sampling between rounds. The first warmup iterations fill caches and pools and are
+# left out of the leak verdict. Returns the per-iteration series plus the verdict.
+def run_soak(run_iteration, iterations=100, duration=None, warmup=3, live_pids=lambda: [], reap_orphans=True,
+             progress=None, tracer_frames=1):
+    tracemalloc.start(tracer_frames)
+    tracker = ProcessTracker()
+    tracker.watch()
+    series = []
+    baseline_snapshot = None
+    start_time = time.time()
+    try:
+        iteration = 0
+        while (not iterations or iteration < iterations) and (not duration or time.time() - start_time < duration):
+            iteration += 1
+            run_start = time.time()
+            try:
+                passed = bool(run_iteration())
+            except Exception as e:
+                debug_logger.exception(f"Soak iteration {iteration} crashed: {str(e)}")
+                passed = False
+            run_duration = time.time() - run_start
+            gc.collect()
+            snapshot = tracemalloc.take_snapshot()
+            if iteration == warmup or baseline_snapshot is None:
+                baseline_snapshot = snapshot
+            heap_current, heap_peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            processes = tracker.sample(live_pids(), reap_orphans)
+            sample = {
+                "iteration": iteration,
+                "elapsed": time.time() - start_time,
+                "duration": run_duration,
+                "passed": passed,
+                "heap_current": heap_current,
+                "heap_peak": heap_peak,
+                "python_rss": python_rss(),
+                "child_rss": processes["child_rss"],
+                "child_processes": processes["child_processes"],
+                "open_fds": open_fds(),
+                "orphans": processes["orphans"],
+                "reaped": processes["reaped"],
+                "top_growth": heap_growth(snapshot, baseline_snapshot, 3) if iteration > warmup else [],
+            }
+            series.append(sample)
+            if progress:
+                progress(sample)
+        final_growth = heap_growth(tracemalloc.take_snapshot(), baseline_snapshot, 10) if baseline_snapshot else []
+    finally:
+        tracker.stop()
+        tracemalloc.stop()
+    return {"series": series, "verdict": leak_verdict(series, warmup), "top_growth": final_growth,
+            "duration": time.time() - start_time}
+
+
+def leak_verdict(series, warmup=3):
+    steady = series[warmup:] if len(series) > warmup + 2 else series
+    metrics = {}
+    for name, threshold in leak_thresholds.items():
+        slope, r2 = leak_slope([sample[name] for sample in steady])
+        metrics[name] = {"slope": slope, "r2": r2, "leaking": slope > threshold and r2 >= leak_min_r2}
+    orphans = sum(sample["orphans"] for sample in series)
+    leaking = [name for name, metric in metrics.items() if metric["leaking"]]
+    return {"leaking": bool(leaking or orphans), "leaking_metrics": leaking, "orphans": orphans, "metrics": metrics}
+
+
+series_fields = ["iteration", "elapsed", "duration", "passed", "heap_current", "heap_peak", "python_rss", "child_rss",
+                 "child_processes", "open_fds", "orphans", "reaped"]
+
+
+def write_series_csv(path, series):
+    with open(path, "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=series_fields, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(series)
+
+
+def format_bytes(value):
+    if value is None:
+        return "n/a"
+    return f"{value / (1024 * 1024):.1f} MB" if abs(value) >= 1024 * 1024 else f"{value / 1024:.1f} KB"
+
+
+def format_soak_summary(result):
+    series, verdict = result["series"], result["verdict"]
+    passed = sum(1 for sample in series if sample["passed"])
+    lines = [
+        "🔥🔥🔥 Soak Summary 🔥🔥🔥",
+        f"🔁 {len(series)} iterations in {result['duration'] / 60:.1f} min, {passed} passed, {len(series) - passed} failed",
+    ]
+    if series:
+        first, last = series[0], series[-1]
+        lines.extend([
+            f"🐍 Python heap: {format_bytes(first['heap_current'])} -> {format_bytes(last['heap_current'])}, "
+            f"RSS {format_bytes(first['python_rss'])} -> {format_bytes(last['python_rss'])}",
+            f"🌐 Browser/driver processes: {first['child_processes']} -> {last['child_processes']}, "
+            f"RSS {format_bytes(first['child_rss'])} -> {format_bytes(last['child_rss'])}",
+            f"📂 Open file descriptors: {first['open_fds']} -> {last['open_fds']}",
+            f"🧟 Orphaned processes reaped: {sum(sample['reaped'] for sample in series)}",
+        ])
+    lines.extend(["", "📈 Growth per Iteration:", "------------------------"])
+    for name, metric in verdict["metrics"].items():
+        slope = format_bytes(metric["slope"]) if name in ("heap_current", "python_rss", "child_rss") else f"{metric['slope']:.3f}"
+        lines.append(f"{'⚠️' if metric['leaking'] else '✔️'} {name}: {slope} (r² {metric['r2']:.2f})")
+    if result["top_growth"]:
+        lines.extend(["", "🧮 Top Allocators by Growth:", "----------------------------"])
+        lines.extend(f"📍 {entry['where']}: +{format_bytes(entry['growth'])} ({entry['count_growth']:+d} blocks)"
+                     for entry in result["top_growth"])
+    lines.append("")
+    if verdict["leaking"]:
+        reasons = list(verdict["leaking_metrics"])
+        if verdict["orphans"]:
+            reasons.append(f"{verdict['orphans']} orphaned processes")
+        lines.append(f"⚠️ Leak suspected: {', '.join(reasons)}")
+    else:
+        lines.append("✅ No leak: nothing grows steadily and no process was left behind")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Repeat a test plan for hours and track memory, processes and file descriptors")
+    parser.add_argument("--user", default=user_options[0], choices=user_options, help=f"user to log in as (default: {user_options[0]})")
+    parser.add_argument("--browser", default=supported_browsers[0], choices=supported_browsers, help=f"browser to use (default: {supported_browsers[0]})")
+    parser.add_argument("--headless", action="store_true", help="run the browser without a window (for machines without a display)")
+    parser.add_argument("--profile", default="default", choices=list(performance_profiles), help="browser performance profile (default: default)")
+    parser.add_argument("--plan", help="JSON plan file to run (default: every step for every product)")
+    parser.add_argument("--steps", nargs="+", choices=selectable_step_types(), help="run only these step types, for every product")
+    parser.add_argument("--base-url", default=default_base_url, help=f"site to test (default: {default_base_url})")
+    parser.add_argument("--standin", action="store_true", help="test against a local stand-in server built from 'Swag Labs.htm' (no network needed)")
+    parser.add_argument("--iterations", type=int, default=100, help="runs to do, 0 for no limit (default: 100)")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds (whichever of --iterations and --duration ends first)")
+    parser.add_argument("--warmup", type=int, default=3, help="first iterations left out of the leak verdict (default: 3)")
+    parser.add_argument("--reuse", action="store_true", help="reuse one browser through a session pool instead of launching one per run")
+    parser.add_argument("--no-reap", action="store_true", help="only count orphaned browser/driver processes, don't kill them")
+    parser.add_argument("--csv", metavar="FILE", help="write the per-iteration samples to FILE as CSV")
+    parser.add_argument("--json", metavar="FILE", help="write samples and verdict as JSON to FILE ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    plan = load_plan(args.plan) if args.plan else full_plan()
+    if args.steps:
+        plan = [step for step in plan if step["step"] in args.steps]
+    try:
+        compile_plan(plan)
+    except PlanError as e:
+        parser.error(str(e))
+    if psutil is None and not os.path.isdir("/proc"):
+        print("Without psutil (pip install psutil) browser processes can't be sampled on this system", file=sys.stderr)
+
+    from automation import run_test
+    from session_pool import SessionPool
+    from standin_server import start_standin_server, stop_standin_server
+
+    standin_server = None
+    base_url = args.base_url
+    if args.standin:
+        standin_server, base_url = start_standin_server()
+    session_pool = SessionPool(size=1, factory=partial(create_driver, headless=args.headless)) if args.reuse else None
+
+    def run_iteration():
+        result = run_test(args.browser, args.user, plan, interactive=False, session_pool=session_pool,
+                          base_url=base_url, headless=args.headless, profile=args.profile)
+        return not result["failed"] and not result.get("error")
+
+    def progress(sample):
+        print(f"🔁 {sample['iteration']}: {'✔️' if sample['passed'] else '❌'} {sample['duration']:.1f} s, "
+              f"heap {format_bytes(sample['heap_current'])}, browsers {format_bytes(sample['child_rss'])}, "
+              f"fds {sample['open_fds']}, orphans {sample['orphans']}", file=sys.stderr, flush=True)
+
+    try:
+        result = run_soak(run_iteration, args.iterations, args.duration, args.warmup,
+                          live_pids=lambda: pooled_service_pids(session_pool), reap_orphans=not args.no_reap,
+                          progress=progress)
+    finally:
+        if session_pool is not None:
+            session_pool.close()
+        if standin_server is not None:
+            stop_standin_server(standin_server)
+
+    if args.csv:
+        write_series_csv(args.csv, result["series"])
+    if args.json == "-":
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    else:
+        print(format_soak_summary(result))
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as json_file:
+                json.dump(result, json_file, indent=2)
+    return 1 if result["verdict"]["leaking"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
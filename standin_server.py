@@ -0,0 +1,425 @@
+import argparse
+import html
+import json
+import logging
+import random
+import threading
+import time
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from catalog_index import default_snapshot, parse_snapshot
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+accepted_users = [
+    "standard_user",
+    "locked_out_user",
+    "problem_user",
+    "performance_glitch_user",
+    "error_user",
+    "visual_user",
+]
+password = "secret_sauce"
+
+# Per-user behaviour of the stand-in, modelled on what the real site does for these accounts:
+#   page_delay      seconds added to every page served to that user (performance_glitch_user)
+#   broken_add      item ids whose "Add to cart" button silently does nothing (error_user)
+#   broken_remove   item ids whose "Remove" button silently does nothing (error_user)
+#   locked          the login form rejects the user (locked_out_user)
+user_profiles = {
+    "locked_out_user": {"locked": True},
+    "performance_glitch_user": {"page_delay": 5.0},
+    "error_user": {"broken_add": [1, 5, 2], "broken_remove": [4, 0, 3]},
+}
+
+
+app_script = r"""
+(function () {
+  var CART_KEY = "cart-contents";
+  var profile = window.STANDIN_PROFILE || {};
+
+  function readCart() {
+    try { return JSON.parse(localStorage.getItem(CART_KEY)) || []; } catch (e) { return []; }
+  }
+  function writeCart(ids) {
+    if (ids.length) { localStorage.setItem(CART_KEY, JSON.stringify(ids)); } else { localStorage.removeItem(CART_KEY); }
+    renderBadge();
+  }
+  function renderBadge() {
+    var link = document.querySelector(".shopping_cart_link");
+    if (!link) { return; }
+    var badge = link.querySelector(".shopping_cart_badge");
+    var count = readCart().length;
+    if (!count) { if (badge) { badge.remove(); } return; }
+    if (!badge) {
+      badge = document.createElement("span");
+      badge.className = "shopping_cart_badge";
+      badge.setAttribute("data-test", "shopping-cart-badge");
+      link.appendChild(badge);
+    }
+    badge.textContent = String(count);
+  }
+  function setButton(button, inCart) {
+    var suffix = button.hasAttribute("data-detail") ? "" : "-" + button.getAttribute("data-slug");
+    var id = (inCart ? "remove" : "add-to-cart") + suffix;
+    button.id = id;
+    button.name = id;
+    button.setAttribute("data-test", id);
+    button.textContent = inCart ? "Remove" : "Add to cart";
+    button.className = "btn " + (inCart ? "btn_secondary" : "btn_primary") + " btn_small btn_inventory";
+  }
+  function syncButtons() {
+    var cart = readCart();
+    document.querySelectorAll("button[data-item-id]").forEach(function (button) {
+      setButton(button, cart.indexOf(Number(button.getAttribute("data-item-id"))) >= 0);
+    });
+  }
+  function toggleItem(button) {
+    var id = Number(button.getAttribute("data-item-id"));
+    var cart = readCart();
+    var inCart = cart.indexOf(id) >= 0;
+    var broken = (inCart ? profile.broken_remove : profile.broken_add) || [];
+    if (broken.indexOf(id) >= 0) {
+      console.error("Failed to " + (inCart ? "remove" : "add") + " item " + id);
+      return;
+    }
+    writeCart(inCart ? cart.filter(function (other) { return other !== id; }) : cart.concat([id]));
+    var row = button.closest(".cart_item");
+    if (inCart && row) { row.remove(); } else { setButton(button, !inCart); }
+  }
+  function setMenu(open) {
+    var wrap = document.querySelector(".bm-menu-wrap");
+    if (!wrap) { return; }
+    wrap.setAttribute("aria-hidden", open ? "false" : "true");
+    if (open) { wrap.removeAttribute("hidden"); } else { wrap.setAttribute("hidden", "true"); }
+    wrap.style.transform = open ? "none" : "translate3d(-100%, 0px, 0px)";
+  }
+  function sortItems(order) {
+    var list = document.querySelector(".inventory_list");
+    if (!list) { return; }
+    var items = Array.prototype.slice.call(list.querySelectorAll(".inventory_item"));
+    items.sort(function (a, b) {
+      var byName = a.getAttribute("data-name").localeCompare(b.getAttribute("data-name"));
+      var byPrice = Number(a.getAttribute("data-price")) - Number(b.getAttribute("data-price"));
+      return { az: byName, za: -byName, lohi: byPrice, hilo: -byPrice }[order];
+    });
+    items.forEach(function (item) { list.appendChild(item); });
+    var label = document.querySelector(".active_option");
+    var select = document.querySelector(".product_sort_container");
+    if (label && select) { label.textContent = select.options[select.selectedIndex].text; }
+  }
+
+  document.addEventListener("click", function (event) {
+    var target = event.target;
+    var itemButton = target.closest("button[data-item-id]");
+    var titleLink = target.closest("a[data-item-link]");
+    if (itemButton) {
+      toggleItem(itemButton);
+    } else if (titleLink) {
+      event.preventDefault();
+      window.location.href = "inventory-item.html?id=" + titleLink.getAttribute("data-item-link");
+    } else if (target.closest("#react-burger-menu-btn")) {
+      setMenu(true);
+    } else if (target.closest("#react-burger-cross-btn")) {
+      setMenu(false);
+    } else if (target.closest("#logout_sidebar_link")) {
+      event.preventDefault();
+      document.cookie = "session-username=; path=/; expires=Thu, 01 Jan 1970 00:00:00 GMT";
+      window.location.href = "./";
+    } else if (target.closest("#reset_sidebar_link")) {
+      event.preventDefault();
+      writeCart([]);
+      syncButtons();
+    } else if (target.closest("#inventory_sidebar_link, #back-to-products, #continue-shopping")) {
+      event.preventDefault();
+      window.location.href = "inventory.html";
+    } else if (target.closest(".shopping_cart_link")) {
+      event.preventDefault();
+      window.location.href = "cart.html";
+    }
+  });
+  document.addEventListener("change", function (event) {
+    if (event.target.matches(".product_sort_container")) { sortItems(event.target.value); }
+  });
+
+  var form = document.querySelector("form.login-form");
+  if (form) {
+    form.addEventListener("submit", function (event) {
+      event.preventDefault();
+      var user = document.getElementById("user-name").value;
+      var pass = document.getElementById("password").value;
+      var error = document.querySelector(".error-message-container");
+      var message = null;
+      if (!user) {
+        message = "Epic sadface: Username is required";
+      } else if (!pass) {
+        message = "Epic sadface: Password is required";
+      } else if (window.STANDIN_USERS.indexOf(user) < 0 || pass !== window.STANDIN_PASSWORD) {
+        message = "Epic sadface: Username and password do not match any user in this service";
+      } else if (window.STANDIN_LOCKED.indexOf(user) >= 0) {
+        message = "Epic sadface: Sorry, this user has been locked out.";
+      }
+      if (message) {
+        error.innerHTML = '<h3 data-test="error">' + message + "</h3>";
+        error.className = "error-message-container error";
+        return;
+      }
+      document.cookie = "session-username=" + user + "; path=/";
+      window.location.href = "inventory.html";
+    });
+  }
+
+  document.querySelectorAll(".cart_item[data-cart-item]").forEach(function (row) {
+    if (readCart().indexOf(Number(row.getAttribute("data-cart-item"))) < 0) { row.remove(); }
+  });
+  syncButtons();
+  renderBadge();
+})();
+"""
+
+page_style = """
+body { font-family: sans-serif; margin: 0; }
+.primary_header { display: flex; justify-content: space-between; padding: 10px; border-bottom: 1px solid #ddd; }
+.bm-menu-wrap { position: fixed; top: 0; left: 0; width: 300px; height: 100%; background: #f3f3f3; z-index: 1100; }
+.bm-menu-wrap[hidden] { display: none; }
+.bm-item { display: block; padding: 8px 16px; }
+.shopping_cart_link { position: relative; display: inline-block; width: 40px; height: 40px; cursor: pointer; }
+.shopping_cart_badge { position: absolute; right: 0; top: 0; background: #e2231a; color: #fff; border-radius: 50%; padding: 0 6px; }
+.inventory_list { display: flex; flex-wrap: wrap; }
+.inventory_item, .cart_item, .inventory_details { width: 45%; margin: 10px; padding: 10px; border: 1px solid #ddd; }
+.inventory_item_img img, .inventory_details_img { width: 120px; height: 150px; }
+.error-message-container.error h3 { color: #e2231a; }
+"""
+
+
+def page(title, body, user=None, header_html=None):
+    profile = user_profiles.get(user, {})
+    if header_html is None:
+        header_html = render_header()
+    return f"""<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>{html.escape(title)}</title>
+<link rel="stylesheet" href="static/css/standin.css"></head>
+<body><div id="root"><div id="page_wrapper" class="page_wrapper"><div id="contents_wrapper">{header_html}{body}</div></div></div>
+<script>window.STANDIN_PROFILE = {json.dumps(profile)};</script>
+<script src="static/js/standin.js"></script></body></html>"""
+
+
+def render_header(title="Products", secondary=""):
+    return f"""<div id="header_container" class="header_container"><div class="primary_header">
+<div id="menu_button_container"><div class="bm-burger-button"><button id="react-burger-menu-btn">Open Menu</button></div>
+<div class="bm-menu-wrap" aria-hidden="true" hidden="true" style="transform: translate3d(-100%, 0px, 0px);"><nav class="bm-item-list">
+<a id="inventory_sidebar_link" class="bm-item menu-item" href="#">All Items</a>
+<a id="about_sidebar_link" class="bm-item menu-item" href="https://saucelabs.com/">About</a>
+<a id="logout_sidebar_link" class="bm-item menu-item" href="#">Logout</a>
+<a id="reset_sidebar_link" class="bm-item menu-item" href="#">Reset App State</a>
+</nav><button id="react-burger-cross-btn">Close Menu</button></div></div>
+<div class="header_label"><div class="app_logo">Swag Labs</div></div>
+<div id="shopping_cart_container" class="shopping_cart_container"><a class="shopping_cart_link" data-test="shopping-cart-link"></a></div>
+</div><div class="header_secondary_container"><span class="title">{html.escape(title)}</span>{secondary}</div></div>"""
+
+
+def render_login():
+    body = f"""<div class="login_container"><div class="login_logo">Swag Labs</div>
+<div class="login_wrapper"><form class="login-form">
+<input class="input_error form_input" placeholder="Username" type="text" data-test="username" id="user-name" name="user-name" autocorrect="off" autocapitalize="none">
+<input class="input_error form_input" placeholder="Password" type="password" data-test="password" id="password" name="password" autocorrect="off" autocapitalize="none">
+<div class="error-message-container"></div>
+<input type="submit" class="submit-button btn_action" data-test="login-button" id="login-button" name="login-button" value="Login">
+</form></div></div>
+<script>
+window.STANDIN_USERS = {json.dumps(accepted_users)};
+window.STANDIN_LOCKED = {json.dumps([user for user in accepted_users if user_profiles.get(user, {}).get("locked")])};
+window.STANDIN_PASSWORD = {json.dumps(password)};
+</script>"""
+    return page("Swag Labs", body, header_html="")
+
+
+def render_item_button(product, detail=False):
+    button_id = "add-to-cart" if detail else f"add-to-cart-{product['slug']}"
+    detail_attr = " data-detail" if detail else ""
+    return (f'<button class="btn btn_primary btn_small btn_inventory" data-test="{button_id}" id="{button_id}" '
+            f'name="{button_id}" data-item-id="{product["id"]}" data-slug="{html.escape(product["slug"])}"{detail_attr}>Add to cart</button>')
+
+
+def render_inventory(settings, user):
+    items = []
+    for product in settings["products"]:
+        name = html.escape(product["name"])
+        items.append(f"""<div class="inventory_item" data-name="{name}" data-price="{html.escape(product['price'].lstrip('$'))}">
+<div class="inventory_item_img"><a href="#" id="item_{product['id']}_img_link" data-item-link="{product['id']}"><img alt="{name}" class="inventory_item_img" src="static/media/{html.escape(product['image'])}"></a></div>
+<div class="inventory_item_description"><div class="inventory_item_label"><a href="#" id="item_{product['id']}_title_link" data-item-link="{product['id']}"><div class="inventory_item_name">{name}</div></a>
+<div class="inventory_item_desc">{html.escape(product['desc'])}</div></div>
+<div class="pricebar"><div class="inventory_item_price">{html.escape(product['price'])}</div>{render_item_button(product)}</div></div></div>""")
+    sort = """<div class="right_component"><span class="select_container"><span class="active_option">Name (A to Z)</span>
+<select class="product_sort_container" data-test="product_sort_container"><option value="az" selected="selected">Name (A to Z)</option>
+<option value="za">Name (Z to A)</option><option value="lohi">Price (low to high)</option><option value="hilo">Price (high to low)</option></select></span></div>"""
+    body = f"""<div id="inventory_container"><div id="inventory_container" class="inventory_container"><div class="inventory_list">{''.join(items)}</div></div></div>"""
+    return page("Swag Labs", body, user, render_header("Products", sort))
+
+
+def render_product(settings, user, product):
+    name = html.escape(product["name"])
+    body = f"""<div class="inventory_details"><button id="back-to-products" class="btn btn_secondary back btn_large inventory_details_back_button" data-test="back-to-products">Back to products</button>
+<div class="inventory_details_container"><div class="inventory_details_img_container"><img alt="{name}" class="inventory_details_img" src="static/media/{html.escape(product['image'])}"></div>
+<div class="inventory_details_desc_container"><div class="inventory_details_name large_size">{name}</div>
+<div class="inventory_details_desc large_size">{html.escape(product['desc'])}</div>
+<div class="inventory_details_price">{html.escape(product['price'])}</div>{render_item_button(product, detail=True)}</div></div></div>"""
+    return page("Swag Labs", body, user)
+
+
+def render_cart(settings, user):
+    rows = []
+    for product in settings["products"]:
+        rows.append(f"""<div class="cart_item" data-cart-item="{product['id']}"><div class="cart_quantity">1</div>
+<div class="cart_item_label"><a href="#" id="item_{product['id']}_title_link" data-item-link="{product['id']}"><div class="inventory_item_name">{html.escape(product['name'])}</div></a>
+<div class="inventory_item_desc">{html.escape(product['desc'])}</div>
+<div class="item_pricebar"><div class="inventory_item_price">{html.escape(product['price'])}</div>{render_item_button(product)}</div></div></div>""")
+    body = f"""<div id="cart_contents_container" class="cart_contents_container"><div class="cart_list">
+<div class="cart_quantity_label">QTY</div><div class="cart_desc_label">Description</div>{''.join(rows)}</div>
+<div class="cart_footer"><button class="btn btn_secondary back btn_medium" id="continue-shopping" data-test="continue-shopping">Continue Shopping</button>
+<button class="btn btn_action btn_medium checkout_button" id="checkout" data-test="checkout">Checkout</button></div></div>"""
+    return page("Swag Labs", body, user, render_header("Your Cart"))
+
+
+# Product images are not part of the snapshot; a placeholder keeps the requests (and their latency) in the flow
+def render_image(name):
+    return f"""<svg xmlns="http://www.w3.org/2000/svg" width="240" height="300" viewBox="0 0 240 300">
+<rect width="240" height="300" fill="#e8e8e8"/><text x="120" y="150" font-size="12" text-anchor="middle" fill="#888">{html.escape(name)}</text></svg>"""
+
+
+class StandinRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real site
+    disable_nagle_algorithm = True  # Headers and body go out as separate writes; don't hold the body back for an ACK
+    server_version = "SwagLabsStandin/1.0"
+
+    def log_message(self, format, *args):
+        debug_logger.debug("Stand-in server: " + format % args)
+
+    def session_user(self):
+        cookie = SimpleCookie(self.headers.get("Cookie", ""))
+        morsel = cookie.get("session-username")
+        user = morsel.value if morsel else None
+        if user in accepted_users and not user_profiles.get(user, {}).get("locked"):
+            return user
+        return None
+
+    def send(self, status, body, content_type="text/html; charset=utf-8", headers=None):
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        settings = self.server.settings
+        url = urlsplit(self.path)
+        path = url.path
+        is_page = not path.startswith("/static/") and path != "/favicon.ico"
+
+        # Injected network conditions: fixed latency plus jitter for everything, random failures for pages
+        delay = settings["latency"] + random.uniform(0, settings["jitter"])
+        if delay:
+            time.sleep(delay)
+        if is_page and settings["error_rate"] and random.random() < settings["error_rate"]:
+            self.send(500, "<h1>500 Internal Server Error</h1>")
+            return
+
+        if path == "/static/js/standin.js":
+            self.send(200, app_script, "application/javascript; charset=utf-8", {"Cache-Control": "max-age=3600"})
+            return
+        if path == "/static/css/standin.css":
+            self.send(200, page_style, "text/css; charset=utf-8", {"Cache-Control": "max-age=3600"})
+            return
+        if path.startswith("/static/media/"):
+            self.send(200, render_image(path.rsplit("/", 1)[-1]), "image/svg+xml", {"Cache-Control": "max-age=3600"})
+            return
+        if path in ("/", "/index.html"):
+            self.send(200, render_login())
+            return
+
+        user = self.session_user()
+        if path in ("/inventory.html", "/inventory-item.html", "/cart.html") and user is None:
+            self.send(302, "", headers={"Location": "/"})  # Only reachable when logged in
+            return
+        page_delay = user_profiles.get(user, {}).get("page_delay", 0) * settings["glitch_scale"]
+        if page_delay:
+            time.sleep(page_delay)
+
+        if path == "/inventory.html":
+            self.send(200, render_inventory(settings, user))
+        elif path == "/inventory-item.html":
+            item_id = parse_qs(url.query).get("id", [""])[0]
+            product = next((product for product in settings["products"] if str(product["id"]) == item_id), None)
+            if product is None:
+                self.send(404, page("Swag Labs", '<div class="inventory_details_name large_size">ITEM NOT FOUND</div>', user))
+            else:
+                self.send(200, render_product(settings, user, product))
+        elif path == "/cart.html":
+            self.send(200, render_cart(settings, user))
+        else:
+            self.send(404, "<h1>404 Not Found</h1>")
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # Listen backlog with room for bursts of connects (load_mode.py)
+
+
+# Start the stand-in on a background thread. Returns the server and its base URL (with trailing slash)
+# for run_test. latency/jitter are seconds added to every response, error_rate is the share of page
+# requests answered with HTTP 500, glitch_scale scales the performance_glitch_user delay (0 disables it).
+def start_standin_server(host="127.0.0.1", port=0, snapshot=default_snapshot, latency=0.0, jitter=0.0,
+                         error_rate=0.0, glitch_scale=1.0):
+    server = StandinServer((host, port), StandinRequestHandler)
+    server.settings = {
+        "products": parse_snapshot(snapshot),
+        "latency": latency,
+        "jitter": jitter,
+        "error_rate": error_rate,
+        "glitch_scale": glitch_scale,
+    }
+    thread = threading.Thread(target=server.serve_forever, name="standin-server", daemon=True)
+    thread.start()
+    base_url = f"http://{host}:{server.server_address[1]}/"
+    debug_logger.info(f"Stand-in server for {len(server.settings['products'])} products listening on {base_url}")
+    return server, base_url
+
+
+def stop_standin_server(server):
+    server.shutdown()
+    server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local, network-free stand-in for www.saucedemo.com")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--snapshot", default=default_snapshot, help="saved inventory page to build the catalog from")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra random seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of page requests answered with HTTP 500")
+    parser.add_argument("--glitch-scale", type=float, default=1.0, help="scale of the performance_glitch_user delay")
+    args = parser.parse_args()
+
+    server, base_url = start_standin_server(args.host, args.port, args.snapshot, args.latency, args.jitter,
+                                            args.error_rate, args.glitch_scale)
+    print(f"Serving the Swag Labs stand-in on {base_url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stop_standin_server(server)
+
+
+if __name__ == "__main__":
+    main()
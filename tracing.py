@@ -0,0 +1,158 @@
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+# Attributes a span passes on to the spans opened inside it, so a wait or WebDriver command carries
+# the step it belongs to
+inherited_attributes = ("step",)
+
+# Tracer of the run in progress in this process, None when tracing is off. Instrumented code calls span(),
+# which costs next to nothing while no tracer is active.
+active_tracer = None
+
+
+# Collects timing spans (steps, waits, WebDriver commands, navigations) with start/end timestamps and
+# attributes, and exports them as Chrome trace-event JSON (chrome://tracing, Perfetto) or a flat CSV
+class Tracer:
+    def __init__(self, **attributes):
+        self.attributes = attributes  # Added to every span, e.g. user and browser
+        self.spans = []
+        self.lock = threading.Lock()
+        self.open_spans = threading.local()  # Per-thread stack of spans not finished yet
+        self.started_at = time.time()
+        self.origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name, category, **attributes):
+        stack = self.open_spans.__dict__.setdefault("stack", [])
+        inherited = {}
+        if stack:
+            inherited = {key: stack[-1]["attributes"][key] for key in inherited_attributes
+                         if key in stack[-1]["attributes"]}
+        record = {
+            "name": name,
+            "category": category,
+            "start": time.perf_counter() - self.origin,
+            "end": None,
+            "thread": threading.get_ident(),
+            "attributes": dict(self.attributes, **inherited, **attributes),
+        }
+        stack.append(record)
+        try:
+            yield record  # The caller may add attributes, e.g. record["attributes"]["outcome"] = "failed"
+        except BaseException as e:
+            record["attributes"].setdefault("outcome", "error")
+            record["attributes"].setdefault("error", f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            record["end"] = time.perf_counter() - self.origin
+            stack.pop()
+            with self.lock:
+                self.spans.append(record)
+
+    def chrome_trace_events(self, pid=1, process_name=None):
+        threads = {}
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                   "args": {"name": process_name or "@".join(str(value) for value in self.attributes.values())}}]
+        for record in sorted(self.spans, key=lambda record: record["start"]):
+            tid = threads.setdefault(record["thread"], len(threads) + 1)
+            events.append({
+                "name": record["name"],
+                "cat": record["category"],
+                "ph": "X",
+                "ts": round(record["start"] * 1e6, 1),
+                "dur": round((record["end"] - record["start"]) * 1e6, 1),
+                "pid": pid,
+                "tid": tid,
+                "args": record["attributes"],
+            })
+        return events
+
+    def export_chrome_trace(self, path, pid=1, process_name=None):
+        write_chrome_trace(path, self.chrome_trace_events(pid, process_name), self.started_at)
+
+    def export_csv(self, path):
+        attribute_names = sorted({name for record in self.spans for name in record["attributes"]})
+        with open(path, "w", newline="", encoding="utf-8") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["name", "category", "start_s", "end_s", "duration_ms", "thread"] + attribute_names)
+            for record in sorted(self.spans, key=lambda record: record["start"]):
+                writer.writerow([record["name"], record["category"], f"{record['start']:.6f}", f"{record['end']:.6f}",
+                                 f"{(record['end'] - record['start']) * 1000:.3f}", record["thread"]]
+                                + [record["attributes"].get(name, "") for name in attribute_names])
+
+    # Write <prefix>.json and <prefix>.csv and return both paths
+    def export(self, prefix):
+        directory = os.path.dirname(prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        json_path, csv_path = f"{prefix}.json", f"{prefix}.csv"
+        self.export_chrome_trace(json_path)
+        self.export_csv(csv_path)
+        debug_logger.info(f"Trace with {len(self.spans)} spans written to {json_path} and {csv_path}")
+        return [json_path, csv_path]
+
+
+def write_chrome_trace(path, events, started_at=None):
+    trace = {"traceEvents": events, "displayTimeUnit": "ms"}
+    if started_at is not None:
+        trace["otherData"] = {"started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started_at))}
+    with open(path, "w", encoding="utf-8") as trace_file:
+        json.dump(trace, trace_file)
+
+
+# Put several runs' traces (files written by Tracer.export_chrome_trace) side by side in one file, one
+# process row per run, e.g. to compare performance_glitch_user with standard_user in the trace viewer
+def merge_chrome_traces(paths, output_path):
+    events = []
+    for pid, path in enumerate(paths, start=1):
+        with open(path, encoding="utf-8") as trace_file:
+            for event in json.load(trace_file)["traceEvents"]:
+                event["pid"] = pid
+                events.append(event)
+    write_chrome_trace(output_path, events)
+    return output_path
+
+
+def start_tracing(**attributes):
+    global active_tracer
+    active_tracer = Tracer(**attributes)
+    return active_tracer
+
+
+def stop_tracing():
+    global active_tracer
+    tracer, active_tracer = active_tracer, None
+    return tracer
+
+
+# Time a block as a span of the active tracer (a no-op while tracing is off)
+def span(name, category, **attributes):
+    if active_tracer is None:
+        return nullcontext({"attributes": {}})
+    return active_tracer.span(name, category, **attributes)
+
+
+# Route every WebDriver command of this driver (find_element, click, execute_script, get, ...) through a span.
+# Installed once per driver; pooled drivers keep it and trace whatever run is active when they are used.
+def instrument_driver(driver):
+    if getattr(driver, "_tracing_instrumented", False):
+        return driver
+    original_execute = driver.execute
+
+    def execute(driver_command, params=None):
+        if active_tracer is None:
+            return original_execute(driver_command, params)
+        with active_tracer.span(driver_command, "webdriver"):
+            return original_execute(driver_command, params)
+
+    driver.execute = execute
+    driver._tracing_instrumented = True
+    return driver
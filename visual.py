@@ -0,0 +1,271 @@
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+try:
+    import numpy as np
+except ImportError:  # Only visual checks need numpy and Pillow; everything else runs without them
+    np = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from tracing import span
+from waits import timed_wait
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+# Visual checkpoints: step type -> the screenshot taken after the step did its job.
+#   name    checkpoint name (formatted with the product fields for per-product steps); one capture per name and run
+#   cards   CSS selector of the product cards, compared one by one
+#   ignore  CSS selectors of regions that legitimately change between runs (masked out of the comparison)
+visual_checkpoints = {
+    "login": {"name": "inventory", "cards": ".inventory_item", "ignore": [".shopping_cart_badge", ".bm-menu-wrap"]},
+    "restore_session": {"name": "inventory", "cards": ".inventory_item",
+                        "ignore": [".shopping_cart_badge", ".bm-menu-wrap"]},
+    "open_product": {"name": "product {key}", "cards": ".inventory_details",
+                     "ignore": [".shopping_cart_badge", ".bm-menu-wrap"]},
+}
+
+# A card counts as changed when more than pixel_threshold of its (not ignored) pixels differ by more than
+# tolerance in any channel, or its perceptual hash is more than hash_threshold bits away from the baseline's
+default_tolerance = 24
+default_pixel_threshold = 0.02
+default_hash_threshold = 8
+
+# Card and ignore rectangles in screenshot pixels (CSS pixels times devicePixelRatio), cards named by their title,
+# with the size of the viewport (what the screenshot shows) and the scroll position
+layout_script = """
+var ratio = window.devicePixelRatio || 1;
+function rect(element) {
+    var box = element.getBoundingClientRect();
+    return [Math.round(box.left * ratio), Math.round(box.top * ratio), Math.round(box.width * ratio),
+            Math.round(box.height * ratio)];
+}
+var cards = Array.prototype.map.call(document.querySelectorAll(arguments[0]), function (card, index) {
+    var title = card.querySelector(".inventory_item_name, .inventory_details_name");
+    return {name: title ? title.textContent.trim() : "card " + (index + 1), rect: rect(card)};
+});
+var ignore = [];
+arguments[1].forEach(function (selector) {
+    document.querySelectorAll(selector).forEach(function (element) { ignore.push(rect(element)); });
+});
+return {cards: cards, ignore: ignore, viewport: [Math.round(window.innerWidth * ratio), Math.round(window.innerHeight * ratio)],
+        scroll: [window.scrollX, window.scrollY]};
+"""
+
+scroll_card_script = "document.querySelectorAll(arguments[0])[arguments[1]].scrollIntoView({block: 'start'});"
+scroll_back_script = "window.scrollTo(arguments[0], arguments[1]);"
+
+# Whether every image in the cards has finished loading (or failed to)
+images_loaded_script = """
+return Array.prototype.every.call(document.querySelectorAll(arguments[0] + " img"), function (image) {
+    return image.complete;
+});
+"""
+
+
+def require_imaging():
+    if np is None or Image is None:
+        raise RuntimeError("Visual checks need numpy and Pillow (pip install numpy pillow)")
+
+
+# PNG bytes -> height x width x 3 uint8 array. Pillow decodes in C without holding the GIL, so the
+# comparisons on the thread pool don't slow down the plan running on the main thread.
+def decode_png(data):
+    return np.asarray(Image.open(BytesIO(data)).convert("RGB"))
+
+
+def fits(rect, width, height):
+    x, y, rect_width, rect_height = rect
+    return rect_width > 0 and rect_height > 0 and x >= 0 and y >= 0 and x + rect_width <= width and y + rect_height <= height
+
+
+# Box-filter a 2D array down to height x width (every output pixel is the mean of its block)
+def downscale(gray, width, height):
+    row_edges = (np.arange(height) * gray.shape[0]) // height
+    col_edges = (np.arange(width) * gray.shape[1]) // width
+    sums = np.add.reduceat(np.add.reduceat(gray, row_edges, axis=0), col_edges, axis=1)
+    counts = np.outer(np.diff(np.append(row_edges, gray.shape[0])), np.diff(np.append(col_edges, gray.shape[1])))
+    return sums / counts
+
+
+# 64-bit difference hash: is each pixel of a 9x8 thumbnail brighter than its right neighbour
+def perceptual_hash(image):
+    gray = image.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    small = downscale(gray, 9, 8)
+    return small[:, 1:] > small[:, :-1]
+
+
+def compare_images(current, baseline, ignore_mask=None, tolerance=default_tolerance):
+    if current.shape != baseline.shape:
+        hash_distance = int(np.count_nonzero(perceptual_hash(current) != perceptual_hash(baseline)))
+        return {"pixel_diff": 1.0, "hash_distance": hash_distance, "size_changed": True}
+    different = (np.abs(current.astype(np.int16) - baseline.astype(np.int16)).max(axis=2) > tolerance)
+    counted = different.size
+    if ignore_mask is not None:
+        different &= ~ignore_mask
+        counted = int(np.count_nonzero(~ignore_mask)) or 1
+        current = np.where(ignore_mask[..., None], baseline, current)  # Ignored pixels don't move the hash either
+    hash_distance = int(np.count_nonzero(perceptual_hash(current) != perceptual_hash(baseline)))
+    return {"pixel_diff": float(np.count_nonzero(different)) / counted, "hash_distance": hash_distance,
+            "size_changed": False}
+
+
+# Mask of the ignore rectangles inside one card (rectangles in screenshot coordinates)
+def ignore_mask_for(card_rect, ignore_rects):
+    x, y, width, height = card_rect
+    mask = np.zeros((height, width), dtype=bool)
+    for left, top, ignore_width, ignore_height in ignore_rects:
+        mask[max(top - y, 0):max(top - y + ignore_height, 0), max(left - x, 0):max(left - x + ignore_width, 0)] = True
+    return mask
+
+
+def checkpoint_filename(baseline_dir, browser, profile, checkpoint):
+    return os.path.join(baseline_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{browser}_{profile}_{checkpoint}") + ".npz")
+
+
+# Takes the screenshots of one run and compares them with the baselines (or, with update=True, makes them
+# the new baselines). capture() only talks to the browser; decoding and diffing run on the thread pool
+# while the plan goes on, and finish() collects the per-card reports. A card that isn't fully in the
+# viewport is scrolled into view for a screenshot of its own; one that doesn't fit in the window is
+# reported as not captured, and so is a checkpoint whose screenshots the browser fails to take.
+class VisualChecker:
+    def __init__(self, baseline_dir, browser, profile="default", update=False, workers=2,
+                 tolerance=default_tolerance, pixel_threshold=default_pixel_threshold,
+                 hash_threshold=default_hash_threshold):
+        require_imaging()
+        self.baseline_dir = baseline_dir
+        self.browser = browser
+        self.profile = profile
+        self.update = update
+        self.tolerance = tolerance
+        self.pixel_threshold = pixel_threshold
+        self.hash_threshold = hash_threshold
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="visual")
+        self.futures = []
+        self.reports = []  # Reports made without a comparison (checkpoints that couldn't be captured)
+        self.captured = set()
+        os.makedirs(baseline_dir, exist_ok=True)
+
+    def capture(self, driver, checkpoint, spec):
+        if checkpoint in self.captured:
+            return
+        self.captured.add(checkpoint)
+        shots, skipped = [], []  # shots: (png, layout, indexes of the cards to crop from it)
+        try:
+            self.take_screenshots(driver, checkpoint, spec, shots, skipped)
+        except WebDriverException as e:  # Not worth failing the step (or the driver) over
+            debug_logger.warning(f"Visual {checkpoint} not captured: {str(e)}")
+            self.reports.append({"checkpoint": checkpoint, "card": "not captured", "changed": True, "reason": str(e)})
+            return
+        self.futures.append(self.pool.submit(self.process, checkpoint, shots, skipped))
+
+    def take_screenshots(self, driver, checkpoint, spec, shots, skipped):
+        with span(f"screenshot {checkpoint}", "visual"):
+            try:
+                timed_wait(driver, "images", f"{checkpoint} images",
+                           lambda driver: driver.execute_script(images_loaded_script, spec["cards"]))
+            except TimeoutException:
+                pass  # Compared as they are; an image still loading shows up as a changed card
+            pending, origin, scrolled_to = None, None, None
+            while True:
+                png = driver.get_screenshot_as_png()
+                layout = driver.execute_script(layout_script, spec["cards"], spec["ignore"])
+                cards = layout["cards"]
+                if pending is None:
+                    pending, origin = list(range(len(cards))), layout["scroll"]
+                visible = [index for index in pending if index < len(cards) and fits(cards[index]["rect"], *layout["viewport"])]
+                if visible:
+                    shots.append((png, layout, visible))
+                pending = [index for index in pending if index not in visible]
+                if pending and pending[0] == scrolled_to:  # Scrolled to and still not in view: taller than the window
+                    index = pending.pop(0)
+                    skipped.append(cards[index]["name"] if index < len(cards) else f"card {index + 1}")
+                if not pending:
+                    break
+                scrolled_to = pending[0]
+                driver.execute_script(scroll_card_script, spec["cards"], scrolled_to)
+            if scrolled_to is not None:
+                driver.execute_script(scroll_back_script, *origin)
+
+    def process(self, checkpoint, shots, skipped):
+        crops = {}
+        skipped = list(skipped)
+        for png, layout, indexes in shots:
+            image = decode_png(png)
+            for index in indexes:
+                card = layout["cards"][index]
+                x, y, width, height = card["rect"]
+                if not fits(card["rect"], image.shape[1], image.shape[0]):
+                    skipped.append(card["name"])  # The screenshot is smaller than the viewport said
+                    continue
+                crops[card["name"]] = (image[y:y + height, x:x + width], ignore_mask_for(card["rect"], layout["ignore"]))
+        if skipped:
+            debug_logger.warning(f"Visual {checkpoint}: {', '.join(skipped)} not captured (not in the window)")
+        reports = [{"checkpoint": checkpoint, "card": name, "changed": True, "reason": "not captured"}
+                   for name in skipped]
+        path = checkpoint_filename(self.baseline_dir, self.browser, self.profile, checkpoint)
+        if self.update or not os.path.exists(path):
+            np.savez_compressed(path, **{f"card:{name}": pixels for name, (pixels, _) in crops.items()})
+            debug_logger.info(f"Visual baseline {checkpoint} saved with {len(crops)} cards to {path}")
+            return reports + [{"checkpoint": checkpoint, "card": name, "baseline": "saved"} for name in crops]
+
+        with np.load(path) as baseline:
+            for name, (pixels, mask) in crops.items():
+                key = f"card:{name}"
+                if key not in baseline.files:
+                    reports.append({"checkpoint": checkpoint, "card": name, "changed": True, "reason": "no baseline"})
+                    continue
+                report = compare_images(pixels, baseline[key], mask, self.tolerance)
+                report["changed"] = (report["size_changed"] or report["pixel_diff"] > self.pixel_threshold
+                                     or report["hash_distance"] > self.hash_threshold)
+                reports.append(dict(report, checkpoint=checkpoint, card=name))
+            for key in baseline.files:
+                name = key[len("card:"):]
+                if name not in crops and name not in skipped:
+                    reports.append({"checkpoint": checkpoint, "card": name, "changed": True, "reason": "missing"})
+        return reports
+
+    # Wait for the comparisons still running and return every card report
+    def finish(self):
+        reports = list(self.reports)
+        for future in self.futures:
+            try:
+                reports.extend(future.result())
+            except Exception as e:
+                debug_logger.error(f"Visual comparison failed: {str(e)}")
+                reports.append({"checkpoint": "?", "card": "?", "changed": True, "reason": str(e)})
+        self.pool.shutdown()
+        return reports
+
+
+# execute_plan after_step hook: screenshot the checkpoints of the steps that did their job, including those
+# failed only for being too slow (perf_metrics), whose page is there all the same
+def visual_hook(driver, checker, checkpoints=None):
+    checkpoints = visual_checkpoints if checkpoints is None else checkpoints
+
+    def after_step(step, step_result):
+        spec = checkpoints.get(step["type"])
+        if spec and (step_result["passed"] or step_result.get("failure") == "too slow"):
+            checker.capture(driver, spec["name"].format(**step["params"].get("product", {})), spec)
+
+    return after_step
+
+
+# Test outcomes of the reports: one failed test per changed card, one passed test per checkpoint without changes
+def visual_outcomes(reports):
+    outcomes = []
+    for checkpoint in dict.fromkeys(report["checkpoint"] for report in reports if "changed" in report):
+        changed = [report["card"] for report in reports if report["checkpoint"] == checkpoint and report.get("changed")]
+        if changed:
+            outcomes.extend((f"Visual {checkpoint}: {card}", False) for card in changed)
+        else:
+            outcomes.append((f"Visual {checkpoint}", True))
+    return outcomes
@@ -0,0 +1,138 @@
+import logging
+import time
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+from locators import locator_table, remember_located
+from tracing import span
+
+
+debug_logger = logging.getLogger('debugLogger')
+
+# Default timeout (in seconds) for each kind of condition. Every wait function also takes a
+# timeout argument that overrides the default for that single call.
+wait_timeouts = {
+    "document_ready": 10,
+    "element": 10,
+    "element_gone": 10,
+    "text": 10,
+    "cart_badge": 5,
+    "url": 10,
+    "images": 5,
+}
+
+# How often the conditions are re-checked. WebDriverWait's default of 0.5s would put up to half a
+# second of dead time on top of every wait.
+poll_frequency = 0.05
+
+# Every wait of the current run: name, condition kind, timeout, how long it actually took and whether it was met
+wait_timings = []
+
+cart_badge_locator = locator_table["cart_badge"]
+
+
+def reset_wait_timings():
+    wait_timings.clear()
+
+
+# Wait until condition(driver) is truthy (or falsy with until_not=True) and record how long that took.
+# Raises TimeoutException like WebDriverWait does, so callers keep their existing error handling.
+def timed_wait(driver, kind, name, condition, timeout=None, until_not=False):
+    if timeout is None:
+        timeout = wait_timeouts[kind]
+    wait = WebDriverWait(driver, timeout, poll_frequency=poll_frequency,
+                         ignored_exceptions=(NoSuchElementException, StaleElementReferenceException))
+    start_time = time.time()
+    met = False
+    try:
+        with span(name, "wait", kind=kind, timeout=timeout) as trace_span:
+            value = wait.until_not(condition) if until_not else wait.until(condition)
+            met = True
+            trace_span["attributes"]["outcome"] = "met"
+        return value
+    finally:
+        elapsed_time = time.time() - start_time
+        wait_timings.append({"name": name, "kind": kind, "timeout": timeout, "elapsed": elapsed_time, "met": met})
+        if met:
+            debug_logger.debug(f"Wait for {name} took {elapsed_time:.3f} seconds")
+        else:
+            debug_logger.warning(f"Wait for {name} gave up after {elapsed_time:.3f} seconds (timeout {timeout}s)")
+
+
+# state="complete" waits for the load event; "interactive" is enough once the DOM is parsed
+def wait_for_document_ready(driver, state="complete", timeout=None):
+    accepted = ("complete",) if state == "complete" else ("interactive", "complete")
+    return timed_wait(driver, "document_ready", f"document {state}",
+                      lambda d: d.execute_script("return document.readyState") in accepted, timeout)
+
+
+# The element found is kept in the element cache (see locators.py), so using it right after the wait is free
+def wait_for_element(driver, locator, timeout=None, clickable=False, name=None):
+    condition = EC.element_to_be_clickable(locator) if clickable else EC.presence_of_element_located(locator)
+    element = timed_wait(driver, "element", name or f"element {locator[1]}", condition, timeout)
+    remember_located(driver, locator, element)
+    return element
+
+
+# Wait until one of several elements is present; returns the index of the first locator that matched.
+# Lets a caller tell outcomes apart (e.g. inventory vs. login page) without sitting out a timeout.
+def wait_for_any_element(driver, locators, timeout=None, name=None):
+    def first_present(d):
+        for index, locator in enumerate(locators):
+            if d.find_elements(*locator):
+                return index + 1  # Truthy even for the first locator
+        return False
+    return timed_wait(driver, "element", name or " or ".join(locator[1] for locator in locators), first_present, timeout) - 1
+
+
+# After driver.get with page_load_strategy "none": wait until the document that was loaded before is gone
+def wait_for_new_document(driver, old_document, timeout=None):
+    return timed_wait(driver, "document_ready", "new document", EC.staleness_of(old_document), timeout)
+
+
+def wait_for_element_gone(driver, locator, timeout=None, name=None):
+    return timed_wait(driver, "element_gone", name or f"element {locator[1]} to disappear",
+                      EC.presence_of_element_located(locator), timeout, until_not=True)
+
+
+def wait_for_text(driver, locator, text, timeout=None, name=None):
+    return timed_wait(driver, "text", name or f"'{text}' in {locator[1]}",
+                      EC.text_to_be_present_in_element(locator, text), timeout)
+
+
+def wait_for_attribute(driver, locator, attribute, value, timeout=None, name=None):
+    return timed_wait(driver, "element", name or f"{locator[1]} [{attribute}={value}]",
+                      lambda d: d.find_element(*locator).get_attribute(attribute) == value, timeout)
+
+
+# Number shown on the cart icon; the badge is not rendered at all while the cart is empty
+def get_cart_count(driver):
+    badges = driver.find_elements(*cart_badge_locator)
+    if not badges:
+        return 0
+    try:
+        return int(badges[0].text or 0)
+    except ValueError:
+        return 0
+
+
+def wait_for_cart_count(driver, expected_count, timeout=None):
+    return timed_wait(driver, "cart_badge", f"cart badge = {expected_count}",
+                      lambda d: get_cart_count(d) == expected_count, timeout)
+
+
+def wait_for_url_contains(driver, fragment, timeout=None):
+    return timed_wait(driver, "url", f"URL containing '{fragment}'", EC.url_contains(fragment), timeout)
+
+
+def wait_for_url_change(driver, old_url, timeout=None):
+    return timed_wait(driver, "url", "URL change", EC.url_changes(old_url), timeout)
+
+
+# Total time spent waiting in the current run and the waits that were not met
+def summarize_wait_timings():
+    total = sum(timing["elapsed"] for timing in wait_timings)
+    timed_out = [timing for timing in wait_timings if not timing["met"]]
+    return total, timed_out
+